@@ -14,25 +14,44 @@ Single-file diag_borreliosis.py (ou app.py)
 Le reste du code est inchangé + complet.
 """
 
+import time
+_T_IMPORTS = time.perf_counter()
+
 import json
 import io
-import time
 import requests
-import unicodedata
 from pathlib import Path
 from urllib.parse import quote_plus
 
-import numpy as np
 import pandas as pd
 import streamlit as st
-import streamlit.components.v1 as components
 
-from catboost import CatBoostClassifier, Pool
+# ⚠️ catboost / rasterio / pyproj / streamlit.components : importés au premier usage
+#    (lazy_import) -> accueil, méthodologie, sources et projet ne les chargent jamais.
+from lyrae.lazy import import_report, lazy_import, record_import_time
+from lyrae.core import (
+    MODEL_DEFAULT,
+    META_DEFAULT,
+    RESULTS_ANALYSIS_COLS,
+    analysis_cols,
+    cat_from_p_like_R,
+    normalize_key,
+)
+from lyrae.casestate import WIDGET_PREFIXES, CaseState
+from lyrae.communes import LOCAL_PROVIDER, CommuneIndex
+from lyrae.geo import GeocodeCache, geocode_address_cached
+from lyrae.explain import contribution_table, explain
+from lyrae.predictor import (
+    get_predictor,
+    reload_history,
+    start_model_watcher,
+    warmup_predictor_in_background,
+)
+from lyrae.registry import ModelRegistry, ShadowLog, ShadowScorer
+from lyrae.recommend import load_outcome_rates, recommend_next_tests
+from lyrae.whatif import sensitivity
 
-# Raster risk
-import rasterio
-from rasterio.transform import rowcol
-from pyproj import Transformer
+record_import_time("diag_borreliosis (imports du script)", time.perf_counter() - _T_IMPORTS)
 
 
 # ============================================================
@@ -41,9 +60,6 @@ from pyproj import Transformer
 APP_BRAND = "LYRAE"
 APP_TITLE = "Aide au diagnostic de la borréliose de Lyme équine"
 APP_SUBTITLE = "Analyse structurée basée sur les données cliniques, biologiques et contextuelles."
-MODEL_DEFAULT = "equine_lyme_catboost.cbm"
-META_DEFAULT  = "equine_lyme_catboost_meta.json"
-
 REF_XLSX_URL = "https://raw.githubusercontent.com/QuentinLamboley/Borreliosis_tool/main/jeu_fictif_lyme_equine_cas_parfaits.xlsx"
 REF_XLSX_SHEET = 0
 REF_XLSX_IGNORE = {"target", "y", "label"}
@@ -61,30 +77,42 @@ CONTACT_EMAIL = (
     else "contact@exemple.org"
 )
 
+# Cache disque du géocodage (mêmes écuries géocodées plusieurs fois par semaine)
+GEOCODE_CACHE_PATH = Path(__file__).with_name(".lyrae_cache") / "geocode.sqlite"
+GEOCODE_CACHE_TTL_DAYS = float(st.secrets.get("geocode_cache_ttl_days", 30)) if hasattr(st, "secrets") else 30.0
+GEOCODE_NEG_TTL_S = 600
+GEOCODE_CACHE_MAX = 5000
+
+# Registre de modèles (paires <version>.cbm + <version>_meta.json) scorés en shadow,
+# journal local des probabilités / désaccords (python -m lyrae.registry report ...)
+MODEL_REGISTRY_DIR = Path(__file__).with_name("models")
+SHADOW_LOG_PATH = Path(__file__).with_name(".lyrae_cache") / "shadow.sqlite"
+
+# Optionnel : URL (ou chemin) d'une version COG du raster (python -m lyrae.risk cog ...).
+# Si renseigné, on ne télécharge rien : seules les tuiles utiles sont lues (HTTP range requests).
+RISK_RASTER_COG_URL = st.secrets.get("risk_raster_cog_url", "") if hasattr(st, "secrets") else ""
+
+# Optionnel : grille compacte .npy + .json (python -m lyrae.risk compact ...), prioritaire si présente.
+_risk_grid_secret = st.secrets.get("risk_grid_path", "") if hasattr(st, "secrets") else ""
+RISK_GRID_PATH = Path(_risk_grid_secret) if _risk_grid_secret else Path(__file__).with_name("risk_grid.npy")
+
+# Optionnel : index local des centroïdes CP / communes (python -m lyrae.communes build ...).
+# Repli si BAN et Nominatim sont injoignables ; geocode_offline = true -> aucun appel réseau.
+_commune_index_secret = st.secrets.get("commune_index_path", "") if hasattr(st, "secrets") else ""
+COMMUNE_INDEX_PATH = Path(_commune_index_secret) if _commune_index_secret else Path(__file__).with_name("communes.npz")
+GEOCODE_OFFLINE = bool(st.secrets.get("geocode_offline", False)) if hasattr(st, "secrets") else False
+
+# Carte Leaflet persistante (composant local) ; Leaflet servi depuis
+# components/leaflet_map/vendor/ s'il y est copié, sinon depuis le CDN unpkg.
+# map_tiles_url : serveur de tuiles interne possible (postes sans accès à OpenStreetMap).
+LEAFLET_COMPONENT_DIR = Path(__file__).with_name("components") / "leaflet_map"
+MAP_TILES_URL = (
+    st.secrets.get("map_tiles_url", "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png")
+    if hasattr(st, "secrets")
+    else "https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
+)
+MAP_TILES_ATTRIBUTION = "&copy; OpenStreetMap contributors"
 
-# ============================================================
-# VARIABLES (met à jour selon ton modèle si besoin)
-# ============================================================
-analysis_cols = [
-    "piroplasmose_neg","ehrlichiose_neg","ehrlichiose_negatif","Bilan_sanguin_normal","NFS_normale",
-    "Parametres_musculaires_normaux","Parametres_renaux_normaux","Parametres_hepatiques_normaux",
-    "SAA_normal","Fibrinogène_normal",
-    "ELISA_pos","ELISA_OspA_pos","ELISA_OspF_pos","ELISA_p39","WB_pos","PCR_sang_pos","SNAP_C6_pos","IFAT_pos",
-    "PCR_LCR_pos","PCR_synoviale_pos","PCR_peau_pos","PCR_humeur_aqueuse_pos","PCR_tissu_nerveux_pos",
-    "PCR_liquide_articulaire_pos","LCR_pleiocytose","LCR_proteines_augmentees",
-    "IHC_tissulaire_pos","Coloration_argent_pos","FISH_tissulaire_pos",
-    "CVID","Hypoglobulinemie"
-]
-
-RESULTS_ANALYSIS_COLS = [
-    "ELISA_pos", "ELISA_OspA_pos", "ELISA_OspF_pos", "ELISA_p39",
-    "WB_pos", "SNAP_C6_pos", "IFAT_pos",
-    "PCR_sang_pos", "PCR_LCR_pos", "PCR_synoviale_pos", "PCR_liquide_articulaire_pos",
-    "PCR_peau_pos", "PCR_humeur_aqueuse_pos", "PCR_tissu_nerveux_pos",
-    "LCR_pleiocytose", "LCR_proteines_augmentees",
-    "IHC_tissulaire_pos", "Coloration_argent_pos", "FISH_tissulaire_pos",
-    "CVID", "Hypoglobulinemie",
-]
 
 st.set_page_config(page_title=f"{APP_BRAND} — {APP_TITLE}", layout="wide")
 
@@ -664,47 +692,13 @@ st.markdown(CSS, unsafe_allow_html=True)
 
 
 # ============================================================
-# HELPERS (généraux)
+# HELPERS (généraux) — le cœur d'inférence vit dans lyrae/core.py
 # ============================================================
-def normalize_key(s: str) -> str:
-    if s is None:
-        return ""
-    s = str(s).strip()
-    s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
-    s = s.replace(" ", "_")
-    return s
-
-
-def load_meta(meta_path: Path) -> dict:
-    with meta_path.open("r", encoding="utf-8") as f:
-        meta = json.load(f)
-    for k in ("feature_cols", "cat_cols", "factor_levels"):
-        if k not in meta:
-            raise ValueError(f"meta.json invalide: clé manquante '{k}'")
-    return meta
-
-
-@st.cache_resource
-def load_model_and_meta(model_path_str: str, meta_path_str: str):
-    model_path = Path(model_path_str)
-    meta_path = Path(meta_path_str)
-
-    if not model_path.exists():
-        raise FileNotFoundError(f"Modèle introuvable: {model_path}")
-    if not meta_path.exists():
-        raise FileNotFoundError(f"Meta introuvable: {meta_path}")
-
-    meta = load_meta(meta_path)
-
-    model = CatBoostClassifier()
-    model.load_model(str(model_path))
-
-    feature_cols = meta["feature_cols"]
-    cat_cols = meta["cat_cols"]
-    factor_levels = meta["factor_levels"]
-
-    cat_idx = [feature_cols.index(c) for c in cat_cols if c in feature_cols]
-    return model, meta, feature_cols, cat_cols, factor_levels, cat_idx
+def load_predictor(model_path_str: str, meta_path_str: str):
+    # Cache process (lyrae.predictor) partagé avec le préchargement en arrière-plan ;
+    # le watcher remplace le Predictor quand le .cbm / meta change sur disque
+    start_model_watcher()
+    return get_predictor(model_path_str, meta_path_str)
 
 
 @st.cache_data(show_spinner=False)
@@ -720,99 +714,21 @@ def load_xlsx_columns(url: str, sheet=0) -> list[str]:
         return [f"__ERROR__:{type(e).__name__}:{e}"]
 
 
-def yn_to_num_if_needed(val, col_is_numeric: bool):
-    if val is None or (isinstance(val, float) and np.isnan(val)):
-        return val
-    if pd.isna(val):
-        return val
-    if not col_is_numeric:
-        return val
-    if isinstance(val, (int, float, np.number)) and not pd.isna(val):
-        return float(val)
-    s = str(val).strip().lower()
-    if s in ("oui","yes","y","true","vrai","1"):
-        return 1.0
-    if s in ("non","no","n","false","faux","0"):
-        return 0.0
-    return val
-
-
-def build_template(feature_cols):
-    return pd.DataFrame([{c: pd.NA for c in feature_cols}])
-
-
-def apply_inputs_to_template(X, inputs: dict):
-    for k, v in inputs.items():
-        if k in X.columns:
-            X.at[0, k] = v
-    return X
-
-
-def fill_missing_code_like_R(X: pd.DataFrame, analysis_cols_set: set):
-    miss_cols = [c for c in X.columns if c.endswith("_missing_code")]
-    if not miss_cols:
-        return X
-    for mc in miss_cols:
-        X.at[0, mc] = 0
-    for mc in miss_cols:
-        base = mc.replace("_missing_code", "")
-        if base not in X.columns:
-            continue
-        if pd.isna(X.at[0, base]):
-            X.at[0, mc] = 2 if base in analysis_cols_set else 1
-    return X
-
-
-def coerce_like_train_python(
-    X: pd.DataFrame,
-    feature_cols: list,
-    cat_cols: list,
-    factor_levels: dict
-):
-    """
-    Rend X compatible CatBoost (Pool) :
-    - Cat features : toujours string, jamais pd.NA dans les catégories
-    - Numériques : float coerced
-    """
-    # --- Catégorielles : forcer en string + sentinel pour NA
-    for c in cat_cols:
-        if c not in X.columns:
-            continue
-
-        # On force en "string" pandas, puis on remplace les NA par un token
-        s = X[c].astype("string")
-        s = s.fillna("__MISSING__")
-
-        # Optionnel : si meta fournit des niveaux, on peut "aligner" sans casser
-        # (CatBoost accepte des strings hors niveaux, mais ça peut signaler une dérive)
-        lv = factor_levels.get(c, None)
-        if lv is not None and isinstance(lv, (list, tuple)) and len(lv) > 0:
-            # On conserve la valeur telle quelle, mais on s'assure que les NA sont déjà gérés
-            pass
-
-        # CatBoost préfère object/str simples plutôt que Categorical pandas
-        X[c] = s.astype(str)
-
-    # --- Numériques : convertir Oui/Non -> 1/0, puis to_numeric
-    num_cols = [c for c in feature_cols if c not in cat_cols]
-    for c in num_cols:
-        if c not in X.columns:
-            continue
-        X[c] = X[c].apply(lambda v: yn_to_num_if_needed(v, col_is_numeric=True))
-        X[c] = pd.to_numeric(X[c], errors="coerce")
-
-    return X
-
-
-
-def cat_from_p_like_R(p: float) -> str:
-    if p < 0.25:
-        return "Pas de Lyme ou informations insuffisantes"
-    if p < 0.50:
-        return "Lyme possible"
-    if p < 0.75:
-        return "Lyme probable"
-    return "Lyme sûr"
+@st.cache_resource(show_spinner=False)
+def get_shadow_scorer() -> ShadowScorer | None:
+    # Pas de dossier models/ -> pas de shadow (aucun coût pour l'app)
+    if not MODEL_REGISTRY_DIR.is_dir():
+        return None
+    return ShadowScorer(ModelRegistry(MODEL_REGISTRY_DIR), ShadowLog(SHADOW_LOG_PATH))
+
+
+@st.cache_data(show_spinner=False)
+def load_reference_outcome_rates() -> dict | None:
+    # Taux de positivité du jeu de référence local (None -> issues équiprobables)
+    try:
+        return load_outcome_rates()
+    except Exception:
+        return None
 
 
 def cat_color(cat: str) -> str:
@@ -826,222 +742,88 @@ def cat_color(cat: str) -> str:
 
 
 # ============================================================
-# RISQUE AUTO via raster
+# RISQUE AUTO via raster — handle + transformer + bande gardés en cache (lyrae/risk.py)
 # ============================================================
-@st.cache_data(show_spinner=False)
-def download_risk_raster(url: str) -> str:
-    local_path = str(Path(__file__).with_name("mean_R1_RF_prob_rep01_05_CATEG_3classes.tif"))
-    p = Path(local_path)
-    if p.exists() and p.stat().st_size > 0:
-        return local_path
-
-    headers = {"User-Agent": f"LYRAE-Streamlit/1.0 ({CONTACT_EMAIL})"}
-    r = requests.get(url, headers=headers, timeout=90)
-    r.raise_for_status()
-    p.write_bytes(r.content)
-    return local_path
-
-
-def _best_match_risk_label(target: str, levels: list[str]) -> str:
-    if not levels:
-        return target
-    t = target.strip().lower()
-
-    for lv in levels:
-        if str(lv).strip().lower() == t:
-            return str(lv)
-
-    def pick(keyword):
-        for lv in levels:
-            if keyword in str(lv).strip().lower():
-                return str(lv)
-        return None
-
-    if "faible" in t or "meconnu" in t or "méconnu" in t:
-        return pick("faible") or pick("meconnu") or pick("méconnu") or target
-    if "inter" in t:
-        return pick("inter") or target
-    if "fort" in t:
-        return pick("fort") or target
-    return target
+@st.cache_resource(show_spinner=False)
+def get_risk_raster():
+    """CompactRiskGrid (NumPy seul) si la grille existe, sinon RiskRaster (rasterio + pyproj, importés ici)."""
+    if RISK_GRID_PATH.exists():
+        return lazy_import("lyrae.riskgrid").CompactRiskGrid(RISK_GRID_PATH)
+    risk = lazy_import("lyrae.risk")
+    if RISK_RASTER_COG_URL:
+        return risk.RiskRaster(RISK_RASTER_COG_URL, max_in_memory_bytes=0)
+    tif_path = risk.download_risk_raster(RISK_RASTER_URL, Path(__file__).parent, contact_email=CONTACT_EMAIL)
+    return risk.RiskRaster(tif_path)
 
 
 def risk_class_from_geo(lat_wgs84: float, lon_wgs84: float, factor_levels: dict) -> str | None:
     try:
-        tif_path = download_risk_raster(RISK_RASTER_URL)
-        with rasterio.open(tif_path) as ds:
-            ds_crs = ds.crs
-            if ds_crs is None:
-                return None
-
-            transformer = Transformer.from_crs("EPSG:4326", ds_crs, always_xy=True)
-            x, y = transformer.transform(lon_wgs84, lat_wgs84)
-
-            if (x < ds.bounds.left) or (x > ds.bounds.right) or (y < ds.bounds.bottom) or (y > ds.bounds.top):
-                raw_label = "faible ou méconnu"
-            else:
-                row, col = rowcol(ds.transform, x, y)
-                if row < 0 or col < 0 or row >= ds.height or col >= ds.width:
-                    raw_label = "faible ou méconnu"
-                else:
-                    v = ds.read(1, window=((row, row + 1), (col, col + 1)))
-                    if v is None or v.size == 0:
-                        raw_label = "faible ou méconnu"
-                    else:
-                        vv = v[0, 0]
-                        try:
-                            vv_int = int(vv)
-                        except Exception:
-                            vv_int = 1
-
-                        if vv_int == 2:
-                            raw_label = "intermédiaire"
-                        elif vv_int == 3:
-                            raw_label = "fort"
-                        else:
-                            raw_label = "faible ou méconnu"
-
-        lv = factor_levels.get("Classe_de_risque", [])
-        return _best_match_risk_label(raw_label, [str(x) for x in lv]) if lv else raw_label
+        return get_risk_raster().risk_class(lat_wgs84, lon_wgs84, factor_levels)
     except Exception:
         return None
 
 
 # ============================================================
-# GEOCODE + MAP (Leaflet) — robuste FR (BAN -> Nominatim)
-#   ✅ évite de "cacher" un échec (None) à cause du cache Streamlit
+# GEOCODE + MAP (Leaflet) — robuste FR (BAN -> Nominatim), cf. lyrae/geo.py
+#   ✅ BAN et Nominatim en course (HedgedGeocoder) : réponse en GEOCODE_DEADLINE_S au plus
+#   ✅ cache disque SQLite : succès gardés GEOCODE_CACHE_TTL_DAYS,
+#      échecs gardés GEOCODE_NEG_TTL_S seulement (une panne n'est jamais figée)
+#   ✅ repli hors ligne : centroïde CP / commune (COMMUNE_INDEX_PATH), directement
+#      si l'adresse se réduit à CP + ville
+#   ✅ carte : composant Leaflet persistant (components/leaflet_map), mis à jour sans rechargement
 # ============================================================
+@st.cache_resource
+def get_geocode_cache() -> GeocodeCache:
+    return GeocodeCache(
+        GEOCODE_CACHE_PATH,
+        ttl_s=GEOCODE_CACHE_TTL_DAYS * 86400,
+        neg_ttl_s=GEOCODE_NEG_TTL_S,
+        max_entries=GEOCODE_CACHE_MAX,
+    )
 
-def geocode_address(address: str):
-    """
-    Retourne {"lat":..., "lon":..., "display_name":..., "provider":...} ou None.
-    Stratégie:
-      1) BAN (France) -> très fiable
-      2) Nominatim fallback
-    """
-    if not address or address.strip() == "":
-        return None
-
-    q = address.strip()
 
-    # --- 1) BAN (Base Adresse Nationale) : fiable en France
+@st.cache_resource(show_spinner=False)
+def get_commune_index():
+    """CommuneIndex (centroïdes CP / communes) si le fichier est présent, sinon None."""
+    if not COMMUNE_INDEX_PATH.exists():
+        return None
     try:
-        ban_url = "https://api-adresse.data.gouv.fr/search/"
-        ban_params = {"q": q, "limit": 1}
-        r = requests.get(
-            ban_url,
-            params=ban_params,
-            timeout=12,
-            headers={
-                "User-Agent": f"LYRAE/1.0 ({CONTACT_EMAIL})",
-                "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.6",
-            },
-        )
-        if r.status_code == 200:
-            data = r.json()
-            feats = data.get("features", [])
-            if feats:
-                coords = feats[0]["geometry"]["coordinates"]  # [lon, lat]
-                props = feats[0].get("properties", {})
-                return {
-                    "lat": float(coords[1]),
-                    "lon": float(coords[0]),
-                    "display_name": props.get("label", q),
-                    "provider": "BAN",
-                }
+        return CommuneIndex.load(COMMUNE_INDEX_PATH)
     except Exception:
-        pass
+        return None
 
-    # --- 2) Nominatim fallback
-    try:
-        nom_url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "format": "json",
-            "limit": 1,
-            "addressdetails": 1,
-            "countrycodes": "fr",
-            "q": q,
-        }
-        r = requests.get(
-            nom_url,
-            params=params,
-            timeout=12,
-            headers={
-                "User-Agent": f"LYRAE/1.0 ({CONTACT_EMAIL})",
-                "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.6",
-            },
-        )
 
-        if r.status_code != 200:
-            # IMPORTANT : on ne cache pas l'échec, et on laisse l'appelant gérer l'affichage
-            return {"__error__": True, "status": r.status_code, "text": r.text[:300], "provider": "Nominatim"}
+def geocode_address(address: str, cp: str = "", city: str = "", local_first: bool = False):
+    index = get_commune_index()
+    local = index.locate(cp, city) if index is not None else None
+    return geocode_address_cached(
+        address, get_geocode_cache(), contact_email=CONTACT_EMAIL,
+        local=local, local_first=local_first or GEOCODE_OFFLINE,
+    )
 
-        data = r.json()
-        if not data:
-            return None
-        lat = float(data[0]["lat"])
-        lon = float(data[0]["lon"])
-        disp = data[0].get("display_name", q)
-        return {"lat": lat, "lon": lon, "display_name": disp, "provider": "Nominatim"}
 
-    except Exception:
-        return None
 
+@st.cache_resource(show_spinner=False)
+def get_leaflet_map():
+    """Composant carte (components/leaflet_map), déclaré une fois par process."""
+    return lazy_import("streamlit.components.v1").declare_component("lyrae_leaflet_map", path=str(LEAFLET_COMPONENT_DIR))
 
 
 def render_map(lat: float, lon: float, zoom: int = 14):
-    map_id = f"map_{abs(hash((round(lat,6), round(lon,6), int(zoom))))}"
-    html = f"""
-    <!doctype html>
-    <html>
-      <head>
-        <meta charset="utf-8"/>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <link
-          rel="stylesheet"
-          href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"
-          integrity="sha256-p4NxAoJBhIIN+hmNHrzRCf9tD/miZyoHS5obTRR9BMY="
-          crossorigin=""
-        />
-        <script
-          src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"
-          integrity="sha256-20nQCchB9co0qIjJZRGuk2/Z9VM+kNiyxNV1lvTlZBo="
-          crossorigin=""
-        ></script>
-        <style>
-          html, body {{ margin:0; padding:0; background:transparent; }}
-          #{map_id} {{
-            width: 100%;
-            height: 420px;
-            border-radius: 18px;
-            overflow: hidden;
-            box-shadow: 0 10px 22px rgba(0,0,0,.12);
-            border: 1px solid rgba(14,59,53,.12);
-          }}
-        </style>
-      </head>
-      <body>
-        <div id="{map_id}"></div>
-        <script>
-          const map = L.map("{map_id}", {{
-            zoomControl: true,
-            attributionControl: true,
-          }}).setView([{lat}, {lon}], {int(zoom)});
-
-          L.tileLayer("https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png", {{
-            maxZoom: 19,
-            detectRetina: true,
-            updateWhenIdle: true,
-            keepBuffer: 4,
-            attribution: '&copy; OpenStreetMap contributors'
-          }}).addTo(map);
-
-          L.marker([{lat}, {lon}]).addTo(map);
-        </script>
-      </body>
-    </html>
-    """
-    components.html(html, height=440)
+    # Même key à chaque rerun : l'iframe (Leaflet + tuiles) reste chargée, seuls
+    # lat / lon / zoom lui sont renvoyés ; la carte n'est recentrée que s'ils changent.
+    get_leaflet_map()(
+        lat=float(lat),
+        lon=float(lon),
+        zoom=int(zoom),
+        marker=True,
+        tiles=MAP_TILES_URL,
+        attribution=MAP_TILES_ATTRIBUTION,
+        local_assets=(LEAFLET_COMPONENT_DIR / "vendor" / "leaflet.js").exists(),
+        height=420,
+        key="lyrae_map",
+        default=None,
+    )
 
 
 
@@ -1100,16 +882,115 @@ with st.sidebar:
             del st.session_state[k]
         st.rerun()
 
+    with st.expander("⏱️ Démarrage (imports)"):
+        st.caption("Premier import de chaque module dans ce process (sous-imports compris).")
+        st.dataframe(pd.DataFrame(import_report()), hide_index=True, use_container_width=True)
+
+
+# ============================================================
+# PAGES statiques — AVANT le chargement du modèle (ni catboost, ni rasterio, ni pyproj)
+# ============================================================
+if page == "home":
+    st.markdown(
+        f"""
+        <div class="lyrae-hero">
+          <h1>{APP_TITLE}</h1>
+          <p>{APP_SUBTITLE}</p>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+    st.markdown(
+        f"""
+        <div class="lyrae-illustration">
+          <img src="{HERO_IMAGE_URL}" alt="LYRAE" style="width:100%; height:auto; display:block;">
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+    st.markdown('<div class="lyrae-cta-wrap">', unsafe_allow_html=True)
+    if st.button("Commencer une évaluation clinique  ➜", use_container_width=True):
+        st.session_state["page"] = "eval"
+        st.rerun()
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    st.markdown(
+        """
+        <div class="lyrae-disclaimer">
+          Cet outil est une aide à la décision, non un dispositif médical autonome.
+          Il ne remplace ni l’examen clinique ni le jugement du vétérinaire.
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+    # Préchargement CatBoost + modèle en arrière-plan, une fois l'accueil rendu
+    warmup_predictor_in_background(model_path, meta_path)
+    st.stop()
+
+if page == "methodo":
+    st.markdown(f"<div class='lyrae-page-title'>Méthodologie</div>", unsafe_allow_html=True)
+    st.markdown("<div class='lyrae-card'>", unsafe_allow_html=True)
+    st.markdown(
+        """
+        <h3>Principe général</h3>
+        <p>
+        LYRAE applique un modèle CatBoost entraîné sur un jeu de données structuré.
+        La sortie est une probabilité de Lyme, traduite en catégories d’aide à la décision.
+        </p>
+        <h3>Risque géographique</h3>
+        <p>
+        Si <code>Classe_de_risque</code> existe, elle est remplie automatiquement via un raster (3 classes).
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+    st.markdown("</div>", unsafe_allow_html=True)
+    st.stop()
+
+if page == "sources":
+    st.markdown(f"<div class='lyrae-page-title'>Sources scientifiques</div>", unsafe_allow_html=True)
+    st.markdown("<div class='lyrae-card'>", unsafe_allow_html=True)
+    st.markdown(
+        """
+        <h3>À compléter</h3>
+        <p>Ajoute ici les références (format APA + DOI si possible).</p>
+        """,
+        unsafe_allow_html=True
+    )
+    st.markdown("</div>", unsafe_allow_html=True)
+    st.stop()
+
+if page == "project":
+    st.markdown(f"<div class='lyrae-page-title'>Projet RESOLVE</div>", unsafe_allow_html=True)
+    st.markdown("<div class='lyrae-card'>", unsafe_allow_html=True)
+    st.markdown(
+        """
+        <h3>Contexte</h3>
+        <p>Page projet : objectifs, partenaires, modalités, contact.</p>
+        """,
+        unsafe_allow_html=True
+    )
+    st.markdown("</div>", unsafe_allow_html=True)
+    st.stop()
+
 
 # ============================================================
 # LOAD MODEL + META
 # ============================================================
 try:
-    model, meta, feature_cols, cat_cols, factor_levels, cat_idx = load_model_and_meta(model_path, meta_path)
+    predictor = load_predictor(model_path, meta_path)
 except Exception as e:
     st.error(f"Impossible de charger modèle/meta: {e}")
     st.stop()
 
+model, meta = predictor.model, predictor.meta
+feature_cols, cat_cols, factor_levels, cat_idx = (
+    predictor.feature_cols, predictor.cat_cols, predictor.factor_levels, predictor.cat_idx
+)
+
 
 # ============================================================
 # Vérification colonnes vs XLSX
@@ -1140,6 +1021,30 @@ with st.sidebar:
                     st.write("**Dans feature_cols mais pas dans XLSX :**")
                     st.code("\n".join(extra_in_model))
 
+    st.caption(
+        f"🧠 Modèle {predictor.model_checksum[:12]} ({predictor.engine}), chargé à "
+        f"{time.strftime('%H:%M:%S', time.localtime(predictor.loaded_at))}"
+    )
+    last_reload = (reload_history() or [None])[-1]
+    if last_reload is not None and not last_reload["ok"]:
+        st.warning(f"Rechargement du modèle refusé (ancien modèle conservé) : {last_reload['error']}")
+
+    # Dérive : catégories hors niveaux du meta vues depuis le chargement du modèle
+    drift = predictor.schema.drift_report()
+    if drift["oov_rows"]:
+        oov_cols = {c: d for c, d in drift["columns"].items() if d["oov"]}
+        st.warning(f"⚠️ {drift['oov_rows']} valeur(s) catégorielle(s) hors niveaux du modèle ({drift['rows']} cas).")
+        with st.expander("Valeurs hors niveaux"):
+            for c, d in oov_cols.items():
+                st.write(f"**{c}** : " + ", ".join(f"{v} ({k})" for v, k in d["oov_values"].items()))
+
+    cache_stats = predictor.cache.stats() if predictor.cache is not None else None
+    if cache_stats:
+        st.caption(
+            f"🧮 Cache prédictions : {cache_stats['entries']} entrée(s), "
+            f"{cache_stats['hits']} hit(s) / {cache_stats['misses']} miss"
+        )
+
 analysis_cols_set = set(analysis_cols)
 results_analysis_set = set([c for c in RESULTS_ANALYSIS_COLS if c in feature_cols])
 
@@ -1232,6 +1137,10 @@ def input_widget(col: str, key: str):
     if not has(col):
         return None
 
+    # Widget d'un onglet non affiché au run précédent : Streamlit a oublié sa valeur -> reprise depuis le cas
+    if key not in st.session_state and case.get(col) is not None:
+        st.session_state[key] = case.get(col)
+
     label = question_label(col)
 
     if col == "Season":
@@ -1278,93 +1187,6 @@ def input_widget(col: str, key: str):
     return pd.NA if raw.strip() == "" else raw.strip()
 
 
-# ============================================================
-# PAGES
-# ============================================================
-if page == "home":
-    st.markdown(
-        f"""
-        <div class="lyrae-hero">
-          <h1>{APP_TITLE}</h1>
-          <p>{APP_SUBTITLE}</p>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-
-    st.markdown(
-        f"""
-        <div class="lyrae-illustration">
-          <img src="{HERO_IMAGE_URL}" alt="LYRAE" style="width:100%; height:auto; display:block;">
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-
-    st.markdown('<div class="lyrae-cta-wrap">', unsafe_allow_html=True)
-    if st.button("Commencer une évaluation clinique  ➜", use_container_width=True):
-        st.session_state["page"] = "eval"
-        st.rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
-
-    st.markdown(
-        """
-        <div class="lyrae-disclaimer">
-          Cet outil est une aide à la décision, non un dispositif médical autonome.
-          Il ne remplace ni l’examen clinique ni le jugement du vétérinaire.
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-    st.stop()
-
-if page == "methodo":
-    st.markdown(f"<div class='lyrae-page-title'>Méthodologie</div>", unsafe_allow_html=True)
-    st.markdown("<div class='lyrae-card'>", unsafe_allow_html=True)
-    st.markdown(
-        """
-        <h3>Principe général</h3>
-        <p>
-        LYRAE applique un modèle CatBoost entraîné sur un jeu de données structuré.
-        La sortie est une probabilité de Lyme, traduite en catégories d’aide à la décision.
-        </p>
-        <h3>Risque géographique</h3>
-        <p>
-        Si <code>Classe_de_risque</code> existe, elle est remplie automatiquement via un raster (3 classes).
-        </p>
-        """,
-        unsafe_allow_html=True
-    )
-    st.markdown("</div>", unsafe_allow_html=True)
-    st.stop()
-
-if page == "sources":
-    st.markdown(f"<div class='lyrae-page-title'>Sources scientifiques</div>", unsafe_allow_html=True)
-    st.markdown("<div class='lyrae-card'>", unsafe_allow_html=True)
-    st.markdown(
-        """
-        <h3>À compléter</h3>
-        <p>Ajoute ici les références (format APA + DOI si possible).</p>
-        """,
-        unsafe_allow_html=True
-    )
-    st.markdown("</div>", unsafe_allow_html=True)
-    st.stop()
-
-if page == "project":
-    st.markdown(f"<div class='lyrae-page-title'>Projet RESOLVE</div>", unsafe_allow_html=True)
-    st.markdown("<div class='lyrae-card'>", unsafe_allow_html=True)
-    st.markdown(
-        """
-        <h3>Contexte</h3>
-        <p>Page projet : objectifs, partenaires, modalités, contact.</p>
-        """,
-        unsafe_allow_html=True
-    )
-    st.markdown("</div>", unsafe_allow_html=True)
-    st.stop()
-
-
 # ============================================================
 # EVALUATION — BARRE UNIQUE (Retour | onglets | Suivant) + goto safe
 # ============================================================
@@ -1440,7 +1262,12 @@ STEP_MAP = {name: i + 1 for i, name in enumerate(TAB_FULL)}
 step = STEP_MAP.get(active_tab, 1)
 
 # ✅ IMPORTANT : inputs DOIT exister AVANT tout put()
-inputs: dict = {}
+inputs: dict = {}  # widgets affichés à ce run (onglet actif)
+
+# ✅ Cas commun aux 5 onglets : vecteur de features tenu à jour widget par widget
+case = st.session_state.get("case_state")
+case = CaseState(predictor) if case is None else case.rebind(predictor)
+st.session_state["case_state"] = case
 
 
 
@@ -1457,10 +1284,11 @@ if has("Exterieur_vegetalise") and not has("Exterieur_vegetalisé"):
     ALIASES["Exterieur_vegetalisé"] = "Exterieur_vegetalise"
 
 def put(col: str, value):
+    if col not in feature_cols and col in ALIASES:
+        col = ALIASES[col]
     if col in feature_cols:
         inputs[col] = value
-    elif col in ALIASES and ALIASES[col] in feature_cols:
-        inputs[ALIASES[col]] = value
+        case.set(col, value)  # no-op si la valeur n'a pas changé
 
 
 if active_tab == "Identité":
@@ -1622,12 +1450,16 @@ elif active_tab == "Contexte & exposition":
             st.session_state["risk_class"] = None
             st.warning("Adresse incomplète — renseigne au minimum rue + ville (et idéalement le code postal).")
         else:
-            geo_tmp = geocode_address(full_address)
+            no_street = str(num).strip() == "" and str(street).strip() == ""
+            geo_tmp = geocode_address(full_address, cp=cp, city=city, local_first=no_street)
 
             if isinstance(geo_tmp, dict) and geo_tmp.get("__error__"):
                 st.session_state["geo"] = None
                 st.session_state["risk_class"] = None
-                st.warning(f"Impossible de localiser l’adresse (HTTP {geo_tmp.get('status')}).")
+                if geo_tmp.get("status") == "timeout":
+                    st.warning("Services de géocodage trop lents — réessaie dans un instant.")
+                else:
+                    st.warning(f"Impossible de localiser l’adresse (HTTP {geo_tmp.get('status')}).")
             elif geo_tmp is None:
                 st.session_state["geo"] = None
                 st.session_state["risk_class"] = None
@@ -1643,6 +1475,10 @@ elif active_tab == "Contexte & exposition":
 
                 rc = st.session_state["risk_class"] or "inconnu"
                 st.success(f"✅ Localisation effectuée — classe de risque : **{rc}**")
+                if geo_tmp.get("provider") == LOCAL_PROVIDER:
+                    where = "du code postal" if geo_tmp.get("precision") == "code_postal" else "de la commune"
+                    why = "" if no_street or GEOCODE_OFFLINE else " (géocodage en ligne indisponible)"
+                    st.info(f"Position approximative : centre {where}{why}.")
 
     geo = st.session_state.get("geo", None)
     if geo is not None:
@@ -1817,25 +1653,22 @@ elif active_tab == "Résultats d'analyse":
 
             if has("Classe_de_risque"):
                 auto_risk = st.session_state.get("risk_class", None)
-                inputs["Classe_de_risque"] = pd.NA if (auto_risk is None or str(auto_risk).strip() == "") else auto_risk
-
-            X = build_template(feature_cols)
-            X = apply_inputs_to_template(X, inputs)
+                put("Classe_de_risque", pd.NA if (auto_risk is None or str(auto_risk).strip() == "") else auto_risk)
 
-            X = fill_missing_code_like_R(X, set(analysis_cols))
-            X = coerce_like_train_python(X, feature_cols, cat_cols, factor_levels)
+            # Vecteur du cas (tous les onglets) déjà coercé : pas de reconstruction du DataFrame
+            X = case.frame()
+            predictor.schema.observe(X)
+            case_inputs = case.inputs()
 
-            # ✅ Sécurisation CatBoost : pas de pd.NA dans les cat features
-            X_cb = X.copy()
-            for c in cat_cols:
-                if c in X_cb.columns:
-                    X_cb[c] = X_cb[c].astype("string").fillna("__MISSING__").astype(str)
-
-            pool_one = Pool(X_cb, cat_features=cat_idx)
-            p_one = float(model.predict_proba(pool_one)[:, 1][0])
+            p_one = float(predictor.predict_proba(X)[0])
 
             cat = cat_from_p_like_R(p_one)
 
+            # Modèles shadow du registre : en arrière-plan, le résultat ne les attend pas
+            shadow_scorer = get_shadow_scorer()
+            if shadow_scorer is not None:
+                shadow_scorer.shadow(case_inputs, Path(model_path).stem, p_one, primary_sha256=predictor.model_checksum)
+
         marker_left = int(max(0, min(100, round(p_one * 100))))
 
         st.markdown(
@@ -1863,8 +1696,84 @@ elif active_tab == "Résultats d'analyse":
                 st.code("\n".join(missing_feats[:200]))
                 if len(missing_feats) > 200:
                     st.caption(f"... +{len(missing_feats)-200} autres")
+
+            # Contributions SHAP (cache process par ligne de features)
+            try:
+                contrib, base = explain(predictor, X)
+                contrib_df = contribution_table(predictor, X, contrib, base, top=25)
+            except Exception as e:
+                st.caption(f"Contributions indisponibles : {type(e).__name__}: {e}")
+            else:
+                st.write("**Contributions des variables** (log-odds, les plus fortes d'abord)")
+                st.dataframe(
+                    pd.DataFrame({
+                        "Variable": [question_label(c) for c in contrib_df["feature"]],
+                        "Valeur": contrib_df["value"].astype(str),
+                        "Contribution": contrib_df["contribution"].round(4),
+                        "Sens": contrib_df["direction"],
+                    }),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+                st.caption(f"Valeur de base du modèle : {contrib_df.attrs['base']:.3f} (log-odds).")
+
             st.dataframe(X, use_container_width=True)
 
+        # Et si… ? : toutes les analyses non renseignées, Oui puis Non, en un seul predict_proba
+        whatif = sensitivity(predictor, case_inputs)
+        with st.expander("🧪 Et si… ? (analyses non renseignées)"):
+            rk = whatif["ranking"]
+            if rk.empty:
+                st.write("Toutes les analyses du modèle sont renseignées.")
+            else:
+                st.caption(
+                    f"{len(rk)} analyses × Oui/Non scorées en un seul passage — "
+                    "classées par effet maximal sur la probabilité."
+                )
+                st.dataframe(
+                    pd.DataFrame({
+                        "Analyse": [question_label(c) for c in rk["test"]],
+                        "Si Oui": (rk["p_Oui"] * 100).round(1),
+                        "Δ Oui (pts)": (rk["delta_Oui"] * 100).round(1),
+                        "Si Non": (rk["p_Non"] * 100).round(1),
+                        "Δ Non (pts)": (rk["delta_Non"] * 100).round(1),
+                        "Change la catégorie": rk["change_category"],
+                    }),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+
+        # Prochain examen : issues pondérées par les taux du jeu de référence, 1 seul scoring
+        ref_rates = load_reference_outcome_rates()
+        reco = recommend_next_tests(predictor, case_inputs, ref_rates)
+        with st.expander("🎯 Prochain examen conseillé"):
+            rk = reco["ranking"]
+            if rk.empty:
+                st.write("Aucun examen en attente.")
+            else:
+                top = rk.iloc[0]
+                if top["p_change"] > 0:
+                    st.info(
+                        f"**{top['test']}** : {top['p_change'] * 100:.0f} % de chances de changer "
+                        f"la catégorie ({top['lowest_category']} → {top['highest_category']})."
+                    )
+                else:
+                    st.write("Aucun examen en attente ne devrait changer la catégorie.")
+                st.dataframe(
+                    pd.DataFrame({
+                        "Examen": rk["test"],
+                        "P(positif) réf. (%)": (rk["p_positive_ref"] * 100).round(0),
+                        "P(changement de catégorie) (%)": (rk["p_change"] * 100).round(0),
+                        "Écart attendu (crans)": rk["expected_shift"].round(2),
+                        "Gain d'information (bits)": rk["info_gain_bits"].round(2),
+                        "Proba attendue (%)": (rk["expected_probability"] * 100).round(1),
+                    }),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+                src = "jeu de référence" if ref_rates is not None else "issues équiprobables (jeu de référence illisible)"
+                st.caption(f"{reco['n_variants']} variantes scorées en {reco['elapsed_ms']:.0f} ms — pondération : {src}.")
+
     last = st.session_state.get("last_result", None)
     if last is not None:
         st.markdown("---")
@@ -1905,33 +1814,13 @@ elif active_tab == "Résultats d'analyse":
     st.markdown("</div>", unsafe_allow_html=True)
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# ============================================================
+# CAS EN COURS (après les onglets : compte les widgets de ce run)
+# ============================================================
+with st.sidebar:
+    st.caption(f"📝 Cas en cours : {len(case.raw)} variable(s) renseignée(s) sur les 5 onglets")
+    if st.button("🗑️ Nouveau cas", use_container_width=True):
+        case.clear()
+        for k in [k for k in st.session_state if str(k).startswith(WIDGET_PREFIXES)]:
+            del st.session_state[k]
+        st.rerun()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+LYRAE — cœur d'inférence réutilisable hors Streamlit.
+
+- lyrae.core  : variables du modèle, prétraitement "comme R", scoring CatBoost
+- lyrae.predictor : Predictor (modèle + meta chargés une fois ; 1 cas, N cas, flux ; rechargement à chaud)
+- lyrae.batch : scoring en lot en ligne de commande (python -m lyrae.batch)
+- lyrae.stream : scoring en flux des gros fichiers (XLSX read_only / CSV par paquets, sortie CSV/Parquet incrémentale)
+- lyrae.parallel : scoring en lot réparti sur un pool de processus (modèle chargé 1 fois par worker)
+- lyrae.bench : micro-benchmarks (python -m lyrae.bench)
+- lyrae.lazy  : imports différés + relevé des temps d'import
+- lyrae.explain : contributions SHAP par variable (1 appel par lot, cache par ligne)
+- lyrae.casestate : état du cas en cours (vecteur de features typé, mis à jour widget par widget)
+- lyrae.whatif : mode « et si… ? » (analyses non renseignées basculées Oui/Non, un seul scoring)
+- lyrae.recommend : prochain examen conseillé (changement de catégorie attendu, taux du jeu de référence)
+- lyrae.geo   : géocodage BAN / Nominatim en course (requête couverte, échéance) + cache disque
+- lyrae.geobatch : géocodage en masse (BAN CSV + Nominatim à débit limité, point de reprise SQLite)
+- lyrae.communes : index local des centroïdes CP / communes (repli hors ligne, commune la plus proche)
+- lyrae.risk  : raster de risque (classe de risque pour 1 ou N points, COG par tuiles)
+- lyrae.riskgrid : grille de risque compacte .npy memory-mappée (NumPy seul)
+- lyrae.treemodel : évaluateur NumPy du modèle exporté (arbres oblivious + CTR, python -m lyrae.treemodel)
+- lyrae.registry : registre de modèles versionnés, scoring shadow / A/B + journal SQLite (python -m lyrae.registry)
+- lyrae.server : service HTTP/JSON local de scoring avec micro-batching (python -m lyrae.server)
+- lyrae.rangeserver : serveur HTTP local avec range requests (doublure d'un hébergement COG)
+"""
+
+# Predictor ré-exporté à la demande : "import lyrae.riskgrid" ne charge pas pandas
+_LAZY_EXPORTS = {"Predictor": "lyrae.predictor", "get_predictor": "lyrae.predictor"}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+    raise AttributeError(f"module 'lyrae' has no attribute {name!r}")
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Scoring en lot LYRAE (sans Streamlit).
+
+Usage :
+    python -m lyrae.batch cas.xlsx -o scores.csv
+    python -m lyrae.batch export_labo.csv --model equine_lyme_catboost.cbm --meta equine_lyme_catboost_meta.json
+    python -m lyrae.batch cas.xlsx -o scores.csv --contributions contributions.parquet
+    python -m lyrae.batch ecuries.csv --raster mean_R1_RF_prob_rep01_05_CATEG_3classes.tif --lat-col lat --lon-col lon
+    python -m lyrae.batch registre.xlsx -o scores.parquet --chunk-size 20000
+    python -m lyrae.batch registre.csv -o scores.csv --workers 4 --thread-count 1
+
+Le fichier d'entrée suit le schéma de jeu_fictif_lyme_equine_cas_parfaits.xlsx.
+Toutes les lignes passent dans un seul Pool / un seul predict_proba ; la sortie
+reprend les colonnes d'entrée + "probability" + "category" (cat_from_p_like_R).
+Avec --raster, la "Classe de risque" manquante est d'abord déduite des coordonnées.
+Avec --chunk-size, le fichier est lu, scoré et écrit par paquets (lyrae.stream) :
+mémoire bornée quelle que soit sa taille, sortie .csv ou .parquet.
+Avec --workers, prétraitement + scoring sont répartis sur un pool de processus
+(lyrae.parallel), résultats dans l'ordre du fichier.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from lyrae.core import META_DEFAULT, MODEL_DEFAULT, ROOT_DIR, cat_from_p_like_R, read_cases
+from lyrae.predictor import ENGINES, Predictor
+
+
+def score_cases(df: pd.DataFrame, predictor: Predictor, X: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Retourne une copie de df avec les colonnes probability + category.
+    X : features déjà prétraitées (predictor.prepare_many(df)), pour les réutiliser.
+    """
+    if X is None:
+        X = predictor.prepare_many(df)
+    # Fichier lu une seule fois : inutile de remplir le cache LRU du process
+    p = predictor.predict_proba(X, use_cache=False)
+    res = pd.DataFrame({"probability": p, "category": [cat_from_p_like_R(float(v)) for v in p]})
+
+    out = df.reset_index(drop=True).copy()
+    out["probability"] = res["probability"].to_numpy()
+    out["category"] = res["category"].to_numpy()
+    return out
+
+
+def write_scores(out: pd.DataFrame, path: Path) -> None:
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        out.to_excel(path, index=False, engine="openpyxl")
+    elif path.suffix.lower() == ".parquet":
+        out.to_parquet(path, index=False)
+    else:
+        out.to_csv(path, index=False)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(
+        prog="python -m lyrae.batch",
+        description="Scoring LYRAE en lot (CSV/XLSX) -> probabilité + catégorie.",
+    )
+    ap.add_argument("input", help="Fichier de cas (.csv ou .xlsx)")
+    ap.add_argument("-o", "--output", default=None,
+                    help="Fichier de sortie (.csv, .xlsx ou .parquet). Défaut : <input>_scores.csv")
+    ap.add_argument("--model", default=str(ROOT_DIR / MODEL_DEFAULT), help="Chemin modèle .cbm")
+    ap.add_argument("--meta", default=str(ROOT_DIR / META_DEFAULT), help="Chemin meta .json")
+    ap.add_argument("--engine", choices=ENGINES, default="auto",
+                    help="auto : évaluateur NumPy (<modèle>.npz) s'il est à jour, sinon CatBoost")
+    ap.add_argument("--sheet", default=0, help="Feuille XLSX (index ou nom)")
+    ap.add_argument("--sep", default=None, help="Séparateur CSV (défaut : détection auto)")
+    ap.add_argument("--raster", default=None,
+                    help="GeoTIFF de risque : complète 'Classe de risque' depuis --lat-col/--lon-col")
+    ap.add_argument("--lat-col", default="lat", help="Colonne latitude WGS84 (avec --raster)")
+    ap.add_argument("--lon-col", default="lon", help="Colonne longitude WGS84 (avec --raster)")
+    ap.add_argument("--contributions", default=None,
+                    help="Parquet des contributions SHAP par ligne (1 seul calcul pour tout le fichier)")
+    ap.add_argument("--chunk-size", type=int, default=0,
+                    help="Lecture / scoring / écriture par paquets de N lignes (mémoire bornée ; "
+                         "sortie .csv ou .parquet). 0 = fichier entier en mémoire")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="Processus de scoring (modèle chargé 1 fois par processus). 0 = dans ce processus")
+    ap.add_argument("--thread-count", type=int, default=None,
+                    help="Threads CatBoost par processus (défaut : tous les cœurs, ou cœurs // workers)")
+    return ap
+
+
+def _report_missing(predictor: Predictor, columns) -> None:
+    missing = [c for c in predictor.feature_cols if c not in columns and not c.endswith("_missing_code")]
+    if missing:
+        print(f"⚠️ {len(missing)} variable(s) absente(s) du fichier (traitées comme manquantes) : "
+              + ", ".join(missing[:10]) + (" ..." if len(missing) > 10 else ""), file=sys.stderr)
+
+
+def _risk_class_transform(args, predictor: Predictor):
+    """df -> df avec 'Classe de risque' complétée depuis --raster (raster ouvert une fois)."""
+    # Import local : rasterio/pyproj seulement si on en a besoin
+    from lyrae.risk import RiskRaster, add_risk_class
+    raster = RiskRaster(args.raster)
+
+    def transform(df: pd.DataFrame) -> pd.DataFrame:
+        for c in (args.lat_col, args.lon_col):
+            if c not in df.columns:
+                raise ValueError(f"Colonne '{c}' absente du fichier (requise avec --raster)")
+        return add_risk_class(df, raster, predictor.factor_levels, lat_col=args.lat_col, lon_col=args.lon_col)
+
+    return transform
+
+
+def _print_progress(rows: int, seconds: float) -> None:
+    rate = rows / seconds if seconds > 0 else 0.0
+    print(f"\r{rows:,} cas scorés — {rate:,.0f} cas/s ".replace(",", " "), end="", file=sys.stderr, flush=True)
+
+
+def main_stream(args, predictor: Predictor, in_path: Path, out_path: Path, sheet, risk_class, scorer=None) -> int:
+    from lyrae.stream import score_file
+
+    try:
+        stats = score_file(in_path, predictor, out_path, chunk_size=args.chunk_size, sheet=sheet, sep=args.sep,
+                           transform=risk_class, contributions_path=args.contributions, progress=_print_progress,
+                           scorer=scorer)
+    except (ValueError, ImportError) as e:
+        print(f"\nScoring en flux impossible : {e}", file=sys.stderr)
+        return 2
+    print(file=sys.stderr)
+
+    _report_missing(predictor, stats["columns"])
+    rate = f"{stats['rows_per_s']:,.0f}".replace(",", " ")
+    print(f"{stats['rows']} cas scorés en {stats['seconds']:.2f} s ({stats['chunks']} paquet(s), "
+          f"{rate} cas/s) -> {out_path}")
+    if stats["rows"]:
+        print(pd.Series(stats["categories"], name="count").rename_axis("category")
+              .sort_values(ascending=False, kind="stable").to_string())
+    return 0
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    in_path = Path(args.input)
+    out_path = Path(args.output) if args.output else in_path.with_name(f"{in_path.stem}_scores.csv")
+    sheet = int(args.sheet) if str(args.sheet).isdigit() else args.sheet
+
+    try:
+        predictor = Predictor(args.model, args.meta, engine=args.engine, thread_count=args.thread_count or -1)
+    except Exception as e:
+        print(f"Impossible de charger modèle/meta: {e}", file=sys.stderr)
+        return 2
+
+    risk_class = _risk_class_transform(args, predictor) if args.raster else None
+    if args.workers > 0:
+        from lyrae.parallel import ParallelScorer
+        with ParallelScorer(args.model, args.meta, engine=args.engine, workers=args.workers,
+                            thread_count=args.thread_count) as scorer:
+            print(f"{scorer.workers} processus de scoring, {scorer.thread_count} thread(s) CatBoost chacun",
+                  file=sys.stderr)
+            return main_scores(args, predictor, in_path, out_path, sheet, risk_class, scorer)
+    return main_scores(args, predictor, in_path, out_path, sheet, risk_class)
+
+
+def main_scores(args, predictor: Predictor, in_path: Path, out_path: Path, sheet, risk_class, scorer=None) -> int:
+    if args.chunk_size > 0:
+        return main_stream(args, predictor, in_path, out_path, sheet, risk_class, scorer)
+
+    t0 = time.perf_counter()
+    df = read_cases(in_path, sheet=sheet, sep=args.sep)
+    if risk_class is not None:
+        try:
+            df = risk_class(df)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+    if scorer is not None:
+        X = None
+        out = scorer.score_cases(df)
+    else:
+        X = predictor.prepare_many(df)
+        out = score_cases(df, predictor, X)
+    write_scores(out, out_path)
+    dt = time.perf_counter() - t0
+
+    if args.contributions:
+        from lyrae.explain import contributions_frame, write_contributions
+        t1 = time.perf_counter()
+        try:
+            if X is None:
+                X = predictor.prepare_many(df)
+            write_contributions(contributions_frame(predictor, X), args.contributions)
+        except ImportError as e:
+            print(f"Écriture Parquet impossible ({e}) : installer pyarrow ou utiliser un .csv", file=sys.stderr)
+            return 2
+        print(f"Contributions SHAP en {time.perf_counter() - t1:.2f} s -> {args.contributions}")
+
+    _report_missing(predictor, df.columns)
+
+    print(f"{len(out)} cas scorés en {dt:.2f} s -> {out_path}")
+    print(out["category"].value_counts().to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
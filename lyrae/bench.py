@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks LYRAE.
+
+Usage :
+    python -m lyrae.bench preprocess --rows 100000
+    python -m lyrae.bench server --clients 32 --requests 2000 --max-batch 64
+    python -m lyrae.bench parallel --rows 200000 --workers 1,2,4,8
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import pandas as pd
+
+from lyrae.core import META_DEFAULT, MODEL_DEFAULT, ROOT_DIR, FeatureSchema, load_meta, prepare_features
+from lyrae.predictor import ENGINES
+
+REF_XLSX_DEFAULT = "jeu_fictif_lyme_equine_cas_parfaits.xlsx"
+
+
+def _reference_rows(xlsx_path: Path, n_rows: int) -> pd.DataFrame:
+    """Répète le jeu de référence jusqu'à n_rows lignes (valeurs en Oui/Non pour 1 ligne sur 3)."""
+    ref = pd.read_excel(xlsx_path, engine="openpyxl").astype(object)
+    yn = ref.iloc[::3].copy()
+    for c in yn.columns:
+        yn[c] = yn[c].map({1: "Oui", 0: "Non"}).fillna(yn[c])
+    ref.iloc[::3] = yn
+    reps = -(-n_rows // len(ref))
+    return pd.concat([ref] * reps, ignore_index=True).iloc[:n_rows]
+
+
+def bench_preprocess(meta_path: Path, xlsx_path: Path, n_rows: int, repeat: int = 3) -> dict:
+    meta = load_meta(meta_path)
+    df = _reference_rows(xlsx_path, n_rows)
+    # Schéma compilé une fois, comme au chargement du Predictor
+    schema = FeatureSchema(meta["feature_cols"], meta["cat_cols"], meta["factor_levels"])
+
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        prepare_features(df, meta["feature_cols"], meta["cat_cols"], meta["factor_levels"], schema=schema)
+        best = min(best, time.perf_counter() - t0)
+
+    return {"rows": n_rows, "seconds": best, "us_per_row": best / n_rows * 1e6}
+
+
+def bench_server(predictor, xlsx_path: Path, n_requests: int, clients: int,
+                 max_batch_size: int, max_wait_ms: float) -> dict:
+    """n_requests POST /predict (1 cas chacun) envoyés par `clients` threads en parallèle."""
+    from lyrae.server import serve_scoring
+
+    ref = pd.read_excel(xlsx_path, engine="openpyxl")
+    cases = [{k: v for k, v in r.items() if not pd.isna(v)} for r in ref.to_dict("records")]
+    bodies = [json.dumps({"case": cases[i % len(cases)]}, default=str).encode("utf-8") for i in range(n_requests)]
+
+    server = serve_scoring(predictor, port=0, max_batch_size=max_batch_size,
+                           max_wait_ms=max_wait_ms, background=True)
+    url = f"http://127.0.0.1:{server.server_address[1]}/predict"
+    errors = []
+
+    def worker(k: int):
+        for body in bodies[k::clients]:
+            req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(req, timeout=30) as r:
+                    r.read()
+            except Exception as e:
+                errors.append(e)
+
+    try:
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        dt = time.perf_counter() - t0
+        stats = server.batcher.stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {"requests": n_requests, "seconds": dt, "rps": n_requests / dt,
+            "mean_batch": stats["mean_batch"], "errors": len(errors)}
+
+
+def bench_parallel(model_path: Path, meta_path: Path, xlsx_path: Path, n_rows: int, workers_list: list,
+                   engine: str = "auto", thread_count: int = None) -> list[dict]:
+    """
+    Débit du scoring en lot (prétraitement + predict_proba) selon le nombre de
+    processus ; workers=0 : dans ce processus (référence). Modèles chargés hors mesure.
+    """
+    from lyrae.parallel import ParallelScorer
+    from lyrae.predictor import Predictor
+
+    df = _reference_rows(xlsx_path, n_rows)
+    rows = []
+    for w in workers_list:
+        if w == 0:
+            tc = thread_count or -1
+            predictor = Predictor(model_path, meta_path, use_cache=False, engine=engine, thread_count=tc)
+            t0 = time.perf_counter()
+            predictor.predict_proba(predictor.prepare_many(df), use_cache=False)
+            dt = time.perf_counter() - t0
+        else:
+            with ParallelScorer(model_path, meta_path, engine=engine, workers=w, thread_count=thread_count) as scorer:
+                scorer.warmup()
+                tc = scorer.thread_count
+                t0 = time.perf_counter()
+                scorer.predict_proba(df)
+                dt = time.perf_counter() - t0
+        rows.append({"workers": w, "thread_count": tc, "seconds": dt, "rows_per_s": n_rows / dt})
+
+    base = rows[0]["rows_per_s"] if rows else 0.0
+    for r in rows:
+        r["speedup"] = r["rows_per_s"] / base if base else 0.0
+    return rows
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m lyrae.bench", description="Micro-benchmarks LYRAE.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_pre = sub.add_parser("preprocess", help="fill_missing_code_like_R + coerce_like_train_python sur N lignes")
+    p_pre.add_argument("--rows", type=int, default=100_000)
+    p_pre.add_argument("--repeat", type=int, default=3)
+    p_pre.add_argument("--meta", default=str(ROOT_DIR / META_DEFAULT))
+    p_pre.add_argument("--xlsx", default=str(ROOT_DIR / REF_XLSX_DEFAULT))
+
+    p_srv = sub.add_parser("server", help="débit de lyrae.server : sans micro-batching vs avec")
+    p_srv.add_argument("--requests", type=int, default=2000)
+    p_srv.add_argument("--clients", type=int, default=32)
+    p_srv.add_argument("--max-batch", type=int, default=64)
+    p_srv.add_argument("--max-wait-ms", type=float, default=5.0)
+    p_srv.add_argument("--model", default=str(ROOT_DIR / MODEL_DEFAULT))
+    p_srv.add_argument("--meta", default=str(ROOT_DIR / META_DEFAULT))
+    p_srv.add_argument("--xlsx", default=str(ROOT_DIR / REF_XLSX_DEFAULT))
+
+    p_par = sub.add_parser("parallel", help="débit du scoring en lot selon le nombre de processus (lyrae.parallel)")
+    p_par.add_argument("--rows", type=int, default=200_000)
+    p_par.add_argument("--workers", default="0,1,2,4", help="Liste de nombres de processus (0 = dans ce processus)")
+    p_par.add_argument("--thread-count", type=int, default=None, help="Threads CatBoost par processus (défaut : cœurs // workers)")
+    p_par.add_argument("--engine", choices=ENGINES, default="auto")
+    p_par.add_argument("--model", default=str(ROOT_DIR / MODEL_DEFAULT))
+    p_par.add_argument("--meta", default=str(ROOT_DIR / META_DEFAULT))
+    p_par.add_argument("--xlsx", default=str(ROOT_DIR / REF_XLSX_DEFAULT))
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "preprocess":
+        r = bench_preprocess(Path(args.meta), Path(args.xlsx), args.rows, args.repeat)
+        print(f"preprocess : {r['rows']} lignes en {r['seconds']:.3f} s -> {r['us_per_row']:.1f} µs/ligne")
+    elif args.cmd == "server":
+        from lyrae.predictor import Predictor
+        # Sans cache LRU : les mêmes cas de référence reviennent en boucle, on mesure le scoring
+        predictor = Predictor(args.model, args.meta, use_cache=False)
+        for mb, mw in ((1, 0.0), (args.max_batch, args.max_wait_ms)):
+            r = bench_server(predictor, Path(args.xlsx), args.requests, args.clients, mb, mw)
+            print(f"max_batch={mb:<4} max_wait={mw:g} ms : {r['rps']:.0f} req/s "
+                  f"(paquet moyen {r['mean_batch']}, {r['errors']} erreur(s))")
+    elif args.cmd == "parallel":
+        workers = [int(w) for w in args.workers.split(",") if w.strip()]
+        rows = bench_parallel(Path(args.model), Path(args.meta), Path(args.xlsx), args.rows, workers,
+                              engine=args.engine, thread_count=args.thread_count)
+        print(f"{'workers':>7} {'threads':>7} {'s':>8} {'lignes/s':>10} {'x':>6}")
+        for r in rows:
+            print(f"{r['workers']:>7} {r['thread_count']:>7} {r['seconds']:>8.2f} "
+                  f"{r['rows_per_s']:>10.0f} {r['speedup']:>6.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
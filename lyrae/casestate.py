@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+État du cas en cours de saisie : un vecteur de features typé, tenu à jour
+variable par variable, pour tous les onglets du formulaire.
+
+    from lyrae.casestate import CaseState
+    case = CaseState(predictor)
+    case.set("ELISA_pos", "Oui")      # 1 widget modifié -> 1 valeur coercée + son *_missing_code
+    X = case.frame()                  # = predictor.prepare_one(case.inputs()), sans reconstruction
+    p = predictor.predict_proba(X)
+
+Les valeurs brutes (celles que renvoient les widgets) sont conservées à côté du
+vecteur : elles servent à réafficher un widget quand on revient sur son onglet
+(Streamlit oublie l'état des widgets non affichés) et aux modules qui prennent
+un dict d'entrées (lyrae.whatif, lyrae.recommend, registre shadow).
+"""
+
+import numpy as np
+import pandas as pd
+
+from lyrae.core import MISSING_LEVEL, analysis_cols
+
+# Préfixes des clés de widgets du formulaire (un par onglet / bloc) : "Nouveau cas" les efface
+WIDGET_PREFIXES = ("id_", "ctx_", "excl_", "sg_", "sn_", "so_", "sa_", "sc_", "res_", "extra_")
+
+
+def _is_na(v) -> bool:
+    try:
+        return bool(pd.isna(v))
+    except (TypeError, ValueError):
+        return False
+
+
+class CaseState:
+    """
+    Vecteur de features d'1 cas : bloc float (numériques + *_missing_code) et
+    catégorielles en str, dans le plan de predictor.schema. set() ne touche que la
+    variable modifiée et son *_missing_code ; frame() ne reconstruit le DataFrame
+    qu'après une modification.
+    """
+
+    def __init__(self, predictor, values: dict = None):
+        self.schema = predictor.schema
+        self.feature_cols = list(predictor.feature_cols)
+        schema = self.schema
+        self._num_idx = {c: i for i, c in enumerate(schema.num_cols)}
+        self._cat_idx = {c: i for i, c in enumerate(schema.cat_cols)}
+
+        # base -> (position du *_missing_code dans le bloc float, code si manquant)
+        analysis_set = set(analysis_cols)
+        self._missing_code = {}
+        for mc in schema.num_cols:
+            base = mc.replace("_missing_code", "") if mc.endswith("_missing_code") else None
+            if base is not None and base in self.feature_cols:
+                self._missing_code[base] = (self._num_idx[mc], 2.0 if base in analysis_set else 1.0)
+
+        self.clear()
+        for col, v in (values or {}).items():
+            self.set(col, v)
+
+    def clear(self) -> None:
+        """Cas vide (comme build_template + fill_missing_code_like_R)."""
+        self.raw: dict = {}
+        self._num = np.full(len(self.schema.num_cols), np.nan)
+        for j, mc in enumerate(self.schema.num_cols):
+            if mc.endswith("_missing_code"):
+                self._num[j] = 0.0
+        for pos, code in self._missing_code.values():
+            self._num[pos] = code
+        self._cat = np.full(len(self.schema.cat_cols), MISSING_LEVEL, dtype=object)
+        self.version = 0
+        self._frame = None
+
+    def rebind(self, predictor) -> "CaseState":
+        """Même cas pour un autre Predictor (modèle rechargé) ; self si le schéma n'a pas changé."""
+        if predictor.schema is self.schema:
+            return self
+        return CaseState(predictor, self.raw)
+
+    # ---------------- mise à jour ----------------
+    def set(self, col: str, value) -> bool:
+        """Valeur brute d'une variable du modèle ; True si le vecteur a changé."""
+        if col not in self.feature_cols:
+            return False
+        missing = _is_na(value)
+        old = self.raw.get(col)
+        if (missing and col not in self.raw) or (
+            not missing and col in self.raw and type(old) is type(value) and old == value
+        ):
+            return False
+
+        if missing:
+            self.raw.pop(col, None)
+        else:
+            self.raw[col] = value
+        v = self.schema.coerce_value(col, value)
+        if col in self._cat_idx:
+            self._cat[self._cat_idx[col]] = v
+        else:
+            self._num[self._num_idx[col]] = v
+        if col in self._missing_code:
+            pos, code = self._missing_code[col]
+            self._num[pos] = code if missing else 0.0
+
+        self.version += 1
+        self._frame = None
+        return True
+
+    def update(self, values: dict) -> bool:
+        changed = False
+        for col, v in values.items():
+            changed |= self.set(col, v)
+        return changed
+
+    # ---------------- lecture ----------------
+    def get(self, col: str, default=None):
+        """Valeur brute saisie (pour réafficher le widget), default si non renseignée."""
+        return self.raw.get(col, default)
+
+    def inputs(self) -> dict:
+        """Dict variable -> valeur brute des variables renseignées (entrée de prepare_one / whatif)."""
+        return dict(self.raw)
+
+    def frame(self) -> pd.DataFrame:
+        """X (1 ligne) prêt pour predict_proba ; ne pas modifier (réutilisé jusqu'au prochain set)."""
+        if self._frame is None:
+            self._frame = self.schema.assemble(self._num[None, :].copy(), self._cat[None, :].copy())
+        return self._frame
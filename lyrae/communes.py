@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Index local des centroïdes de communes / codes postaux (NumPy seul, sans réseau).
+
+Source : la base officielle des codes postaux (data.gouv.fr,
+communes-departement-region.csv ou laposte_hexasmal.csv avec coordonnées),
+compilée une fois en .npz :
+    python -m lyrae.communes build communes-departement-region.csv communes.npz
+    python -m lyrae.communes locate communes.npz --cp 69001 --city Lyon
+    python -m lyrae.communes reverse communes.npz 45.76 4.83
+
+- locate(cp, ville)   : CP + commune -> centroïde de la commune ; CP seul -> centroïde
+                        du code postal ; commune seule -> centroïde si le nom est unique
+- reverse(lat, lon)   : commune la plus proche (grille de cellules de cell_deg degrés)
+
+Sert de repli au géocodage quand BAN et Nominatim sont injoignables (postes hors
+ligne) : la position est approximative (centre de commune) mais suffit à la
+classe de risque, dont les zones sont bien plus larges qu'une commune.
+"""
+
+import argparse
+import math
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lyrae.core import normalize_key
+
+INDEX_FORMAT_VERSION = 1
+CELL_DEG_DEFAULT = 0.1     # ~11 km en latitude
+REVERSE_MAX_KM = 50.0      # au-delà, pas de commune (point hors de France)
+LOCAL_PROVIDER = "Local"   # valeur de geo["provider"] pour un résultat de l'index
+
+# Colonnes reconnues dans le CSV source (par ordre de préférence)
+_CP_COLS = ("code_postal", "codepostal", "cp")
+_NAME_COLS = ("nom_commune_complet", "nom_commune", "nom_de_la_commune", "nom_commune_postal",
+              "libelle_acheminement", "libelle_d_acheminement", "commune")
+_LAT_COLS = ("latitude", "lat")
+_LON_COLS = ("longitude", "lon", "lng")
+_GPS_COLS = ("coordonnees_gps", "coordonnees_geographiques", "coordonnees")
+
+_KM_PER_DEG = 111.2
+
+
+def city_key(name) -> str:
+    """Nom de commune comparable : sans accents ni ponctuation, minuscules, St -> saint, sans CEDEX."""
+    if name is None or (isinstance(name, float) and math.isnan(name)):
+        return ""
+    s = re.sub(r"[^a-z0-9]+", " ", normalize_key(name).lower())
+    s = re.sub(r"\bcedex\b.*$", "", s)
+    return " ".join({"st": "saint", "ste": "sainte"}.get(w, w) for w in s.split())
+
+
+def postcode_key(cp) -> str:
+    """Code postal sur 5 chiffres ("1000" ou 1000.0 -> "01000") ; "" si invalide."""
+    if cp is None or (isinstance(cp, float) and math.isnan(cp)):
+        return ""
+    s = str(cp).strip()
+    if s.endswith(".0"):
+        s = s[:-2]
+    s = re.sub(r"\s+", "", s)
+    return s.zfill(5) if s.isdigit() and len(s) <= 5 else ""
+
+
+def _pick(columns: dict, names) -> str | None:
+    for n in names:
+        if n in columns:
+            return columns[n]
+    return None
+
+
+def read_communes_csv(path) -> pd.DataFrame:
+    """
+    CSV source -> DataFrame cp, name, key, alias, lat, lon (1 ligne par couple code
+    postal / commune) ; alias = 2e nom disponible (ex. libellé d'acheminement "LYON"
+    pour "LYON 01"), cherché aussi par locate().
+    """
+    from lyrae.stream import sniff_sep
+
+    raw = pd.read_csv(path, sep=sniff_sep(path), dtype=str, encoding="utf-8-sig", keep_default_na=False)
+    columns = {city_key(c).replace(" ", "_"): c for c in raw.columns}
+    cp_col = _pick(columns, _CP_COLS)
+    name_col = _pick(columns, _NAME_COLS)
+    alias_col = _pick({k: v for k, v in columns.items() if v != name_col}, _NAME_COLS)
+    if cp_col is None or name_col is None:
+        raise ValueError(f"{Path(path).name} : colonnes code postal / nom de commune introuvables")
+
+    lat_col, lon_col = _pick(columns, _LAT_COLS), _pick(columns, _LON_COLS)
+    if lat_col is not None and lon_col is not None:
+        lat, lon = raw[lat_col], raw[lon_col]
+    else:
+        gps_col = _pick(columns, _GPS_COLS)
+        if gps_col is None:
+            raise ValueError(f"{Path(path).name} : colonnes de coordonnées introuvables")
+        parts = raw[gps_col].str.split(",", n=1, expand=True).reindex(columns=[0, 1])
+        lat, lon = parts[0], parts[1]
+
+    df = pd.DataFrame({
+        "cp": raw[cp_col].map(postcode_key),
+        "name": raw[name_col].str.strip(),
+        "lat": pd.to_numeric(lat.str.strip().str.replace(",", ".", regex=False), errors="coerce"),
+        "lon": pd.to_numeric(lon.str.strip().str.replace(",", ".", regex=False), errors="coerce"),
+    })
+    df["key"] = df["name"].map(city_key)
+    df["alias"] = raw[alias_col].map(city_key) if alias_col is not None else df["key"]
+    ok = (df["cp"] != "") & (df["key"] != "") & df["lat"].between(-90, 90) & df["lon"].between(-180, 180)
+    # Plusieurs lignes par commune (lieux-dits, "ligne 5") : 1 seule gardée
+    return df[ok].drop_duplicates(["cp", "key"]).reset_index(drop=True)
+
+
+class CommuneIndex:
+    """
+    Centroïdes de communes en tableaux NumPy + dictionnaires (CP, commune) -> ligne.
+    Recherches en quelques microsecondes, sans réseau ; load() accepte .npz ou .csv.
+    """
+
+    def __init__(self, cp, name, lat, lon, key=None, alias=None, cell_deg: float = CELL_DEG_DEFAULT):
+        self.cp = np.asarray(cp, dtype=str)
+        self.name = np.asarray(name, dtype=str)
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.key = np.asarray([city_key(n) for n in self.name] if key is None else key, dtype=str)
+        self.alias = self.key if alias is None else np.asarray(alias, dtype=str)
+        self.cell_deg = float(cell_deg)
+
+        self._by_pair = {}
+        self._by_cp = {}
+        self._by_key = {}
+        for i, (cp_i, key_i, alias_i) in enumerate(zip(self.cp.tolist(), self.key.tolist(), self.alias.tolist())):
+            self._by_cp.setdefault(cp_i, []).append(i)
+            for k in {key_i, alias_i}:
+                self._by_pair.setdefault((cp_i, k), i)
+                self._by_key.setdefault(k, []).append(i)
+
+        # Grille : points triés par cellule (ligne de latitude, puis longitude)
+        self._n_lon = int(math.ceil(360.0 / self.cell_deg))
+        cells = self._cell_ids(self.lat, self.lon)
+        self._order = np.argsort(cells, kind="stable")
+        self._cells = cells[self._order]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    # ---------------- chargement ----------------
+    @classmethod
+    def from_csv(cls, path, cell_deg: float = CELL_DEG_DEFAULT) -> "CommuneIndex":
+        df = read_communes_csv(path)
+        return cls(df["cp"], df["name"], df["lat"], df["lon"], key=df["key"], alias=df["alias"], cell_deg=cell_deg)
+
+    @classmethod
+    def load(cls, path, cell_deg: float = CELL_DEG_DEFAULT) -> "CommuneIndex":
+        if Path(path).suffix.lower() != ".npz":
+            return cls.from_csv(path, cell_deg=cell_deg)
+        with np.load(path) as z:
+            version = int(z["version"]) if "version" in z else 0
+            if version != INDEX_FORMAT_VERSION:
+                raise ValueError(f"{Path(path).name} : format {version}, attendu {INDEX_FORMAT_VERSION} "
+                                 "(reconstruire avec python -m lyrae.communes build)")
+            return cls(z["cp"], z["name"], z["lat"], z["lon"], key=z["key"], alias=z["alias"], cell_deg=cell_deg)
+
+    def save(self, path) -> str:
+        np.savez_compressed(path, version=np.int64(INDEX_FORMAT_VERSION),
+                            cp=self.cp, name=self.name, lat=self.lat, lon=self.lon, key=self.key, alias=self.alias)
+        return str(path)
+
+    # ---------------- CP / commune -> centroïde ----------------
+    def _geo(self, idx: list, precision: str, label: str) -> dict:
+        one = len(idx) == 1
+        return {
+            "lat": float(self.lat[idx[0]] if one else self.lat[idx].mean()),
+            "lon": float(self.lon[idx[0]] if one else self.lon[idx].mean()),
+            "display_name": label,
+            "provider": LOCAL_PROVIDER,
+            "precision": precision,
+        }
+
+    def locate(self, cp=None, city=None):
+        """Centroïde pour un code postal et/ou une commune ; None si rien ne correspond."""
+        cp, key = postcode_key(cp), city_key(city)
+        if cp and key:
+            i = self._by_pair.get((cp, key))
+            if i is not None:
+                return self._geo([i], "commune", f"{self.cp[i]} {self.name[i]}")
+        if cp and cp in self._by_cp:
+            idx = self._by_cp[cp]
+            names = ", ".join(dict.fromkeys(self.name[idx].tolist()))
+            return self._geo(idx, "code_postal" if len(idx) > 1 else "commune", f"{cp} {names}")
+        if key:
+            idx = self._by_key.get(key, [])
+            # même nom dans plusieurs départements : ambigu sans code postal
+            if idx and len({self.cp[i][:2] for i in idx}) == 1:
+                i = idx[0]
+                return self._geo(idx, "commune", f"{self.cp[i]} {self.name[i]}")
+        return None
+
+    # ---------------- lat / lon -> commune la plus proche ----------------
+    def _cell_ids(self, lats, lons) -> np.ndarray:
+        ilat = np.floor((np.asarray(lats, dtype=float) + 90.0) / self.cell_deg).astype(np.int64)
+        ilon = np.floor((np.asarray(lons, dtype=float) + 180.0) / self.cell_deg).astype(np.int64)
+        return ilat * self._n_lon + ilon
+
+    def _box(self, ilat: int, ilon: int, r_lat: int, r_lon: int) -> np.ndarray:
+        """Points des cellules [ilat ± r_lat] x [ilon ± r_lon] (1 tranche contiguë par ligne)."""
+        parts = []
+        for row in range(ilat - r_lat, ilat + r_lat + 1):
+            lo = row * self._n_lon + max(0, ilon - r_lon)
+            hi = row * self._n_lon + min(self._n_lon - 1, ilon + r_lon)
+            a, b = np.searchsorted(self._cells, [lo, hi + 1])
+            if b > a:
+                parts.append(self._order[a:b])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def reverse(self, lat: float, lon: float, max_km: float = REVERSE_MAX_KM):
+        """Commune dont le centroïde est le plus proche de (lat, lon), à max_km au plus ; sinon None."""
+        if not (np.isfinite(lat) and np.isfinite(lon)) or len(self) == 0:
+            return None
+        coslat = max(math.cos(math.radians(lat)), 1e-6)
+        ilat = int(math.floor((lat + 90.0) / self.cell_deg))
+        ilon = int(math.floor((lon + 180.0) / self.cell_deg))
+        max_deg = max_km / _KM_PER_DEG
+
+        r = 0
+        while True:
+            r_lon = int(math.ceil(r / coslat))
+            cand = self._box(ilat, ilon, r, r_lon)
+            if len(cand) or r * self.cell_deg > max_deg:
+                break
+            r += 1
+        if not len(cand):
+            return None
+
+        # 1er candidat trouvé : élargir la boîte au rayon de sa distance pour être exact
+        d2 = (self.lat[cand] - lat) ** 2 + ((self.lon[cand] - lon) * coslat) ** 2
+        d = math.sqrt(float(d2.min()))
+        r_lat = int(math.ceil(d / self.cell_deg))
+        cand = self._box(ilat, ilon, r_lat, int(math.ceil(r_lat / coslat)))
+        d2 = (self.lat[cand] - lat) ** 2 + ((self.lon[cand] - lon) * coslat) ** 2
+        j = int(np.argmin(d2))
+        km = math.sqrt(float(d2[j])) * _KM_PER_DEG
+        if km > max_km:
+            return None
+        i = int(cand[j])
+        return {"cp": str(self.cp[i]), "name": str(self.name[i]),
+                "lat": float(self.lat[i]), "lon": float(self.lon[i]), "distance_km": km}
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m lyrae.communes", description="Index local des communes LYRAE.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Compile le CSV des codes postaux en index .npz")
+    p_build.add_argument("src", help="CSV source (code postal, commune, latitude/longitude ou coordonnees_gps)")
+    p_build.add_argument("dst", help="Fichier .npz")
+
+    p_loc = sub.add_parser("locate", help="CP et/ou commune -> centroïde")
+    p_loc.add_argument("index")
+    p_loc.add_argument("--cp", default=None)
+    p_loc.add_argument("--city", default=None)
+
+    p_rev = sub.add_parser("reverse", help="lat lon -> commune la plus proche")
+    p_rev.add_argument("index")
+    p_rev.add_argument("lat", type=float)
+    p_rev.add_argument("lon", type=float)
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        index = CommuneIndex.from_csv(args.src)
+        out = index.save(args.dst)
+        print(f"{out} : {len(index)} couples code postal / commune ({Path(out).stat().st_size / 1e6:.1f} Mo)")
+        return 0
+
+    index = CommuneIndex.load(args.index)
+    res = index.locate(args.cp, args.city) if args.cmd == "locate" else index.reverse(args.lat, args.lon)
+    if res is None:
+        print("Aucune commune correspondante.", file=sys.stderr)
+        return 1
+    print(res)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
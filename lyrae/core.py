@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+Cœur d'inférence LYRAE (sans Streamlit).
+
+Contient les variables du modèle, le prétraitement identique à l'app
+(build_template -> apply_inputs_to_template -> fill_missing_code_like_R
+-> coerce_like_train_python) et le scoring CatBoost en un seul Pool.
+"""
+
+import json
+import threading
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lyrae.lazy import lazy_import
+
+
+# ============================================================
+# CONFIG
+# ============================================================
+MODEL_DEFAULT = "equine_lyme_catboost.cbm"
+META_DEFAULT  = "equine_lyme_catboost_meta.json"
+REFERENCE_CASES_DEFAULT = "jeu_fictif_lyme_equine_cas_parfaits.xlsx"  # jeu de référence (schéma + taux)
+
+# Dossier du dépôt (modèle + meta y sont posés par défaut)
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+# ============================================================
+# VARIABLES (met à jour selon ton modèle si besoin)
+# ============================================================
+analysis_cols = [
+    "piroplasmose_neg","ehrlichiose_neg","ehrlichiose_negatif","Bilan_sanguin_normal","NFS_normale",
+    "Parametres_musculaires_normaux","Parametres_renaux_normaux","Parametres_hepatiques_normaux",
+    "SAA_normal","Fibrinogène_normal",
+    "ELISA_pos","ELISA_OspA_pos","ELISA_OspF_pos","ELISA_p39","WB_pos","PCR_sang_pos","SNAP_C6_pos","IFAT_pos",
+    "PCR_LCR_pos","PCR_synoviale_pos","PCR_peau_pos","PCR_humeur_aqueuse_pos","PCR_tissu_nerveux_pos",
+    "PCR_liquide_articulaire_pos","LCR_pleiocytose","LCR_proteines_augmentees",
+    "IHC_tissulaire_pos","Coloration_argent_pos","FISH_tissulaire_pos",
+    "CVID","Hypoglobulinemie"
+]
+
+RESULTS_ANALYSIS_COLS = [
+    "ELISA_pos", "ELISA_OspA_pos", "ELISA_OspF_pos", "ELISA_p39",
+    "WB_pos", "SNAP_C6_pos", "IFAT_pos",
+    "PCR_sang_pos", "PCR_LCR_pos", "PCR_synoviale_pos", "PCR_liquide_articulaire_pos",
+    "PCR_peau_pos", "PCR_humeur_aqueuse_pos", "PCR_tissu_nerveux_pos",
+    "LCR_pleiocytose", "LCR_proteines_augmentees",
+    "IHC_tissulaire_pos", "Coloration_argent_pos", "FISH_tissulaire_pos",
+    "CVID", "Hypoglobulinemie",
+]
+
+
+# ============================================================
+# HELPERS (généraux)
+# ============================================================
+def normalize_key(s: str) -> str:
+    if s is None:
+        return ""
+    s = str(s).strip()
+    s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
+    s = s.replace(" ", "_")
+    return s
+
+
+def load_meta(meta_path: Path) -> dict:
+    with meta_path.open("r", encoding="utf-8") as f:
+        meta = json.load(f)
+    for k in ("feature_cols", "cat_cols", "factor_levels"):
+        if k not in meta:
+            raise ValueError(f"meta.json invalide: clé manquante '{k}'")
+    return meta
+
+
+def load_model_and_meta(model_path_str: str, meta_path_str: str):
+    model_path = Path(model_path_str)
+    meta_path = Path(meta_path_str)
+
+    if not model_path.exists():
+        raise FileNotFoundError(f"Modèle introuvable: {model_path}")
+    if not meta_path.exists():
+        raise FileNotFoundError(f"Meta introuvable: {meta_path}")
+
+    meta = load_meta(meta_path)
+
+    # catboost n'est importé qu'ici (premier chargement du modèle)
+    model = lazy_import("catboost").CatBoostClassifier()
+    model.load_model(str(model_path))
+
+    feature_cols = meta["feature_cols"]
+    cat_cols = meta["cat_cols"]
+    factor_levels = meta["factor_levels"]
+
+    cat_idx = [feature_cols.index(c) for c in cat_cols if c in feature_cols]
+    return model, meta, feature_cols, cat_cols, factor_levels, cat_idx
+
+
+def yn_to_num_if_needed(val, col_is_numeric: bool):
+    if val is None or (isinstance(val, float) and np.isnan(val)):
+        return val
+    if pd.isna(val):
+        return val
+    if not col_is_numeric:
+        return val
+    if isinstance(val, (int, float, np.number)) and not pd.isna(val):
+        return float(val)
+    s = str(val).strip().lower()
+    if s in ("oui","yes","y","true","vrai","1"):
+        return 1.0
+    if s in ("non","no","n","false","faux","0"):
+        return 0.0
+    return val
+
+
+# Table Oui/Non -> 1/0 (mêmes jetons que yn_to_num_if_needed)
+YN_MAP = {
+    **{k: 1.0 for k in ("oui","yes","y","true","vrai","1")},
+    **{k: 0.0 for k in ("non","no","n","false","faux","0")},
+}
+
+
+def build_template(feature_cols, n_rows: int = 1):
+    return pd.DataFrame({c: [pd.NA] * n_rows for c in feature_cols}, dtype=object)
+
+
+def apply_inputs_to_template(X, inputs):
+    """
+    inputs : dict (1 cas -> ligne 0) ou liste de dicts (1 dict par ligne).
+    Écriture par colonne (pas de X.at[i, col] ligne à ligne).
+    """
+    records = [inputs] if isinstance(inputs, dict) else list(inputs)
+    if not records:
+        return X
+    df_in = pd.DataFrame.from_records(records)
+    for k in df_in.columns:
+        if k in X.columns:
+            X.loc[: len(records) - 1, k] = df_in[k].to_numpy(dtype=object)
+    return X
+
+
+def fill_missing_code_like_R(X: pd.DataFrame, analysis_cols_set: set):
+    """
+    Recalcule les colonnes *_missing_code comme dans le script R :
+    0 = renseigné, 1 = manquant, 2 = analyse non réalisée.
+    Vectorisé : un masque booléen (N x colonnes) pour toutes les bases d'un coup.
+    """
+    miss_cols = [c for c in X.columns if c.endswith("_missing_code")]
+    if not miss_cols:
+        return X
+
+    codes = np.zeros((len(X), len(miss_cols)), dtype=np.int64)
+    pos, bases = [], []
+    for j, mc in enumerate(miss_cols):
+        base = mc.replace("_missing_code", "")
+        if base in X.columns:
+            pos.append(j)
+            bases.append(base)
+
+    if bases:
+        mask = X[bases].isna().to_numpy()
+        code_if_missing = np.array([2 if b in analysis_cols_set else 1 for b in bases], dtype=np.int64)
+        codes[:, pos] = np.where(mask, code_if_missing, 0)
+
+    X[miss_cols] = pd.DataFrame(codes, columns=miss_cols, index=X.index)
+    return X
+
+
+def _yn_block_to_float(block) -> np.ndarray:
+    """
+    Équivalent vectorisé de yn_to_num_if_needed + pd.to_numeric(errors="coerce")
+    sur un bloc de colonnes object (DataFrame ou tableau 2D) : 1 passage
+    dictionnaire + 1 seul to_numeric.
+    """
+    block = np.asarray(block, dtype=object)
+    # On ne traite que les valeurs distinctes (quelques dizaines), puis on rediffuse
+    codes, uniq = pd.factorize(block.ravel(), use_na_sentinel=True)
+    u = pd.Series(uniq, dtype=object)
+    yn = u.astype("string").str.strip().str.lower().map(YN_MAP)
+    num = pd.to_numeric(u, errors="coerce")
+    u_val = np.select([yn.notna().to_numpy()], [yn.to_numpy(dtype=float, na_value=np.nan)],
+                      default=num.to_numpy(dtype=float, na_value=np.nan))
+    out = np.append(u_val, np.nan)[codes]  # code -1 (NA) -> NaN
+    return out.reshape(block.shape)
+
+
+def coerce_like_train_python(
+    X: pd.DataFrame,
+    feature_cols: list,
+    cat_cols: list,
+    factor_levels: dict
+):
+    """
+    Rend X compatible CatBoost (Pool) :
+    - Cat features : toujours string, jamais pd.NA dans les catégories
+    - Numériques : float coerced (Oui/Non -> 1/0)
+    Schéma compilé à chaque appel : préférer FeatureSchema.coerce (Predictor.schema).
+    """
+    return FeatureSchema(feature_cols, cat_cols, factor_levels).coerce(X, track=False)
+
+
+# ============================================================
+# SCHÉMA COMPILÉ (plan de coercition construit une fois par modèle)
+# ============================================================
+MISSING_LEVEL = "__MISSING__"
+OOV_EXAMPLES_MAX = 20  # valeurs hors vocabulaire conservées par colonne (pour le rapport)
+
+
+class FeatureSchema:
+    """
+    Plan de coercition compilé au chargement du modèle : colonnes numériques /
+    catégorielles et leurs positions, niveaux de chaque cat_col codés en entiers.
+
+    coerce(X) fait en un passage par lot ce que faisait coerce_like_train_python
+    (catégorielles -> str + "__MISSING__", numériques -> float, Oui/Non -> 1/0) et
+    compte au passage les catégories hors vocabulaire (dérive des entrées).
+    """
+
+    def __init__(self, feature_cols: list, cat_cols: list, factor_levels: dict):
+        self.feature_cols = list(feature_cols)
+        cat_set = set(cat_cols)
+        self.cat_cols = [c for c in self.feature_cols if c in cat_set]
+        self.num_cols = [c for c in self.feature_cols if c not in cat_set]
+        pos = {c: i for i, c in enumerate(self.feature_cols)}
+        self.cat_pos = np.array([pos[c] for c in self.cat_cols], dtype=np.int64)
+        self.num_pos = np.array([pos[c] for c in self.num_cols], dtype=np.int64)
+        # niveau (str, comme vu par CatBoost) -> code entier ; colonne sans niveaux connus : {}
+        self.level_codes = {
+            c: {str(lv): i for i, lv in enumerate(factor_levels.get(c, []))} for c in self.cat_cols
+        }
+
+        self._lock = threading.Lock()
+        self.reset_drift()
+
+    # ---------------- dérive ----------------
+    def reset_drift(self) -> None:
+        with self._lock:
+            self.rows_seen = 0
+            self.oov_counts = {c: 0 for c in self.cat_cols}
+            self.missing_counts = {c: 0 for c in self.cat_cols}
+            self.oov_values = {c: {} for c in self.cat_cols}
+
+    def drift_report(self) -> dict:
+        """Lignes vues + par cat_col : valeurs hors vocabulaire / manquantes et exemples."""
+        with self._lock:
+            return {
+                "rows": self.rows_seen,
+                "oov_rows": sum(self.oov_counts.values()),
+                "columns": {
+                    c: {
+                        "oov": self.oov_counts[c],
+                        "missing": self.missing_counts[c],
+                        "oov_values": dict(sorted(self.oov_values[c].items(), key=lambda kv: -kv[1])),
+                    }
+                    for c in self.cat_cols
+                },
+            }
+
+    def _track(self, n: int, cat_vals: np.ndarray, missing: np.ndarray, oov: np.ndarray) -> None:
+        with self._lock:
+            self.rows_seen += n
+            for j, c in enumerate(self.cat_cols):
+                self.missing_counts[c] += int(missing[:, j].sum())
+                k = int(oov[:, j].sum())
+                if not k:
+                    continue
+                self.oov_counts[c] += k
+                seen = self.oov_values[c]
+                vals, cnt = np.unique(cat_vals[oov[:, j], j].astype(str), return_counts=True)
+                for v, m in zip(vals, cnt):
+                    if v in seen or len(seen) < OOV_EXAMPLES_MAX:
+                        seen[str(v)] = seen.get(str(v), 0) + int(m)
+
+    # ---------------- coercition ----------------
+    def coerce(self, X: pd.DataFrame, track: bool = True) -> pd.DataFrame:
+        """
+        X (feature_cols, valeurs brutes) -> nouveau DataFrame prêt pour CatBoost,
+        colonnes dans l'ordre de feature_cols. track=False : compteurs de dérive
+        inchangés (variantes synthétiques, benchmarks).
+        """
+        if list(X.columns) != self.feature_cols:
+            X = X.reindex(columns=self.feature_cols)
+        n = len(X)
+
+        # --- Numériques : un seul bloc float (N, n_num) ; colonnes déjà numériques -> float,
+        #     les autres Oui/Non -> 1/0 puis to_numeric
+        dtypes = X.dtypes.to_numpy()
+        is_fast = np.array([pd.api.types.is_numeric_dtype(dtypes[i]) for i in self.num_pos], dtype=bool)
+        slow_pos = self.num_pos[~is_fast]
+        # 1 seule extraction object : colonnes numériques à convertir + catégorielles
+        V = X.iloc[:, np.concatenate([slow_pos, self.cat_pos])].to_numpy(dtype=object)
+        num = np.empty((n, len(self.num_cols)), dtype=float)
+        if is_fast.all():
+            num[:] = X.iloc[:, self.num_pos].to_numpy(dtype=float, na_value=np.nan)
+        elif is_fast.any():
+            num[:, is_fast] = X.iloc[:, self.num_pos[is_fast]].to_numpy(dtype=float, na_value=np.nan)
+        if len(slow_pos):
+            num[:, ~is_fast] = _yn_block_to_float(V[:, :len(slow_pos)])
+
+        # --- Catégorielles : 1 factorize pour tout le bloc (valeurs distinctes -> str une seule fois)
+        if self.cat_cols:
+            block = V[:, len(slow_pos):]
+            codes, uniq = pd.factorize(block.ravel(), use_na_sentinel=True)
+            if all(isinstance(u, str) for u in uniq):
+                u_str = np.append(np.asarray(uniq, dtype=object), MISSING_LEVEL)  # code -1 (NA) -> "__MISSING__"
+                codes = codes.reshape(block.shape)
+            else:
+                # Nombres / booléens : factorize confond 1, 1.0 et True -> conversion valeur par valeur
+                vals = pd.DataFrame(block).astype("string").fillna(MISSING_LEVEL).astype(str).to_numpy(dtype=object)
+                codes, uniq = pd.factorize(vals.ravel())
+                u_str = np.asarray(uniq, dtype=object)
+                codes = codes.reshape(block.shape)
+            cat_vals = u_str[codes]
+            out = self.assemble(num, cat_vals, X.index)
+
+            if track:
+                missing = cat_vals == MISSING_LEVEL
+                oov = np.zeros_like(missing)
+                for j, c in enumerate(self.cat_cols):
+                    lc = self.level_codes[c]
+                    if lc:
+                        known = np.array([u == MISSING_LEVEL or u in lc for u in u_str], dtype=bool)
+                        oov[:, j] = ~known[codes[:, j]]
+                self._track(n, cat_vals, missing, oov)
+        else:
+            out = self.assemble(num, None, X.index)
+            if track:
+                with self._lock:
+                    self.rows_seen += n
+
+        return out
+
+    def assemble(self, num: np.ndarray, cat_vals: np.ndarray = None, index=None) -> pd.DataFrame:
+        """Bloc float (N, n_num) + catégorielles déjà en str (N, n_cat) -> DataFrame dans l'ordre de feature_cols."""
+        out = pd.DataFrame(num, index=index, columns=self.num_cols, copy=False)  # num est neuf : pas de copie
+        if cat_vals is not None:
+            # insert dans l'ordre croissant des positions -> colonnes dans l'ordre de feature_cols
+            for j in np.argsort(self.cat_pos):
+                out.insert(int(self.cat_pos[j]), self.cat_cols[j], cat_vals[:, j])
+        return out
+
+    def coerce_value(self, col: str, value):
+        """1 valeur brute -> valeur coercée de col, identique à coerce() (float ou str / "__MISSING__")."""
+        if col not in self.level_codes:
+            return float(_yn_block_to_float(np.array([[value]], dtype=object))[0, 0])
+        if isinstance(value, str):
+            return value
+        return pd.Series([value], dtype=object).astype("string").fillna(MISSING_LEVEL).astype(str).iloc[0]
+
+    def observe(self, X: pd.DataFrame) -> None:
+        """Compte dans la dérive des lignes déjà coercées (ex. vecteur tenu à jour par lyrae.casestate)."""
+        if not self.cat_cols:
+            with self._lock:
+                self.rows_seen += len(X)
+            return
+        cat_vals = X[self.cat_cols].to_numpy(dtype=object)
+        missing = cat_vals == MISSING_LEVEL
+        oov = np.zeros_like(missing)
+        for j, c in enumerate(self.cat_cols):
+            lc = self.level_codes[c]
+            if lc:
+                oov[:, j] = ~missing[:, j] & ~np.isin(cat_vals[:, j], list(lc))
+        self._track(len(X), cat_vals, missing, oov)
+
+    def encode_levels(self, X: pd.DataFrame) -> np.ndarray:
+        """Catégorielles de X (déjà coercé) -> codes entiers des niveaux (N, n_cat) ; -1 = hors niveaux / manquant."""
+        out = np.full((len(X), len(self.cat_cols)), -1, dtype=np.int64)
+        for j, c in enumerate(self.cat_cols):
+            lc = self.level_codes[c]
+            codes, uniq = pd.factorize(X[c].to_numpy(dtype=object))
+            out[:, j] = np.array([lc.get(u, -1) for u in uniq] + [-1], dtype=np.int64)[codes]
+        return out
+
+
+def cat_from_p_like_R(p: float) -> str:
+    if p < 0.25:
+        return "Pas de Lyme ou informations insuffisantes"
+    if p < 0.50:
+        return "Lyme possible"
+    if p < 0.75:
+        return "Lyme probable"
+    return "Lyme sûr"
+
+
+# ============================================================
+# SCORING EN LOT (N lignes -> 1 Pool -> 1 predict_proba)
+# ============================================================
+def read_cases(path: Path, sheet=0, sep=None) -> pd.DataFrame:
+    """Lit un fichier de cas (CSV ou XLSX) au schéma du jeu de référence."""
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        return pd.read_excel(path, sheet_name=sheet, engine="openpyxl")
+    # sep=None -> détection auto ("," ou ";" pour les exports FR)
+    return pd.read_csv(path, sep=sep, engine="python" if sep is None else "c")
+
+
+def prepare_features(
+    df: pd.DataFrame,
+    feature_cols: list,
+    cat_cols: list,
+    factor_levels: dict,
+    schema: FeatureSchema = None,
+) -> pd.DataFrame:
+    """
+    Équivalent N lignes de build_template -> apply_inputs_to_template
+    -> fill_missing_code_like_R -> coerce_like_train_python.
+    Les colonnes absentes du fichier sont traitées comme manquantes.
+    schema : FeatureSchema déjà compilé (sinon compilé pour cet appel).
+    """
+    X = df.reindex(columns=feature_cols).reset_index(drop=True)
+    X = fill_missing_code_like_R(X, set(analysis_cols))
+    if schema is None:
+        return coerce_like_train_python(X, feature_cols, cat_cols, factor_levels)
+    return schema.coerce(X)
+
+
+def predict_proba_frame(model, X: pd.DataFrame, cat_idx: list, thread_count: int = -1) -> np.ndarray:
+    """Probabilité de Lyme pour toutes les lignes de X (un seul Pool ; thread_count=-1 : tous les cœurs)."""
+    if len(X) == 0:
+        return np.empty(0, dtype=float)
+    pool = lazy_import("catboost").Pool(X, cat_features=cat_idx, thread_count=thread_count)
+    return model.predict_proba(pool, thread_count=thread_count)[:, 1].astype(float)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Contributions par variable (valeurs SHAP CatBoost) pour 1 ou N cas.
+
+    from lyrae.explain import explain, contribution_table
+    contrib, base = explain(predictor, X)      # X prétraité (prepare_one / prepare_many)
+    contribution_table(predictor, X, contrib, base, row=0)
+
+Les contributions sont en log-odds (échelle brute du modèle) : base + somme des
+contributions = logit(probabilité). Toutes les lignes absentes du cache passent
+dans un seul get_feature_importance(type="ShapValues") ; le cache est indexé par
+le même hash canonique de ligne que PREDICTION_CACHE (lyrae.predictor).
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lyrae.lazy import lazy_import
+from lyrae.predictor import PredictionCache, feature_row_keys, register_swap_cache
+
+CONTRIBUTION_CACHE_MAX = 1024
+
+
+class ContributionCache(PredictionCache):
+    """PredictionCache dont les valeurs sont des vecteurs [contributions..., base]."""
+
+    def _store(self, v):
+        a = np.array(v, dtype=float)
+        a.setflags(write=False)
+        return a
+
+
+# Partagé par toutes les sessions Streamlit du process
+CONTRIBUTION_CACHE = ContributionCache(CONTRIBUTION_CACHE_MAX)
+register_swap_cache(CONTRIBUTION_CACHE)
+
+
+def _shap_values(predictor, X: pd.DataFrame) -> np.ndarray:
+    """(N, F + 1) : contributions puis valeur de base, en un seul appel CatBoost."""
+    if len(X) == 0:
+        return np.empty((0, len(predictor.feature_cols) + 1), dtype=float)
+    pool = lazy_import("catboost").Pool(X[predictor.feature_cols], cat_features=predictor.cat_idx)
+    return np.asarray(
+        predictor.catboost_model().get_feature_importance(data=pool, type="ShapValues"),
+        dtype=float,
+    )
+
+
+def explain(predictor, X: pd.DataFrame, use_cache: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """
+    X prétraité -> (contributions (N, F) dans l'ordre de feature_cols, base (N,)).
+    Seules les lignes absentes de CONTRIBUTION_CACHE sont calculées (1 appel).
+    """
+    if not use_cache or len(X) == 0:
+        sv = _shap_values(predictor, X)
+        return sv[:, :-1], sv[:, -1]
+
+    keys = feature_row_keys(X, predictor.feature_cols, predictor.cat_cols,
+                            salt=f"shap:{predictor.cache_salt}")
+    cached = CONTRIBUTION_CACHE.get_many(keys)
+    miss = [i for i, v in enumerate(cached) if v is None]
+    if miss:
+        sv = _shap_values(predictor, X if len(miss) == len(X) else X.iloc[miss])
+        CONTRIBUTION_CACHE.put_many([keys[i] for i in miss], sv)
+        for i, row in zip(miss, sv):
+            cached[i] = row
+    sv = np.vstack(cached)
+    return sv[:, :-1], sv[:, -1]
+
+
+def contribution_table(predictor, X: pd.DataFrame, contrib: np.ndarray, base=None,
+                       row: int = 0, top: int = None) -> pd.DataFrame:
+    """
+    Une ligne par variable du cas `row` : valeur, contribution (log-odds), sens ;
+    triée par |contribution| décroissante (variables à contribution nulle exclues).
+    """
+    c = np.asarray(contrib)[row]
+    df = pd.DataFrame({
+        "feature": predictor.feature_cols,
+        "value": X.iloc[row][predictor.feature_cols].to_numpy(dtype=object),
+        "contribution": c,
+    })
+    df = df[df["contribution"] != 0]
+    df["direction"] = np.where(df["contribution"] > 0, "↑ Lyme", "↓ Lyme")
+    df = df.reindex(df["contribution"].abs().sort_values(ascending=False, kind="stable").index)
+    df = df.reset_index(drop=True)
+    if top is not None:
+        df = df.head(top)
+    if base is not None:
+        df.attrs["base"] = float(np.asarray(base)[row])
+    return df
+
+
+def contributions_frame(predictor, X: pd.DataFrame, use_cache: bool = False) -> pd.DataFrame:
+    """Format large (1 ligne par cas) : row, shap_base, puis 1 colonne par variable."""
+    contrib, base = explain(predictor, X, use_cache=use_cache)
+    out = pd.DataFrame(contrib, columns=predictor.feature_cols)
+    out.insert(0, "shap_base", base)
+    out.insert(0, "row", np.arange(len(X), dtype=np.int64))
+    return out
+
+
+def write_contributions(frame: pd.DataFrame, path) -> None:
+    """Parquet (pyarrow ou fastparquet requis) ; .csv accepté en repli."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        frame.to_csv(path, index=False)
+    else:
+        frame.to_parquet(path, index=False)
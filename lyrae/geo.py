@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Géocodage LYRAE (sans Streamlit).
+
+- geocode_address : BAN (France) puis Nominatim en couverture (HedgedGeocoder :
+                    requête couverte, session HTTP partagée, échéance globale)
+- GeocodeCache    : cache disque SQLite (TTL + LRU + cache négatif court)
+- repli hors ligne : centroïde CP / commune (lyrae.communes), cf. geocode_address_cached
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+import requests.adapters
+
+from lyrae.core import normalize_key
+
+DEFAULT_CONTACT_EMAIL = "contact@exemple.org"
+
+BAN_URL = "https://api-adresse.data.gouv.fr/search/"
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+
+
+# ============================================================
+# FOURNISSEURS (BAN, Nominatim ; remplaçables par un serveur local en test)
+# ============================================================
+class GeocodeProvider:
+    """
+    1 service de géocodage : URL + paramètres de requête + lecture de la réponse.
+    fetch() -> {"lat", "lon", "display_name", "provider"}, None (rien trouvé)
+    ou {"__error__": True, "status": ...} (réponse HTTP non 200).
+    """
+
+    name = "?"
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def params(self, q: str) -> dict:
+        return {"q": q}
+
+    def parse(self, data, q: str):
+        raise NotImplementedError
+
+    def fetch(self, session: requests.Session, q: str, timeout: float):
+        r = session.get(self.url, params=self.params(q), timeout=timeout)
+        if r.status_code != 200:
+            return {"__error__": True, "status": r.status_code, "text": r.text[:300], "provider": self.name}
+        return self.parse(r.json(), q)
+
+
+class BanProvider(GeocodeProvider):
+    """Base Adresse Nationale : très fiable en France."""
+
+    name = "BAN"
+
+    def __init__(self, url: str = BAN_URL):
+        super().__init__(url)
+
+    def params(self, q: str) -> dict:
+        return {"q": q, "limit": 1}
+
+    def parse(self, data, q: str):
+        feats = data.get("features", [])
+        if not feats:
+            return None
+        coords = feats[0]["geometry"]["coordinates"]  # [lon, lat]
+        props = feats[0].get("properties", {})
+        return {"lat": float(coords[1]), "lon": float(coords[0]),
+                "display_name": props.get("label", q), "provider": self.name}
+
+
+class NominatimProvider(GeocodeProvider):
+    """OpenStreetMap Nominatim, limité à la France."""
+
+    name = "Nominatim"
+
+    def __init__(self, url: str = NOMINATIM_URL):
+        super().__init__(url)
+
+    def params(self, q: str) -> dict:
+        return {"format": "json", "limit": 1, "addressdetails": 1, "countrycodes": "fr", "q": q}
+
+    def parse(self, data, q: str):
+        if not data:
+            return None
+        return {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"]),
+                "display_name": data[0].get("display_name", q), "provider": self.name}
+
+
+# ============================================================
+# GEOCODE — fournisseurs en course (requête couverte + échéance globale)
+# ============================================================
+GEOCODE_HEDGE_DELAY_S = 0.4  # délai avant de lancer le fournisseur suivant si le 1er tarde
+GEOCODE_DEADLINE_S = 4.0     # au-delà, on abandonne (l'utilisateur n'attend plus 24 s)
+
+
+class HedgedGeocoder:
+    """
+    Interroge providers dans l'ordre de préférence, sans attendre l'échec du
+    précédent : le suivant part après hedge_delay_s (ou dès que le précédent
+    répond sans résultat). La première réponse exploitable gagne ; rien après
+    deadline_s -> {"__error__": True, "status": "timeout"}.
+
+    Une seule requests.Session (keep-alive, pool de connexions) et un pool de
+    threads partagés par tous les appels : à réutiliser (default_geocoder).
+    Même contrat que geocode_address : utilisable comme geocoder= de
+    geocode_address_cached.
+    """
+
+    def __init__(self, providers=None, hedge_delay_s: float = GEOCODE_HEDGE_DELAY_S,
+                 deadline_s: float = GEOCODE_DEADLINE_S, contact_email: str = DEFAULT_CONTACT_EMAIL,
+                 max_workers: int = 8):
+        self.providers = list(providers) if providers else [BanProvider(), NominatimProvider()]
+        self.hedge_delay_s = float(hedge_delay_s)
+        self.deadline_s = float(deadline_s)
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(self.providers), pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "User-Agent": f"LYRAE/1.0 ({contact_email})",
+            "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.6",
+        })
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lyrae-geocode")
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.timeouts = 0
+        self.wins = {p.name: 0 for p in self.providers}
+
+    def _fetch(self, provider: GeocodeProvider, q: str):
+        try:
+            return provider.fetch(self.session, q, timeout=self.deadline_s)
+        except Exception:
+            return None
+
+    def __call__(self, address: str, contact_email: str = None):
+        # contact_email : fixé à la création (en-têtes de la session), accepté pour le contrat geocoder=
+        if not address or address.strip() == "":
+            return None
+        q = address.strip()
+
+        t0 = time.monotonic()
+        deadline = t0 + self.deadline_s
+        waiting = list(self.providers)
+        running = {}
+        error = None
+        next_start = t0
+        with self._lock:
+            self.calls += 1
+
+        while waiting or running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if waiting and (now >= next_start or not running):
+                p = waiting.pop(0)
+                running[self._pool.submit(self._fetch, p, q)] = p
+                if len(running) > 1:
+                    with self._lock:
+                        self.hedged += 1
+                next_start = now + self.hedge_delay_s
+                continue
+
+            wake = min(deadline, next_start) if waiting else deadline
+            done, _ = wait(running, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+            for fut in done:
+                p = running.pop(fut)
+                geo = fut.result()
+                if geocode_ok(geo):
+                    with self._lock:
+                        self.wins[p.name] = self.wins.get(p.name, 0) + 1
+                    return geo
+                if geo is not None:
+                    error = geo
+                next_start = time.monotonic()  # réponse vide / erreur : fournisseur suivant tout de suite
+
+        if waiting or running:
+            with self._lock:
+                self.timeouts += 1
+            return {"__error__": True, "status": "timeout",
+                    "text": f"aucune réponse exploitable en {self.deadline_s:g} s", "provider": "hedged"}
+        return error
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "hedged": self.hedged, "timeouts": self.timeouts, "wins": dict(self.wins)}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+_DEFAULT_GEOCODERS: dict = {}
+_DEFAULT_GEOCODERS_LOCK = threading.Lock()
+
+
+def default_geocoder(contact_email: str = DEFAULT_CONTACT_EMAIL) -> HedgedGeocoder:
+    """HedgedGeocoder partagé par le process (1 par adresse de contact / User-Agent)."""
+    with _DEFAULT_GEOCODERS_LOCK:
+        g = _DEFAULT_GEOCODERS.get(contact_email)
+        if g is None:
+            g = _DEFAULT_GEOCODERS[contact_email] = HedgedGeocoder(contact_email=contact_email)
+        return g
+
+
+def geocode_address(address: str, contact_email: str = DEFAULT_CONTACT_EMAIL):
+    """
+    Retourne {"lat":..., "lon":..., "display_name":..., "provider":...} ou None.
+    BAN (France) d'abord, Nominatim en couverture après GEOCODE_HEDGE_DELAY_S ;
+    erreur HTTP / délai dépassé -> {"__error__": True, "status": ...}.
+    """
+    return default_geocoder(contact_email)(address)
+
+
+def geocode_ok(geo) -> bool:
+    """True si geo est un résultat exploitable (lat/lon), pas un échec."""
+    return isinstance(geo, dict) and not geo.get("__error__") and "lat" in geo and "lon" in geo
+
+
+def address_key(address: str) -> str:
+    """Clé de cache : normalize_key + espaces compactés + minuscules."""
+    if address is None:
+        return ""
+    return normalize_key(" ".join(str(address).split())).lower()
+
+
+# ============================================================
+# CACHE DISQUE (SQLite)
+# ============================================================
+class GeocodeCache:
+    """
+    Cache persistant des géocodages, clé = address_key(adresse).
+
+    - succès : conservés ttl_s secondes
+    - échecs (None / erreur HTTP) : conservés neg_ttl_s secondes seulement,
+      pour qu'une panne BAN/Nominatim ne soit jamais figée dans le cache
+    - au-delà de max_entries, on évince les entrées les moins récemment lues (LRU)
+    """
+
+    def __init__(self, path, ttl_s: float = 30 * 86400, neg_ttl_s: float = 600, max_entries: int = 5000):
+        self.path = str(path)
+        self.ttl_s = float(ttl_s)
+        self.neg_ttl_s = float(neg_ttl_s)
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS geocode (
+                    key       TEXT PRIMARY KEY,
+                    payload   TEXT,
+                    ok        INTEGER NOT NULL,
+                    created   REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS geocode_last_used ON geocode(last_used)")
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=10)
+        try:
+            with con:  # commit / rollback
+                yield con
+        finally:
+            con.close()
+
+    def get(self, address: str):
+        """Retourne (trouvé, valeur). valeur peut être None (échec encore en cache négatif)."""
+        key = address_key(address)
+        now = time.time()
+        with self._lock, self._connect() as con:
+            row = con.execute("SELECT payload, ok, created FROM geocode WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+
+            payload, ok, created = row
+            ttl = self.ttl_s if ok else self.neg_ttl_s
+            if now - created > ttl:
+                con.execute("DELETE FROM geocode WHERE key = ?", (key,))
+                self.misses += 1
+                return False, None
+
+            con.execute("UPDATE geocode SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return True, json.loads(payload)
+
+    def put(self, address: str, geo) -> None:
+        key = address_key(address)
+        if key == "":
+            return
+        now = time.time()
+        with self._lock, self._connect() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO geocode(key, payload, ok, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(geo, ensure_ascii=False), 1 if geocode_ok(geo) else 0, now, now),
+            )
+            n = con.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+            if n > self.max_entries:
+                con.execute(
+                    "DELETE FROM geocode WHERE key IN (SELECT key FROM geocode ORDER BY last_used ASC LIMIT ?)",
+                    (n - self.max_entries,),
+                )
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock, self._connect() as con:
+            cur = con.execute(
+                "DELETE FROM geocode WHERE (ok = 1 AND ? - created > ?) OR (ok = 0 AND ? - created > ?)",
+                (now, self.ttl_s, now, self.neg_ttl_s),
+            )
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock, self._connect() as con:
+            n = con.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+        return {"entries": n, "hits": self.hits, "misses": self.misses}
+
+
+def geocode_address_cached(address: str, cache: GeocodeCache, contact_email: str = DEFAULT_CONTACT_EMAIL, geocoder=None,
+                           local=None, local_first: bool = False):
+    """
+    geocode_address avec lecture/écriture dans le cache disque.
+
+    local : résultat hors ligne (lyrae.communes.CommuneIndex.locate) renvoyé si BAN et
+    Nominatim échouent ou ne trouvent rien ; jamais mis en cache (une panne ne fige pas
+    une position approximative). local_first=True : renvoyé sans appel réseau (adresse
+    réduite à CP + commune, ou poste hors ligne).
+    """
+    if local is not None and (local_first or not address or address.strip() == ""):
+        return local
+    if not address or address.strip() == "":
+        return None
+
+    found, geo = cache.get(address)
+    if not found:
+        geocoder = geocoder or geocode_address
+        geo = geocoder(address, contact_email=contact_email)
+        cache.put(address, geo)
+    if local is not None and not geocode_ok(geo):
+        return local
+    return geo
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+Géocodage en masse d'un fichier d'adresses (écuries d'une région, registre...).
+
+Usage :
+    python -m lyrae.geobatch ecuries.csv -o ecuries_geo.csv --address-col adresse
+    python -m lyrae.geobatch ecuries.xlsx -o ecuries_geo.csv --street-col rue --cp-col cp --city-col ville \\
+        --raster mean_R1_RF_prob_rep01_05_CATEG_3classes.tif
+    python -m lyrae.batch ecuries_geo.csv -o scores.csv      # lat / lon / Classe de risque déjà là
+
+1. adresses dédoublonnées par address_key (normalize_key) : 1 géocodage par adresse distincte ;
+2. BAN en masse : POST /search/csv/ par paquets de ban_chunk adresses ;
+3. adresses non trouvées par la BAN -> Nominatim, 1 requête / s au plus (seau à jetons) ;
+4. chaque résultat est écrit dans un point de reprise SQLite : un job interrompu
+   reprend là où il s'était arrêté (seules les erreurs réseau sont retentées).
+
+Sortie : colonnes d'entrée + lat, lon, geo_label, geo_provider, geo_status
+(+ "Classe de risque" avec --raster), directement utilisable par lyrae.batch.
+--communes communes.npz : adresses restées sans position -> centroïde CP / commune
+(geo_status = "approx"), aussi sans aucun accès réseau avec --offline.
+"""
+
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import requests
+
+from lyrae.core import read_cases
+from lyrae.geo import DEFAULT_CONTACT_EMAIL, NominatimProvider, address_key, geocode_ok
+
+BAN_CSV_URL = "https://api-adresse.data.gouv.fr/search/csv/"
+BAN_CSV_CHUNK = 2000       # adresses par POST (le service limite la taille du fichier envoyé)
+BAN_MIN_SCORE = 0.5        # en dessous, le résultat BAN est jugé incertain -> Nominatim
+NOMINATIM_RATE_PER_S = 1.0  # politique d'usage de Nominatim : 1 requête / s au plus
+REQUEST_TIMEOUT_S = 60.0
+
+# Statuts du point de reprise (les erreurs réseau ne sont pas enregistrées : retentées au prochain run)
+STATUS_OK = "ok"
+STATUS_BAN_MISS = "ban_miss"
+STATUS_NOT_FOUND = "not_found"
+
+
+# ============================================================
+# DÉBIT (seau à jetons)
+# ============================================================
+class TokenBucket:
+    """rate_per_s jetons par seconde, burst au plus en réserve ; acquire() attend un jeton."""
+
+    def __init__(self, rate_per_s: float, burst: int = 1):
+        if rate_per_s <= 0:
+            raise ValueError("rate_per_s doit être > 0")
+        self.rate = float(rate_per_s)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Prend un jeton ; retourne le temps attendu (s)."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# ============================================================
+# POINT DE REPRISE (SQLite)
+# ============================================================
+class GeocodeCheckpoint:
+    """Résultats d'un job de géocodage, clé = address_key ; sans TTL ni éviction."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS geobatch (
+                    key      TEXT PRIMARY KEY,
+                    address  TEXT,
+                    status   TEXT NOT NULL,
+                    payload  TEXT,
+                    updated  REAL NOT NULL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=10)
+        try:
+            with con:  # commit / rollback
+                yield con
+        finally:
+            con.close()
+
+    def put_many(self, rows: list[tuple]) -> None:
+        """rows : (key, adresse, statut, geo ou None)."""
+        now = time.time()
+        with self._connect() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO geobatch(key, address, status, payload, updated) VALUES (?, ?, ?, ?, ?)",
+                [(k, a, s, None if g is None else json.dumps(g, ensure_ascii=False), now) for k, a, s, g in rows],
+            )
+
+    def load(self) -> dict:
+        """key -> (statut, geo ou None)."""
+        with self._connect() as con:
+            rows = con.execute("SELECT key, status, payload FROM geobatch").fetchall()
+        return {k: (s, None if p is None else json.loads(p)) for k, s, p in rows}
+
+
+# ============================================================
+# FOURNISSEURS EN MASSE
+# ============================================================
+def ban_bulk(session: requests.Session, items: list[tuple], url: str = BAN_CSV_URL,
+             min_score: float = BAN_MIN_SCORE, timeout: float = REQUEST_TIMEOUT_S) -> dict:
+    """
+    items : (key, adresse) -> {key: geo ou None} en 1 POST /search/csv/.
+    Lève requests.RequestException / ValueError si le service ne répond pas correctement.
+    """
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["lyrae_key", "q"])
+    w.writerows(items)
+    r = session.post(
+        url,
+        files={"data": ("adresses.csv", buf.getvalue().encode("utf-8"), "text/csv")},
+        data={"columns": "q"},
+        timeout=timeout,
+    )
+    if r.status_code != 200:
+        raise ValueError(f"BAN CSV : HTTP {r.status_code}")
+    r.encoding = "utf-8"
+
+    out = {}
+    for row in csv.DictReader(io.StringIO(r.text)):
+        key = row.get("lyrae_key")
+        try:
+            lat, lon = float(row["latitude"]), float(row["longitude"])
+            score = float(row.get("result_score") or 0.0)
+        except (KeyError, TypeError, ValueError):
+            out[key] = None
+            continue
+        out[key] = None if score < min_score else {
+            "lat": lat, "lon": lon, "display_name": row.get("result_label") or row.get("q"),
+            "provider": "BAN", "score": score,
+        }
+    return out
+
+
+# ============================================================
+# JOB
+# ============================================================
+def build_addresses(df: pd.DataFrame, address_col: str = None, part_cols=()) -> pd.Series:
+    """1 adresse par ligne : address_col, ou parties (n°, rue, CP, ville) jointes comme dans l'app."""
+    if address_col:
+        return df[address_col].astype("string").fillna("").str.strip()
+    parts = [df[c].astype("string").fillna("").str.strip() for c in part_cols if c]
+    if not parts:
+        raise ValueError("indiquer address_col ou au moins une colonne d'adresse")
+    joined = parts[0]
+    for p in parts[1:]:
+        joined = joined + " " + p
+    return joined.str.split().str.join(" ").fillna("")
+
+
+class BulkGeocoder:
+    """
+    Géocode des adresses distinctes : BAN en masse puis Nominatim à débit limité,
+    chaque résultat dans le point de reprise. progress(fait, total, étape) optionnel.
+    """
+
+    def __init__(self, checkpoint: GeocodeCheckpoint, contact_email: str = DEFAULT_CONTACT_EMAIL,
+                 ban_csv_url: str = BAN_CSV_URL, ban_chunk: int = BAN_CSV_CHUNK, use_ban: bool = True,
+                 nominatim: NominatimProvider = None, nominatim_rate_per_s: float = NOMINATIM_RATE_PER_S,
+                 progress=None):
+        self.checkpoint = checkpoint
+        self.ban_csv_url = ban_csv_url
+        self.ban_chunk = int(ban_chunk)
+        self.use_ban = use_ban
+        self.nominatim = nominatim or NominatimProvider()
+        self.bucket = TokenBucket(nominatim_rate_per_s)
+        self.progress = progress
+        self.session = requests.Session()  # keep-alive pour toutes les requêtes du job
+        self.session.headers.update({
+            "User-Agent": f"LYRAE/1.0 ({contact_email})",
+            "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.6",
+        })
+        self.stats = {"unique": 0, "resumed": 0, "ban": 0, "nominatim": 0, "not_found": 0, "errors": 0}
+
+    def _tick(self, done: int, total: int, stage: str) -> None:
+        if self.progress is not None:
+            self.progress(done, total, stage)
+
+    def run(self, addresses: dict) -> dict:
+        """addresses : key -> adresse (déjà dédoublonnées). Retourne key -> (statut, geo)."""
+        state = self.checkpoint.load()
+        self.stats["unique"] = len(addresses)
+        self.stats["resumed"] = sum(1 for k in addresses if k in state)
+
+        # --- BAN en masse (adresses jamais vues)
+        todo = [(k, a) for k, a in addresses.items() if k not in state]
+        if self.use_ban:
+            for i in range(0, len(todo), self.ban_chunk):
+                chunk = todo[i:i + self.ban_chunk]
+                try:
+                    res = ban_bulk(self.session, chunk, self.ban_csv_url)
+                except (requests.RequestException, ValueError):
+                    # BAN indisponible : ce paquet passe à Nominatim
+                    self.stats["errors"] += 1
+                    res = {}
+                rows = [(k, a, STATUS_OK, res[k]) if res.get(k) else (k, a, STATUS_BAN_MISS, None)
+                        for k, a in chunk if k in res]
+                self.checkpoint.put_many(rows)
+                for k, _, s, g in rows:
+                    state[k] = (s, g)
+                self._tick(min(i + self.ban_chunk, len(todo)), len(todo), "BAN")
+
+        # --- Nominatim pour le reste (1 requête à la fois, au débit autorisé)
+        rest = [(k, a) for k, a in addresses.items() if state.get(k, (STATUS_BAN_MISS,))[0] == STATUS_BAN_MISS]
+        for j, (k, a) in enumerate(rest, start=1):
+            self.bucket.acquire()
+            try:
+                geo = self.nominatim.fetch(self.session, a, timeout=REQUEST_TIMEOUT_S)
+            except (requests.RequestException, ValueError):
+                geo = {"__error__": True}
+            if geo is not None and not geocode_ok(geo):
+                self.stats["errors"] += 1  # non enregistré : retenté au prochain run
+            else:
+                status = STATUS_OK if geo is not None else STATUS_NOT_FOUND
+                self.checkpoint.put_many([(k, a, status, geo)])
+                state[k] = (status, geo)
+            self._tick(j, len(rest), "Nominatim")
+
+        for k in addresses:
+            s, g = state.get(k, (None, None))
+            if s == STATUS_OK:
+                self.stats["nominatim" if g.get("provider") == "Nominatim" else "ban"] += 1
+            elif s == STATUS_NOT_FOUND:
+                self.stats["not_found"] += 1
+        return {k: state[k] for k in addresses if k in state}
+
+
+def geocode_frame(df: pd.DataFrame, addresses: pd.Series, geocoder: BulkGeocoder,
+                  lat_col: str = "lat", lon_col: str = "lon", communes=None,
+                  cp_col: str = None, city_col: str = None) -> pd.DataFrame:
+    """
+    df + lat_col, lon_col, geo_label, geo_provider, geo_status. Les lignes ayant
+    déjà lat/lon dans df sont gardées telles quelles (geo_status = "input").
+    communes (lyrae.communes.CommuneIndex) : les adresses non géocodées prennent le
+    centroïde de cp_col / city_col (geo_status = "approx").
+    """
+    out = df.reset_index(drop=True).copy()
+    addresses = addresses.reset_index(drop=True)
+    has_coords = np.zeros(len(out), dtype=bool)
+    if lat_col in out.columns and lon_col in out.columns:
+        has_coords = (pd.to_numeric(out[lat_col], errors="coerce").notna()
+                      & pd.to_numeric(out[lon_col], errors="coerce").notna()).to_numpy()
+
+    keys = addresses.map(address_key)
+    distinct = {}
+    for k, a, done in zip(keys, addresses, has_coords):
+        if k and not done:
+            distinct.setdefault(k, a)
+    results = geocoder.run(distinct) if geocoder is not None else {}  # None : hors ligne
+    unresolved = "error" if geocoder is not None else STATUS_NOT_FOUND
+
+    lat = np.full(len(out), np.nan)
+    lon = np.full(len(out), np.nan)
+    if has_coords.any():
+        lat[has_coords] = pd.to_numeric(out[lat_col], errors="coerce").to_numpy(dtype=float)[has_coords]
+        lon[has_coords] = pd.to_numeric(out[lon_col], errors="coerce").to_numpy(dtype=float)[has_coords]
+    label = [None] * len(out)
+    provider = [None] * len(out)
+    status = ["input"] * len(out)
+    for i, k in enumerate(keys):
+        if has_coords[i]:
+            continue
+        s, g = results.get(k, (unresolved, None)) if k else ("empty", None)
+        status[i] = "error" if s == STATUS_BAN_MISS else s  # BAN sans résultat, Nominatim injoignable
+        if s == STATUS_OK:
+            lat[i], lon[i] = g["lat"], g["lon"]
+            label[i], provider[i] = g.get("display_name"), g.get("provider")
+
+    if communes is not None and (cp_col or city_col):
+        cps = out[cp_col].tolist() if cp_col else [None] * len(out)
+        cities = out[city_col].tolist() if city_col else [None] * len(out)
+        for i, s in enumerate(status):
+            if s in ("input", STATUS_OK):
+                continue
+            g = communes.locate(cps[i], cities[i])
+            if g is not None:
+                lat[i], lon[i] = g["lat"], g["lon"]
+                label[i], provider[i], status[i] = g["display_name"], g["provider"], "approx"
+    out[lat_col], out[lon_col] = lat, lon
+    out["geo_label"], out["geo_provider"], out["geo_status"] = label, provider, status
+    return out
+
+
+# ============================================================
+# CLI
+# ============================================================
+def _open_risk_source(path: str):
+    """GeoTIFF (rasterio) ou grille compacte .npy (NumPy seul)."""
+    if str(path).lower().endswith(".npy"):
+        from lyrae.riskgrid import CompactRiskGrid
+        return CompactRiskGrid(path)
+    from lyrae.risk import RiskRaster
+    return RiskRaster(path)
+
+
+def _print_progress(done: int, total: int, stage: str) -> None:
+    print(f"\r{stage} : {done}/{total} adresse(s) ", end="", file=sys.stderr, flush=True)
+
+
+def main(argv=None) -> int:
+    from lyrae.batch import write_scores
+    from lyrae.core import META_DEFAULT, ROOT_DIR, load_meta
+
+    ap = argparse.ArgumentParser(prog="python -m lyrae.geobatch", description="Géocodage en masse (BAN CSV + Nominatim).")
+    ap.add_argument("input", help="Fichier d'adresses (.csv ou .xlsx)")
+    ap.add_argument("-o", "--output", default=None, help="Sortie (.csv, .xlsx ou .parquet). Défaut : <input>_geo.csv")
+    ap.add_argument("--address-col", default=None, help="Colonne contenant l'adresse complète")
+    ap.add_argument("--num-col", default=None)
+    ap.add_argument("--street-col", default=None)
+    ap.add_argument("--cp-col", default=None)
+    ap.add_argument("--city-col", default=None)
+    ap.add_argument("--lat-col", default="lat")
+    ap.add_argument("--lon-col", default="lon")
+    ap.add_argument("--checkpoint", default=None, help="Point de reprise SQLite (défaut : <output>.geocode.sqlite)")
+    ap.add_argument("--no-ban-bulk", action="store_true", help="Ne pas utiliser l'API CSV de la BAN")
+    ap.add_argument("--ban-chunk", type=int, default=BAN_CSV_CHUNK)
+    ap.add_argument("--nominatim-rate", type=float, default=NOMINATIM_RATE_PER_S, help="Requêtes Nominatim / s")
+    ap.add_argument("--contact-email", default=DEFAULT_CONTACT_EMAIL, help="Contact du User-Agent (politique Nominatim)")
+    ap.add_argument("--raster", default=None, help="GeoTIFF ou grille .npy : ajoute 'Classe de risque'")
+    ap.add_argument("--communes", default=None,
+                    help="Index des communes (.npz / .csv, lyrae.communes) : repli CP / ville si non géocodé")
+    ap.add_argument("--offline", action="store_true", help="Aucun appel réseau : index des communes seul")
+    ap.add_argument("--meta", default=str(ROOT_DIR / META_DEFAULT), help="Meta .json (niveaux de la classe de risque)")
+    ap.add_argument("--sheet", default=0)
+    ap.add_argument("--sep", default=None)
+    args = ap.parse_args(argv)
+
+    in_path = Path(args.input)
+    out_path = Path(args.output) if args.output else in_path.with_name(f"{in_path.stem}_geo.csv")
+    ckpt_path = Path(args.checkpoint) if args.checkpoint else out_path.with_name(f"{out_path.name}.geocode.sqlite")
+    sheet = int(args.sheet) if str(args.sheet).isdigit() else args.sheet
+
+    if args.offline and not args.communes:
+        print("--offline nécessite --communes", file=sys.stderr)
+        return 2
+    df = read_cases(in_path, sheet=sheet, sep=args.sep)
+    cols = [args.address_col, args.num_col, args.street_col, args.cp_col, args.city_col]
+    missing = [c for c in cols if c and c not in df.columns]
+    if missing:
+        print(f"Colonne(s) absente(s) du fichier : {', '.join(missing)}", file=sys.stderr)
+        return 2
+    try:
+        addresses = build_addresses(df, args.address_col, (args.num_col, args.street_col, args.cp_col, args.city_col))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    t0 = time.perf_counter()
+    geocoder = None
+    if not args.offline:
+        geocoder = BulkGeocoder(GeocodeCheckpoint(ckpt_path), contact_email=args.contact_email,
+                                ban_chunk=args.ban_chunk, use_ban=not args.no_ban_bulk,
+                                nominatim_rate_per_s=args.nominatim_rate, progress=_print_progress)
+    communes = None
+    if args.communes:
+        from lyrae.communes import CommuneIndex
+        communes = CommuneIndex.load(args.communes)
+    out = geocode_frame(df, addresses, geocoder, lat_col=args.lat_col, lon_col=args.lon_col,
+                        communes=communes, cp_col=args.cp_col, city_col=args.city_col)
+    print(file=sys.stderr)
+
+    if args.raster:
+        from lyrae.riskgrid import add_risk_class
+        out = add_risk_class(out, _open_risk_source(args.raster), load_meta(Path(args.meta))["factor_levels"],
+                             lat_col=args.lat_col, lon_col=args.lon_col)
+    write_scores(out, out_path)
+
+    print(f"{len(out)} ligne(s) en {time.perf_counter() - t0:.1f} s -> {out_path}")
+    if geocoder is not None:
+        st = geocoder.stats
+        print(f"{st['unique']} adresse(s) distincte(s) (reprises : {st['resumed']}) : BAN {st['ban']}, "
+              f"Nominatim {st['nominatim']}, non trouvées {st['not_found']}, "
+              f"erreurs réseau {st['errors']} (retentées au prochain lancement)")
+    print(out["geo_status"].value_counts().to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Imports différés + relevé des temps d'import (équivalent "-X importtime" dans l'app).
+
+Les dépendances lourdes (catboost, rasterio, pyproj...) ne sont importées qu'au
+premier usage via lazy_import ; chaque premier import est chronométré, sous-imports
+compris, et visible dans import_report().
+"""
+
+import importlib
+import sys
+import threading
+import time
+
+# Modules surveillés dans le rapport (chargés ou non dans ce process)
+HEAVY_MODULES = ("catboost", "rasterio", "pyproj", "pandas", "streamlit.components.v1")
+
+_IMPORT_TIMES: dict = {}  # nom -> (secondes, horodatage du premier import)
+_LOCK = threading.Lock()
+_PROCESS_START = time.time()
+
+
+def record_import_time(name: str, seconds: float) -> None:
+    with _LOCK:
+        _IMPORT_TIMES.setdefault(name, (float(seconds), time.time()))
+
+
+def lazy_import(name: str):
+    """importlib.import_module, chronométré au premier appel."""
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    t0 = time.perf_counter()
+    mod = importlib.import_module(name)
+    record_import_time(name, time.perf_counter() - t0)
+    return mod
+
+
+def import_report() -> list[dict]:
+    """Une ligne par module chronométré ou surveillé : chargé ?, durée du 1er import, délai depuis le démarrage."""
+    with _LOCK:
+        times = dict(_IMPORT_TIMES)
+
+    rows = []
+    for name in list(times) + [m for m in HEAVY_MODULES if m not in times]:
+        t = times.get(name)
+        rows.append({
+            "module": name,
+            "chargé": name in sys.modules,
+            "import (ms)": round(t[0] * 1000, 1) if t else None,
+            "à t+ (s)": round(t[1] - _PROCESS_START, 2) if t else None,
+        })
+    return rows
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Scoring en lot sur plusieurs cœurs (pool de processus).
+
+    from lyrae.parallel import ParallelScorer
+    with ParallelScorer(model_path, meta_path, workers=4) as scorer:
+        out = scorer.score_cases(df)          # = lyrae.batch.score_cases, lignes dans l'ordre
+
+    python -m lyrae.batch registre.csv -o scores.csv --workers 4 --thread-count 1
+
+Les lignes brutes sont découpées en tranches contiguës envoyées à un
+ProcessPoolExecutor ; chaque worker charge modèle + meta une seule fois
+(initializer) et fait prétraitement + predict_proba de sa tranche. Seules les
+probabilités reviennent au process principal, réassemblées dans l'ordre.
+
+thread_count = threads CatBoost par worker : par défaut cœurs // workers, pour
+que les deux niveaux de parallélisme ne se disputent pas les cœurs.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from lyrae.core import cat_from_p_like_R
+
+SHARD_ROWS_DEFAULT = 5000
+
+# Predictor du worker (1 par process, créé par _init_worker)
+_WORKER_PREDICTOR = None
+
+
+def default_thread_count(workers: int) -> int:
+    """Threads CatBoost par worker : cœurs disponibles répartis entre les workers."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(model_path: str, meta_path: str, engine: str, thread_count: int) -> None:
+    global _WORKER_PREDICTOR
+    from lyrae.predictor import Predictor
+    # Pas de cache LRU : chaque ligne n'est vue qu'une fois par le worker
+    _WORKER_PREDICTOR = Predictor(model_path, meta_path, use_cache=False, engine=engine,
+                                  thread_count=thread_count)
+
+
+def _score_shard(df: pd.DataFrame) -> np.ndarray:
+    return _WORKER_PREDICTOR.predict_proba(_WORKER_PREDICTOR.prepare_many(df), use_cache=False)
+
+
+def shard_bounds(n_rows: int, workers: int, shard_rows: int = SHARD_ROWS_DEFAULT) -> list[tuple[int, int]]:
+    """Tranches [début, fin) contiguës : au moins 1 par worker, shard_rows lignes au plus (à peu près)."""
+    if n_rows <= 0:
+        return []
+    n_shards = min(n_rows, max(workers, -(-n_rows // max(1, shard_rows))))
+    edges = np.linspace(0, n_rows, n_shards + 1).round().astype(np.int64)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+class ParallelScorer:
+    """
+    Pool de `workers` processus, chacun avec son Predictor (chargé une fois).
+    À réutiliser pour plusieurs lots (ex. paquets de lyrae.stream) ; close() ou with.
+    """
+
+    def __init__(self, model_path, meta_path, engine: str = "auto", workers: int = None,
+                 thread_count: int = None, shard_rows: int = SHARD_ROWS_DEFAULT):
+        self.workers = int(workers or os.cpu_count() or 1)
+        if self.workers < 1:
+            raise ValueError("workers doit être >= 1")
+        self.thread_count = int(thread_count) if thread_count else default_thread_count(self.workers)
+        self.shard_rows = int(shard_rows)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(str(model_path), str(meta_path), engine, self.thread_count),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def warmup(self) -> None:
+        """Force le chargement du modèle dans tous les workers (hors mesure de temps)."""
+        empty = pd.DataFrame()
+        list(self._pool.map(_score_shard, [empty] * self.workers))
+
+    def predict_proba(self, df: pd.DataFrame) -> np.ndarray:
+        """Lignes brutes (schéma du jeu de référence) -> probabilités, dans l'ordre de df."""
+        shards = [df.iloc[a:b] for a, b in shard_bounds(len(df), self.workers, self.shard_rows)]
+        if not shards:
+            return np.empty(0, dtype=float)
+        # map conserve l'ordre des tranches
+        return np.concatenate(list(self._pool.map(_score_shard, shards)))
+
+    def score_cases(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Comme lyrae.batch.score_cases : copie de df + probability + category."""
+        p = self.predict_proba(df)
+        out = df.reset_index(drop=True).copy()
+        out["probability"] = p
+        out["category"] = [cat_from_p_like_R(float(v)) for v in p]
+        return out
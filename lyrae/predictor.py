@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""
+Predictor LYRAE : modèle + meta chargés une fois, prédiction sans Streamlit.
+
+    from lyrae import Predictor
+    pred = Predictor()                       # modèle/meta par défaut du dépôt
+    pred.predict_one({"Type_de_cheval": "Sport", "ELISA_pos": "Oui"})
+    pred.predict_many(df)                    # DataFrame ou liste de dicts -> 1 Pool
+    for r in pred.predict_stream(cas, batch_size=500): ...
+
+Même chemin de prétraitement que l'app (build_template -> apply_inputs_to_template
+-> fill_missing_code_like_R -> coerce_like_train_python), donc mêmes probabilités.
+
+Les probabilités sont mémorisées dans un cache LRU partagé par le process
+(PREDICTION_CACHE), clé = hash canonique de la ligne prétraitée + checksum du .cbm.
+
+Rechargement à chaud : get_predictor garde un Predictor par (modèle, meta, engine) ;
+ModelWatcher (start_model_watcher) surveille l'empreinte des fichiers (mtime + taille
++ sha256) et remplace le Predictor d'un bloc quand le .cbm ou le meta change. Les
+appels en cours terminent sur l'ancien objet ; les caches sont vidés au remplacement.
+
+Si un évaluateur NumPy à jour est posé à côté du modèle (<modèle>.npz, voir
+lyrae.treemodel), il remplace CatBoost pour le scoring ; engine="numpy" n'importe
+alors jamais catboost.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from lyrae.core import (
+    META_DEFAULT,
+    MODEL_DEFAULT,
+    ROOT_DIR,
+    analysis_cols,
+    apply_inputs_to_template,
+    build_template,
+    MISSING_LEVEL,
+    FeatureSchema,
+    cat_from_p_like_R,
+    fill_missing_code_like_R,
+    load_meta,
+    load_model_and_meta,
+    predict_proba_frame,
+    prepare_features,
+)
+from lyrae.treemodel import TreeModel, default_tree_path, file_sha256
+
+PREDICTION_CACHE_MAX = 4096
+
+# "auto" : évaluateur NumPy s'il existe et correspond au .cbm, sinon CatBoost
+ENGINES = ("auto", "catboost", "numpy")
+
+
+# ============================================================
+# CACHE DES PRÉDICTIONS (LRU, partagé par le process)
+# ============================================================
+def feature_row_keys(X: pd.DataFrame, feature_cols: list, cat_cols: list, salt: str = "") -> list[str]:
+    """
+    Une clé par ligne de X (normalement déjà passé par FeatureSchema.coerce).
+    Forme canonique : numériques en float64 (NaN et -0.0 normalisés), catégorielles
+    en str avec NA/None -> "__MISSING__".
+    """
+    cat_set = set(cat_cols)
+    num = [c for c in feature_cols if c not in cat_set]
+    cats = [c for c in feature_cols if c in cat_set]
+
+    A = X[num].to_numpy(dtype=float, na_value=np.nan) + 0.0  # -0.0 -> 0.0
+    A[np.isnan(A)] = np.nan  # un seul motif binaire pour NaN
+    A = np.ascontiguousarray(A)
+    C = X[cats].to_numpy(dtype=object)
+    if not all(isinstance(v, str) for v in pd.unique(C.ravel())):
+        # X non coercé (pd.NA, nombres) : même forme canonique que FeatureSchema.coerce
+        C = X[cats].astype("string").fillna(MISSING_LEVEL).to_numpy(dtype=object)
+
+    prefix = hashlib.blake2b(salt.encode("utf-8"), digest_size=16)
+    keys = []
+    for i in range(len(X)):
+        h = prefix.copy()
+        h.update(A[i].tobytes())
+        h.update("\x1f".join(C[i]).encode("utf-8"))
+        keys.append(h.hexdigest())
+    return keys
+
+
+class PredictionCache:
+    """Cache LRU borné clé -> probabilité, thread-safe, avec compteurs hits / misses."""
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_MAX):
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list[str]) -> list:
+        """Probabilité en cache pour chaque clé (None si absente)."""
+        out = []
+        with self._lock:
+            for k in keys:
+                v = self._data.get(k)
+                if v is None:
+                    self.misses += 1
+                else:
+                    self._data.move_to_end(k)
+                    self.hits += 1
+                out.append(v)
+        return out
+
+    def put_many(self, keys: list[str], values) -> None:
+        with self._lock:
+            for k, v in zip(keys, values):
+                self._data[k] = self._store(v)
+                self._data.move_to_end(k)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def _store(self, v):
+        """Valeur conservée pour v (surchargé par les caches de vecteurs)."""
+        return float(v)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = len(self._data)
+        total = self.hits + self.misses
+        return {
+            "entries": n,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# Partagé par toutes les sessions Streamlit / requêtes du process
+PREDICTION_CACHE = PredictionCache()
+
+# Caches vidés à chaque remplacement de modèle (lyrae.explain y ajoute le sien)
+_SWAP_CACHES: list = [PREDICTION_CACHE]
+
+
+def register_swap_cache(cache) -> None:
+    """cache.clear() sera appelé à chaque rechargement de modèle."""
+    if cache not in _SWAP_CACHES:
+        _SWAP_CACHES.append(cache)
+
+
+# ============================================================
+# EMPREINTE DES FICHIERS (mtime + taille + contenu)
+# ============================================================
+def file_fingerprint(path, previous: tuple = None) -> tuple:
+    """
+    (mtime_ns, taille, sha256). Si mtime et taille sont ceux de previous, le
+    contenu n'est pas relu : un sondage régulier ne coûte qu'un stat().
+    """
+    st = os.stat(path)
+    if previous is not None and previous[:2] == (st.st_mtime_ns, st.st_size):
+        return previous
+    return (st.st_mtime_ns, st.st_size, file_sha256(path))
+
+
+def _same_stat(path, fingerprint: tuple) -> bool:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return (st.st_mtime_ns, st.st_size) == fingerprint[:2]
+
+
+# ============================================================
+# PREDICTOR
+# ============================================================
+class Predictor:
+    """Modèle CatBoost + meta ; predict_one / predict_many / predict_stream."""
+
+    def __init__(self, model_path=None, meta_path=None, use_cache: bool = True, engine: str = "auto",
+                 thread_count: int = -1):
+        if engine not in ENGINES:
+            raise ValueError(f"engine doit être parmi {ENGINES}")
+        self.model_path = str(model_path or ROOT_DIR / MODEL_DEFAULT)
+        self.meta_path = str(meta_path or ROOT_DIR / META_DEFAULT)
+        if not Path(self.model_path).exists():
+            raise FileNotFoundError(f"Modèle introuvable: {self.model_path}")
+        if not Path(self.meta_path).exists():
+            raise FileNotFoundError(f"Meta introuvable: {self.meta_path}")
+        self.requested_engine = engine
+        # Threads CatBoost par predict_proba (-1 : tous les cœurs) ; 1 par worker en pool de processus
+        self.thread_count = int(thread_count)
+        # Empreintes prises AVANT lecture : un fichier remplacé pendant le chargement
+        # sera vu comme modifié au prochain passage du watcher
+        self.model_fingerprint = file_fingerprint(self.model_path)
+        self.meta_fingerprint = file_fingerprint(self.meta_path)
+        self.model_checksum = self.model_fingerprint[2]
+        self.loaded_at = time.time()
+        self.tree_model = self._load_tree_model(engine)
+
+        if engine == "numpy":
+            # Ni catboost ni .cbm chargé : meta + évaluateur NumPy suffisent
+            self.model = None
+            self.meta = load_meta(Path(self.meta_path))
+            self.feature_cols = self.meta["feature_cols"]
+            self.cat_cols = self.meta["cat_cols"]
+            self.factor_levels = self.meta["factor_levels"]
+            self.cat_idx = [self.feature_cols.index(c) for c in self.cat_cols if c in self.feature_cols]
+        else:
+            (
+                self.model,
+                self.meta,
+                self.feature_cols,
+                self.cat_cols,
+                self.factor_levels,
+                self.cat_idx,
+            ) = load_model_and_meta(self.model_path, self.meta_path)
+        self._analysis_set = set(analysis_cols)
+        # Plan de coercition compilé une fois (niveaux codés, positions, compteurs de dérive)
+        self.schema = FeatureSchema(self.feature_cols, self.cat_cols, self.factor_levels)
+        self._model_lock = threading.Lock()
+        self.cache = PREDICTION_CACHE if use_cache else None
+        # Sel des clés de cache : modèle ET meta (niveaux, colonnes) font la prédiction
+        self.cache_salt = f"{self.model_checksum}:{self.meta_fingerprint[2]}"
+
+    def _load_tree_model(self, engine: str):
+        if engine == "catboost":
+            return None
+        path = default_tree_path(self.model_path)
+        if not path.exists():
+            if engine == "numpy":
+                raise FileNotFoundError(f"Évaluateur NumPy introuvable: {path} (python -m lyrae.treemodel export)")
+            return None
+        tm = TreeModel(path)
+        if tm.source_sha256 != self.model_checksum:
+            if engine == "numpy":
+                raise ValueError(f"{path} ne correspond pas à {self.model_path} (relancer python -m lyrae.treemodel export)")
+            return None
+        return tm
+
+    @property
+    def engine(self) -> str:
+        return "numpy" if self.tree_model is not None else "catboost"
+
+    def catboost_model(self):
+        """Modèle CatBoost (chargé au premier appel avec engine="numpy", ex. pour les SHAP)."""
+        with self._model_lock:
+            if self.model is None:
+                self.model = load_model_and_meta(self.model_path, self.meta_path)[0]
+            return self.model
+
+    # ---------------- prétraitement ----------------
+    def prepare_one(self, inputs: dict) -> pd.DataFrame:
+        """1 cas (dict variable -> valeur) -> X (1 ligne) prêt pour CatBoost."""
+        X = build_template(self.feature_cols)
+        X = apply_inputs_to_template(X, inputs)
+        X = fill_missing_code_like_R(X, self._analysis_set)
+        return self.schema.coerce(X)
+
+    def prepare_many(self, cases) -> pd.DataFrame:
+        """DataFrame (schéma du jeu de référence) ou liste de dicts -> X (N lignes)."""
+        if not isinstance(cases, pd.DataFrame):
+            # dtype=object : mêmes valeurs Python que le template (pas d'inférence int -> float)
+            cases = pd.DataFrame(list(cases), dtype=object)
+        return prepare_features(cases, self.feature_cols, self.cat_cols, self.factor_levels, schema=self.schema)
+
+    # ---------------- prédiction ----------------
+    def predict_proba(self, X: pd.DataFrame, use_cache: bool = True) -> np.ndarray:
+        """
+        X déjà prétraité -> probabilité de Lyme par ligne. Les lignes absentes du
+        cache passent dans un seul Pool ; les autres ne coûtent qu'une recherche.
+        """
+        if self.cache is None or not use_cache or len(X) == 0:
+            return self._score(X)
+
+        keys = feature_row_keys(X, self.feature_cols, self.cat_cols, salt=self.cache_salt)
+        cached = self.cache.get_many(keys)
+        out = np.array([np.nan if v is None else v for v in cached], dtype=float)
+
+        miss = [i for i, v in enumerate(cached) if v is None]
+        if miss:
+            X_miss = X if len(miss) == len(X) else X.iloc[miss]
+            p = self._score(X_miss)
+            out[miss] = p
+            self.cache.put_many([keys[i] for i in miss], p)
+        return out
+
+    def _score(self, X: pd.DataFrame) -> np.ndarray:
+        if self.tree_model is not None:
+            return self.tree_model.predict_proba(X)
+        return predict_proba_frame(self.model, X, self.cat_idx, self.thread_count)
+
+    def predict_one(self, inputs: dict) -> dict:
+        p = float(self.predict_proba(self.prepare_one(inputs))[0])
+        return {"probability": p, "category": cat_from_p_like_R(p)}
+
+    def predict_many(self, cases, use_cache: bool = True) -> pd.DataFrame:
+        """Retourne un DataFrame probability + category, une ligne par cas (dans l'ordre)."""
+        p = self.predict_proba(self.prepare_many(cases), use_cache=use_cache)
+        return pd.DataFrame({
+            "probability": p,
+            "category": [cat_from_p_like_R(float(v)) for v in p],
+        })
+
+    def predict_stream(self, cases: Iterable[dict], batch_size: int = 1000) -> Iterator[dict]:
+        """
+        Itérable de dicts (éventuellement infini / paresseux) -> un résultat par cas,
+        scoré par paquets de batch_size (1 Pool par paquet, mémoire bornée).
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size doit être >= 1")
+        it = iter(cases)
+        while True:
+            chunk = list(islice(it, batch_size))
+            if not chunk:
+                return
+            yield from self.predict_many(chunk).to_dict("records")
+
+
+# Cache process : partagé entre sessions Streamlit et avec le thread de préchargement
+_PREDICTORS: dict = {}
+_PREDICTORS_LOCK = threading.Lock()
+_RELOADS: list = []  # historique des remplacements / échecs (le plus récent en dernier)
+_FAILED: dict = {}   # clé -> empreintes (modèle, meta) dont le chargement a échoué
+_LOADING: dict = {}  # clé -> Future du 1er chargement en cours (les autres appelants l'attendent)
+
+
+def _predictor_key(model_path_str=None, meta_path_str=None, engine: str = "auto") -> tuple:
+    model_path = Path(model_path_str or ROOT_DIR / MODEL_DEFAULT)
+    meta_path = Path(meta_path_str or ROOT_DIR / META_DEFAULT)
+    return (str(model_path.resolve()), str(meta_path.resolve()), engine)
+
+
+def get_predictor(model_path_str=None, meta_path_str=None, engine: str = "auto") -> Predictor:
+    """
+    Predictor courant pour (modèle, meta, engine), mis en cache pour le process
+    (un échec n'est pas mis en cache). Après un rechargement par le watcher, renvoie
+    le nouveau Predictor ; les appelants qui tiennent l'ancien le gardent.
+
+    Le chargement se fait hors du verrou global : charger un modèle (ex. shadow)
+    ne bloque pas les autres clés ; les appels concurrents pour la même clé
+    attendent le même chargement au lieu de le refaire.
+    """
+    key = _predictor_key(model_path_str, meta_path_str, engine)
+    with _PREDICTORS_LOCK:
+        predictor = _PREDICTORS.get(key)
+        if predictor is not None:
+            return predictor
+        loading = _LOADING.get(key)
+        if loading is None:
+            loading = _LOADING[key] = Future()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        return loading.result()
+
+    try:
+        predictor = Predictor(key[0], key[1], engine=engine)
+    except BaseException as e:
+        with _PREDICTORS_LOCK:
+            _LOADING.pop(key, None)
+        loading.set_exception(e)
+        raise
+    with _PREDICTORS_LOCK:
+        predictor = _PREDICTORS.setdefault(key, predictor)
+        _LOADING.pop(key, None)
+    loading.set_result(predictor)
+    return predictor
+
+
+def refresh_predictors() -> list[tuple]:
+    """
+    Compare les empreintes des fichiers à celles des Predictor en cache ; recharge
+    ceux dont le .cbm ou le meta a changé et les remplace d'un bloc. Le chargement
+    se fait hors verrou (get_predictor continue de servir l'ancien). Retourne les
+    clés remplacées.
+    """
+    with _PREDICTORS_LOCK:
+        items = list(_PREDICTORS.items())
+
+    swapped = []
+    for key, old in items:
+        try:
+            fp_model = file_fingerprint(old.model_path, old.model_fingerprint)
+            fp_meta = file_fingerprint(old.meta_path, old.meta_fingerprint)
+        except OSError:
+            continue  # fichier absent le temps d'une copie : on réessaiera
+        if (fp_model, fp_meta) == (old.model_fingerprint, old.meta_fingerprint):
+            continue
+        if fp_model[2] == old.model_checksum and fp_meta[2] == old.meta_fingerprint[2]:
+            # touch / copie identique : contenu inchangé, on ne garde que le nouveau stat
+            with _PREDICTORS_LOCK:
+                if _PREDICTORS.get(key) is old:
+                    old.model_fingerprint, old.meta_fingerprint = fp_model, fp_meta
+            continue
+
+        if _FAILED.get(key) == (fp_model, fp_meta):
+            continue  # même contenu déjà refusé : on attend un nouveau fichier
+        try:
+            new = Predictor(old.model_path, old.meta_path, use_cache=old.cache is not None,
+                            engine=old.requested_engine)
+        except Exception as e:
+            # Fichier incomplet ou invalide : l'ancien modèle reste en service
+            _FAILED[key] = (fp_model, fp_meta)
+            _RELOADS.append({"at": time.time(), "model": old.model_path, "ok": False, "error": f"{type(e).__name__}: {e}"})
+            continue
+        if not (_same_stat(new.model_path, new.model_fingerprint) and _same_stat(new.meta_path, new.meta_fingerprint)):
+            continue  # encore modifié pendant le chargement : prochain passage
+
+        with _PREDICTORS_LOCK:
+            if _PREDICTORS.get(key) is not old:
+                continue
+            _PREDICTORS[key] = new
+        _FAILED.pop(key, None)
+        swapped.append(key)
+        _RELOADS.append({"at": time.time(), "model": new.model_path, "ok": True,
+                         "checksum": new.model_checksum[:12]})
+
+    if swapped:
+        for cache in _SWAP_CACHES:
+            cache.clear()
+    del _RELOADS[:-20]
+    return swapped
+
+
+def reload_history() -> list[dict]:
+    return list(_RELOADS)
+
+
+class ModelWatcher:
+    """Thread daemon : refresh_predictors() toutes les interval_s secondes."""
+
+    def __init__(self, interval_s: float = 2.0):
+        self.interval_s = float(interval_s)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="lyrae-model-watcher", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                refresh_predictors()
+            except Exception:
+                pass  # un sondage raté ne doit pas arrêter le watcher
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+_WATCHER = None
+_WATCHER_LOCK = threading.Lock()
+
+
+def start_model_watcher(interval_s: float = 2.0) -> ModelWatcher:
+    """Démarre (une seule fois par process) le watcher de modèles."""
+    global _WATCHER
+    with _WATCHER_LOCK:
+        if _WATCHER is None:
+            _WATCHER = ModelWatcher(interval_s)
+        return _WATCHER
+
+
+_WARMUPS: dict = {}  # clé -> thread de préchargement (un seul par process)
+_WARMUPS_LOCK = threading.Lock()
+
+
+def warmup_predictor_in_background(model_path_str=None, meta_path_str=None) -> threading.Thread:
+    """
+    Charge catboost + le modèle dans un thread daemon. Un appel ultérieur à
+    get_predictor attend la fin du chargement au lieu de le refaire.
+    Une seule fois par process et par modèle : les reruns Streamlit récupèrent le même thread.
+    """
+    def _run():
+        try:
+            get_predictor(model_path_str, meta_path_str)
+        except Exception:
+            pass  # l'erreur sera remontée (et affichée) au chargement au premier plan
+
+    key = _predictor_key(model_path_str, meta_path_str)
+    with _WARMUPS_LOCK:
+        t = _WARMUPS.get(key)
+        if t is None:
+            t = threading.Thread(target=_run, name="lyrae-model-warmup", daemon=True)
+            t.start()
+            _WARMUPS[key] = t
+        return t
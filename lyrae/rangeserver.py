@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Petit serveur HTTP statique avec support des "Range requests" (bytes=a-b).
+
+http.server (python -m http.server) ignore l'en-tête Range : GDAL /vsicurl/
+télécharge alors tout le fichier. Ce serveur sert de doublure locale à un
+hébergement COG (S3, GitHub raw...) pour tester la lecture par tuiles.
+
+Usage :
+    python -m lyrae.rangeserver DOSSIER --port 8765
+    -> RiskRaster("http://127.0.0.1:8765/risk_cog.tif", max_in_memory_bytes=0)
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler + réponses 206 Partial Content (une seule plage)."""
+
+    bytes_sent = 0  # compteur global (diagnostic : combien a-t-on réellement lu ?)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        rng = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if rng is None or not os.path.isfile(path):
+            return super().send_head()
+
+        m = _RANGE_RE.match(rng.strip())
+        size = os.path.getsize(path)
+        if m is None or (m.group(1) == "" and m.group(2) == ""):
+            self.send_error(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            return None
+
+        if m.group(1) == "":
+            # bytes=-N : les N derniers octets
+            start, end = max(0, size - int(m.group(2))), size - 1
+        else:
+            start = int(m.group(1))
+            end = int(m.group(2)) if m.group(2) else size - 1
+        end = min(end, size - 1)
+        if start > end:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.end_headers()
+            return None
+
+        f = open(path, "rb")
+        f.seek(start)
+        self._range_left = end - start + 1
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(self._range_left))
+        self.end_headers()
+        return f
+
+    def end_headers(self):
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        left = getattr(self, "_range_left", None)
+        if left is None:
+            return super().copyfile(source, outputfile)
+        while left > 0:
+            chunk = source.read(min(64 * 1024, left))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            left -= len(chunk)
+            RangeRequestHandler.bytes_sent += len(chunk)
+        self._range_left = None
+
+
+def serve_ranges(directory: str, host: str = "127.0.0.1", port: int = 8765, background: bool = False):
+    """Démarre le serveur ; background=True -> thread daemon, retourne le serveur (server.shutdown())."""
+    handler = partial(RangeRequestHandler, directory=str(directory))
+    server = ThreadingHTTPServer((host, port), handler)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return server
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m lyrae.rangeserver", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("directory", nargs="?", default=".")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args(argv)
+    print(f"Serveur range requests : http://{args.host}:{args.port}/ -> {os.path.abspath(args.directory)}")
+    serve_ranges(args.directory, host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Prochain examen conseillé : classement des examens en attente par changement de
+catégorie attendu (cat_from_p_like_R), pondéré par les taux de positivité du jeu
+de référence.
+
+    from lyrae.recommend import load_outcome_rates, recommend_next_tests
+    rates = load_outcome_rates()                       # jeu de référence du dépôt
+    res = recommend_next_tests(predictor, inputs, rates)
+    res["ranking"]                                     # 1 ligne par examen, le plus utile d'abord
+
+Un examen = une ou plusieurs variables obtenues ensemble (la ponction de LCR donne
+pléiocytose, protéines et PCR). Toutes les issues possibles (Oui/Non, ou leurs
+combinaisons pour un panel) de tous les examens en attente forment des variantes
+du cas courant, scorées en un seul predict_proba (lyrae.whatif.score_variants).
+
+Pour chaque examen :
+- p_issue = fréquence de l'issue dans le jeu de référence (lissage de Laplace,
+  +1 par issue : aucune issue n'a un poids nul) ;
+- p_change = P(la catégorie change) ;
+- expected_shift = E[|écart de catégorie|] (0 à 3 crans, classement principal) ;
+- info_gain_bits = entropie de la catégorie obtenue après l'examen ;
+- expected_abs_delta = E[|Δ probabilité|] (départage).
+"""
+
+import time
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lyrae.core import REFERENCE_CASES_DEFAULT, ROOT_DIR, YN_MAP, cat_from_p_like_R, read_cases
+from lyrae.whatif import WHATIF_VALUES, _is_missing, score_variants
+
+# Catégories dans l'ordre croissant de probabilité (écart = nombre de crans)
+CATEGORY_ORDER = (
+    "Pas de Lyme ou informations insuffisantes",
+    "Lyme possible",
+    "Lyme probable",
+    "Lyme sûr",
+)
+_CATEGORY_RANK = {c: i for i, c in enumerate(CATEGORY_ORDER)}
+
+# Examens proposés (libellé -> variables renseignées par l'examen)
+DIAGNOSTIC_TESTS = {
+    "ELISA": ("ELISA_pos",),
+    "ELISA OspA": ("ELISA_OspA_pos",),
+    "ELISA OspF": ("ELISA_OspF_pos",),
+    "ELISA p39": ("ELISA_p39",),
+    "Western Blot": ("WB_pos",),
+    "SNAP C6": ("SNAP_C6_pos",),
+    "IFAT": ("IFAT_pos",),
+    "PCR sang": ("PCR_sang_pos",),
+    "PCR synoviale": ("PCR_synoviale_pos",),
+    "PCR liquide articulaire": ("PCR_liquide_articulaire_pos",),
+    "PCR peau": ("PCR_peau_pos",),
+    "PCR humeur aqueuse": ("PCR_humeur_aqueuse_pos",),
+    "PCR tissu nerveux": ("PCR_tissu_nerveux_pos",),
+    "Ponction LCR (cytologie, protéines, PCR)": ("LCR_pleiocytose", "LCR_proteines_augmentees", "PCR_LCR_pos"),
+}
+
+
+# ============================================================
+# TAUX D'ISSUES (jeu de référence)
+# ============================================================
+def _yn_matrix(df: pd.DataFrame, cols: list) -> np.ndarray:
+    """Oui/Non/1/0 -> 1.0 / 0.0, le reste -> NaN (mêmes jetons que YN_MAP)."""
+    out = np.full((len(df), len(cols)), np.nan)
+    for j, c in enumerate(cols):
+        if c not in df.columns:
+            continue
+        s = df[c]
+        num = pd.to_numeric(s, errors="coerce")
+        yn = s.astype("string").str.strip().str.lower().map(YN_MAP)
+        v = yn.fillna(num).to_numpy(dtype=float, na_value=np.nan)
+        out[:, j] = np.where(np.isin(v, (0.0, 1.0)), v, np.nan)
+    return out
+
+
+def outcome_rates(df: pd.DataFrame, tests: dict = None) -> dict:
+    """
+    Pour chaque examen : {"cols": variables, "outcomes": [(valeurs Oui/Non...), ...],
+    "weights": fréquences lissées, "n": lignes de référence où l'examen est complet}.
+    """
+    out = {}
+    for label, cols in (tests or DIAGNOSTIC_TESTS).items():
+        cols = list(cols)
+        V = _yn_matrix(df, cols)
+        done = V[~np.isnan(V).any(axis=1)].astype(np.int64)
+
+        # Issue = combinaison Oui/Non, indexée comme product(WHATIF_VALUES) : Oui -> 0, Non -> 1
+        combos = list(product(WHATIF_VALUES, repeat=len(cols)))
+        codes = np.zeros(len(done), dtype=np.int64)
+        for j in range(len(cols)):
+            codes = codes * 2 + (1 - done[:, j])
+        counts = np.bincount(codes, minlength=len(combos)).astype(float)
+        weights = (counts + 1.0) / (counts.sum() + len(combos))
+        out[label] = {"cols": cols, "outcomes": combos, "weights": weights, "n": int(len(done))}
+    return out
+
+
+def load_outcome_rates(path=None, tests: dict = None) -> dict:
+    """outcome_rates sur le fichier de référence (défaut : jeu du dépôt)."""
+    path = Path(path or ROOT_DIR / REFERENCE_CASES_DEFAULT)
+    return outcome_rates(read_cases(path), tests)
+
+
+def uniform_outcome_rates(tests: dict = None) -> dict:
+    """Repli sans jeu de référence : issues équiprobables."""
+    out = {}
+    for label, cols in (tests or DIAGNOSTIC_TESTS).items():
+        combos = list(product(WHATIF_VALUES, repeat=len(cols)))
+        out[label] = {"cols": list(cols), "outcomes": combos,
+                      "weights": np.full(len(combos), 1.0 / len(combos)), "n": 0}
+    return out
+
+
+def _marginal(rate: dict, keep: list) -> tuple[list, np.ndarray]:
+    """Issues / poids restreints aux variables keep (examen déjà en partie renseigné)."""
+    idx = [rate["cols"].index(c) for c in keep]
+    acc: dict = {}
+    for combo, w in zip(rate["outcomes"], rate["weights"]):
+        k = tuple(combo[i] for i in idx)
+        acc[k] = acc.get(k, 0.0) + float(w)
+    return list(acc), np.array(list(acc.values()))
+
+
+# ============================================================
+# CLASSEMENT
+# ============================================================
+def recommend_next_tests(predictor, inputs: dict, rates: dict = None) -> dict:
+    """
+    Classe les examens en attente (au moins une variable non renseignée et connue
+    du modèle). Retourne probability / category du cas courant, ranking,
+    n_variants (lignes scorées) et elapsed_ms.
+    """
+    t0 = time.perf_counter()
+    rates = rates or uniform_outcome_rates()
+    feat = set(predictor.feature_cols)
+
+    pending, variants = [], []
+    for label, rate in rates.items():
+        keep = [c for c in rate["cols"] if c in feat and _is_missing(inputs.get(c))]
+        if not keep:
+            continue
+        outcomes, weights = _marginal(rate, keep)
+        pending.append((label, keep, weights / weights.sum(), len(variants), len(outcomes), rate))
+        variants.extend(dict(zip(keep, o)) for o in outcomes)
+
+    p = score_variants(predictor, inputs, variants)
+    p_base = float(p[0])
+    cat_base = cat_from_p_like_R(p_base)
+    k_base = _CATEGORY_RANK[cat_base]
+
+    P = p[1:]
+    K = np.array([_CATEGORY_RANK[cat_from_p_like_R(float(x))] for x in P], dtype=np.int64)
+
+    rows = []
+    for label, keep, w, start, n_out, rate in pending:
+        pk, kk = P[start:start + n_out], K[start:start + n_out]
+        q = np.bincount(kk, weights=w, minlength=len(CATEGORY_ORDER))
+        q = q[q > 0]
+        # P(Oui) de la 1re variable : repère lisible pour un examen simple
+        outs1, w1 = _marginal(rate, keep[:1])
+        p_pos = float(w1[[o[0] == "Oui" for o in outs1]].sum() / w1.sum())
+        rows.append({
+            "test": label,
+            "variables": keep,
+            "p_positive_ref": p_pos,
+            "n_ref": rate["n"],
+            "expected_probability": float(w @ pk),
+            "p_change": float(w @ (kk != k_base)),
+            "expected_shift": float(w @ np.abs(kk - k_base)),
+            "info_gain_bits": float(-(q * np.log2(q)).sum()) + 0.0,
+            "expected_abs_delta": float(w @ np.abs(pk - p_base)),
+            "lowest_category": CATEGORY_ORDER[int(kk.min())],
+            "highest_category": CATEGORY_ORDER[int(kk.max())],
+        })
+
+    ranking = pd.DataFrame(rows, columns=[
+        "test", "variables", "p_positive_ref", "n_ref", "expected_probability", "p_change",
+        "expected_shift", "info_gain_bits", "expected_abs_delta", "lowest_category", "highest_category",
+    ])
+    ranking = ranking.sort_values(
+        ["expected_shift", "info_gain_bits", "expected_abs_delta"], ascending=False, kind="stable"
+    ).reset_index(drop=True)
+
+    return {
+        "probability": p_base,
+        "category": cat_base,
+        "ranking": ranking,
+        "n_variants": len(variants),
+        "elapsed_ms": (time.perf_counter() - t0) * 1000.0,
+    }
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+Registre multi-modèles LYRAE + scoring "shadow" (et A/B) sur le trafic réel.
+
+Un registre = un dossier de paires <version>.cbm + <version>_meta.json (même
+convention que equine_lyme_catboost.cbm / equine_lyme_catboost_meta.json) ;
+l'identifiant de version est le nom du .cbm sans extension. Un registry.json
+optionnel fixe le modèle principal, les modèles shadow et un partage A/B :
+
+    {"primary": "lyme_2026_03", "shadows": ["lyme_2026_06"], "ab": {"lyme_2026_06": 0.1}}
+
+Sans registry.json : principal = modèle par défaut du dépôt s'il est présent,
+sinon le plus récent ; toutes les autres versions sont shadow.
+
+    registry = ModelRegistry("models")
+    scorer = ShadowScorer(registry, ShadowLog(".lyrae_cache/shadow.sqlite"))
+    res = scorer.score(inputs)            # principal (synchrone) + shadows en arrière-plan
+    scorer.shadow(inputs, "v1", p)        # shadows seuls, le principal a déjà été scoré
+
+    python -m lyrae.registry list models
+    python -m lyrae.registry report .lyrae_cache/shadow.sqlite
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from lyrae.core import MODEL_DEFAULT, cat_from_p_like_R
+from lyrae.predictor import file_fingerprint, get_predictor
+
+REGISTRY_MANIFEST = "registry.json"
+
+
+class ModelVersion:
+    """Une paire .cbm + meta du registre."""
+
+    def __init__(self, version: str, model_path: Path, meta_path: Path):
+        self.version = version
+        self.model_path = Path(model_path)
+        self.meta_path = Path(meta_path)
+        fp = file_fingerprint(self.model_path)
+        self.mtime = fp[0] / 1e9
+        self.checksum = fp[2]
+
+    def __repr__(self):
+        return f"ModelVersion({self.version!r}, sha256={self.checksum[:12]})"
+
+
+def discover_models(root) -> dict:
+    """{version: ModelVersion} pour chaque <version>.cbm accompagné de <version>_meta.json."""
+    out = {}
+    for cbm in sorted(Path(root).glob("*.cbm")):
+        meta = cbm.with_name(f"{cbm.stem}_meta.json")
+        if meta.exists():
+            out[cbm.stem] = ModelVersion(cbm.stem, cbm, meta)
+    return out
+
+
+# ============================================================
+# REGISTRE
+# ============================================================
+class ModelRegistry:
+    """
+    Versions d'un dossier + rôles (principal / shadows / A/B). Le dossier est relu
+    quand son mtime change (ajout ou retrait d'un modèle) ; les Predictor viennent
+    de get_predictor, donc profitent du rechargement à chaud.
+    """
+
+    def __init__(self, root, engine: str = "auto"):
+        self.root = Path(root)
+        self.engine = engine
+        self.versions: dict = {}
+        self.primary = None
+        self.shadows: list = []
+        self.ab: dict = {}
+        self._scanned = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _dir_state(self):
+        try:
+            st = self.root.stat()
+        except OSError:
+            return None
+        manifest = self.root / REGISTRY_MANIFEST
+        return (st.st_mtime_ns, manifest.stat().st_mtime_ns if manifest.exists() else None)
+
+    def refresh(self, force: bool = False) -> None:
+        state = self._dir_state()
+        with self._lock:
+            if not force and state == self._scanned:
+                return
+            versions = discover_models(self.root) if state is not None else {}
+            manifest = {}
+            path = self.root / REGISTRY_MANIFEST
+            if path.exists():
+                with path.open("r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+
+            primary = manifest.get("primary")
+            if primary not in versions:
+                default = Path(MODEL_DEFAULT).stem
+                if default in versions:
+                    primary = default
+                else:
+                    primary = max(versions, key=lambda v: versions[v].mtime) if versions else None
+            shadows = manifest.get("shadows")
+            if shadows is None:
+                shadows = [v for v in versions if v != primary]
+
+            self.versions = versions
+            self.primary = primary
+            self.shadows = [v for v in shadows if v in versions and v != primary]
+            self.ab = {v: float(w) for v, w in (manifest.get("ab") or {}).items() if v in versions}
+            self._scanned = state
+
+    def predictor(self, version: str):
+        mv = self.versions[version]
+        return get_predictor(str(mv.model_path), str(mv.meta_path), engine=self.engine)
+
+    def assign(self, case_id: str) -> str:
+        """
+        Version affichée pour case_id : principal, ou une version A/B selon son
+        poids. Déterministe (hash du case_id) : un même cas garde la même version.
+        """
+        u = int.from_bytes(hashlib.blake2b(case_id.encode("utf-8"), digest_size=8).digest(), "big") / 2.0 ** 64
+        acc = 0.0
+        for version, w in self.ab.items():
+            acc += w
+            if u < acc:
+                return version
+        return self.primary
+
+
+# ============================================================
+# JOURNAL LOCAL (SQLite)
+# ============================================================
+class ShadowLog:
+    """
+    Une ligne par (cas, modèle) : probabilité, catégorie, écart au modèle affiché
+    et désaccord de catégorie. Même schéma d'accès que GeocodeCache (lyrae.geo).
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS shadow_scores (
+                    id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts                  REAL NOT NULL,
+                    case_id             TEXT NOT NULL,
+                    version             TEXT NOT NULL,
+                    model_sha256        TEXT,
+                    role                TEXT NOT NULL,
+                    probability         REAL,
+                    category            TEXT,
+                    primary_version     TEXT,
+                    primary_probability REAL,
+                    primary_category    TEXT,
+                    disagree            INTEGER,
+                    latency_ms          REAL,
+                    error               TEXT,
+                    inputs              TEXT
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS shadow_scores_version ON shadow_scores(version)")
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=10)
+        try:
+            with con:  # commit / rollback
+                yield con
+        finally:
+            con.close()
+
+    def log_many(self, rows: list[dict]) -> None:
+        cols = ("ts", "case_id", "version", "model_sha256", "role", "probability", "category",
+                "primary_version", "primary_probability", "primary_category", "disagree",
+                "latency_ms", "error", "inputs")
+        with self._lock, self._connect() as con:
+            con.executemany(
+                f"INSERT INTO shadow_scores({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                [tuple(r.get(c) for c in cols) for r in rows],
+            )
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock, self._connect() as con:
+            return pd.read_sql_query("SELECT * FROM shadow_scores ORDER BY id", con)
+
+    def summary(self) -> pd.DataFrame:
+        """Par version shadow : n cas, écart moyen / max de probabilité, taux de désaccord."""
+        with self._lock, self._connect() as con:
+            return pd.read_sql_query(
+                """
+                SELECT version,
+                       primary_version,
+                       COUNT(*)                                   AS n,
+                       AVG(ABS(probability - primary_probability)) AS mean_abs_delta,
+                       MAX(ABS(probability - primary_probability)) AS max_abs_delta,
+                       AVG(disagree)                              AS disagreement_rate,
+                       AVG(latency_ms)                            AS mean_latency_ms,
+                       SUM(error IS NOT NULL)                     AS errors
+                FROM shadow_scores
+                WHERE role = 'shadow'
+                GROUP BY version, primary_version
+                ORDER BY version
+                """,
+                con,
+            )
+
+
+def _jsonable_inputs(inputs: dict) -> str:
+    """Entrées renseignées seulement (NA exclus), en JSON."""
+    out = {}
+    for k, v in inputs.items():
+        try:
+            if pd.isna(v):
+                continue
+        except (TypeError, ValueError):
+            pass
+        out[k] = v.item() if hasattr(v, "item") else v
+    return json.dumps(out, ensure_ascii=False, default=str)
+
+
+# ============================================================
+# SCORING PRINCIPAL + SHADOW
+# ============================================================
+class ShadowScorer:
+    """
+    Les modèles shadow tournent dans un pool de threads : le résultat affiché ne
+    les attend jamais. Chaque cas produit une ligne par modèle dans le ShadowLog.
+    """
+
+    def __init__(self, registry: ModelRegistry, log: ShadowLog, max_workers: int = 2):
+        self.registry = registry
+        self.log = log
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lyrae-shadow")
+
+    def score(self, inputs: dict, case_id: str = None) -> dict:
+        """Scoring synchrone par la version assignée au cas, puis shadows en arrière-plan."""
+        self.registry.refresh()
+        case_id = case_id or uuid.uuid4().hex
+        version = self.registry.assign(case_id)
+        if version is None:
+            raise FileNotFoundError(f"Aucun modèle dans le registre {self.registry.root}")
+        predictor = self.registry.predictor(version)
+        res = predictor.predict_one(inputs)
+        self.shadow(inputs, version, res["probability"], case_id, primary_sha256=predictor.model_checksum)
+        return {**res, "version": version, "case_id": case_id}
+
+    def shadow(self, inputs: dict, primary_version: str, primary_probability: float,
+               case_id: str = None, primary_sha256: str = None) -> Future:
+        """Planifie le scoring des autres versions du registre ; retourne tout de suite."""
+        inputs = dict(inputs)  # l'appelant peut réutiliser / modifier son dict
+        case_id = case_id or uuid.uuid4().hex
+        return self._pool.submit(self._run, inputs, primary_version, float(primary_probability),
+                                 case_id, primary_sha256, time.time())
+
+    def _run(self, inputs, primary_version, primary_p, case_id, primary_sha256, ts) -> list[dict]:
+        self.registry.refresh()
+        primary_cat = cat_from_p_like_R(primary_p)
+        payload = _jsonable_inputs(inputs)
+        rows = [{
+            "ts": ts, "case_id": case_id, "version": primary_version, "model_sha256": primary_sha256,
+            "role": "primary", "probability": primary_p, "category": primary_cat,
+            "primary_version": primary_version, "primary_probability": primary_p,
+            "primary_category": primary_cat, "disagree": 0, "inputs": payload,
+        }]
+
+        reg = self.registry
+        versions = reg.versions  # instantané : refresh() remplace le dict, ne le modifie pas
+        for version, mv in versions.items():
+            # Tout modèle du registre qui a un rôle, sauf celui qui a produit le résultat affiché
+            if version != reg.primary and version not in reg.shadows and version not in reg.ab:
+                continue
+            if version == primary_version or mv.checksum == primary_sha256:
+                continue  # le modèle affiché (même sous un autre nom) n'est pas rejoué
+            row = {
+                "ts": ts, "case_id": case_id, "version": version, "model_sha256": mv.checksum,
+                "role": "shadow", "primary_version": primary_version,
+                "primary_probability": primary_p, "primary_category": primary_cat,
+            }
+            t0 = time.perf_counter()
+            try:
+                res = reg.predictor(version).predict_one(inputs)
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+            else:
+                row["probability"] = res["probability"]
+                row["category"] = res["category"]
+                row["disagree"] = int(res["category"] != primary_cat)
+            row["latency_ms"] = (time.perf_counter() - t0) * 1000.0
+            rows.append(row)
+
+        self.log.log_many(rows)
+        return rows
+
+    def close(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m lyrae.registry", description="Registre de modèles LYRAE.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_list = sub.add_parser("list", help="Versions d'un dossier de modèles et leurs rôles")
+    p_list.add_argument("root")
+    p_rep = sub.add_parser("report", help="Comparaison des versions à partir du journal shadow")
+    p_rep.add_argument("log", help="Fichier SQLite du ShadowLog")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "list":
+        reg = ModelRegistry(args.root)
+        if not reg.versions:
+            print(f"Aucune paire .cbm + _meta.json dans {args.root}", file=sys.stderr)
+            return 1
+        for v, mv in reg.versions.items():
+            role = "primary" if v == reg.primary else ("shadow" if v in reg.shadows else "-")
+            ab = f"  A/B {reg.ab[v]:.0%}" if v in reg.ab else ""
+            print(f"{v:40s} {role:8s} sha256={mv.checksum[:12]}{ab}")
+        return 0
+
+    if not Path(args.log).exists():
+        print(f"Journal introuvable: {args.log}", file=sys.stderr)
+        return 2
+    summary = ShadowLog(args.log).summary()
+    print(summary.to_string(index=False) if len(summary) else "Aucun scoring shadow journalisé.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
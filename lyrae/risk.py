@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Risque géographique LYRAE (raster 3 classes, sans Streamlit).
+
+RiskRaster ouvre le GeoTIFF une seule fois, garde le transformer
+EPSG:4326 -> CRS du raster et la bande en mémoire : une recherche
+(lat, lon) -> classe devient une simple indexation de tableau.
+
+Pour un gros raster (ou une URL), la bande n'est pas chargée : on ne lit
+que les tuiles utiles (cache LRU), idéalement sur un Cloud-Optimized GeoTIFF
+servi en HTTP range requests (/vsicurl/). Conversion :
+    python -m lyrae.risk cog mean_R1_RF_prob_rep01_05_CATEG_3classes.tif risk_cog.tif
+
+Grille compacte NumPy (lyrae/riskgrid.py, sans GDAL à l'exécution) :
+    python -m lyrae.risk compact mean_R1_RF_prob_rep01_05_CATEG_3classes.tif risk_grid.npy [--packed]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import requests
+
+import rasterio
+import rasterio.shutil
+from pyproj import Transformer
+from rasterio.enums import Resampling
+from rasterio.warp import calculate_default_transform, reproject
+from rasterio.windows import Window
+
+from lyrae.geo import DEFAULT_CONTACT_EMAIL
+from lyrae.riskgrid import (  # noqa: F401 (ré-export)
+    GRID_FORMAT_VERSION,
+    RISK_FEATURE_COL,
+    RISK_LABEL_HIGH,
+    RISK_LABEL_LOW,
+    RISK_LABEL_MID,
+    _best_match_risk_label,
+    add_risk_class,
+    classes_from_values,
+    pack_2bit,
+    raw_label_from_value,
+    risk_label,
+    sidecar_path,
+)
+
+RISK_RASTER_NAME = "mean_R1_RF_prob_rep01_05_CATEG_3classes.tif"
+
+# Au-delà, on ne charge pas toute la bande : lecture fenêtrée via le handle gardé ouvert
+MAX_IN_MEMORY_BYTES = 256 * 1024 * 1024
+
+# Mode tuiles : nombre de tuiles gardées en mémoire (256x256 uint8 -> 64 Ko / tuile)
+MAX_CACHED_TILES = 256
+
+# GDAL /vsicurl/ : pas de listing de répertoire, uniquement des range requests sur le .tif
+_VSICURL_ENV = {
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif,.tiff",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+}
+
+
+def download_risk_raster(url: str, dest_dir: Path, contact_email: str = DEFAULT_CONTACT_EMAIL) -> str:
+    local_path = str(Path(dest_dir) / RISK_RASTER_NAME)
+    p = Path(local_path)
+    if p.exists() and p.stat().st_size > 0:
+        return local_path
+
+    headers = {"User-Agent": f"LYRAE-Streamlit/1.0 ({contact_email})"}
+    r = requests.get(url, headers=headers, timeout=90)
+    r.raise_for_status()
+    p.write_bytes(r.content)
+    return local_path
+
+
+def _open_path(tif_path: str) -> str:
+    """Chemin local tel quel ; URL http(s) -> /vsicurl/ (lecture par range requests)."""
+    if tif_path.startswith(("http://", "https://")):
+        for k, v in _VSICURL_ENV.items():
+            os.environ.setdefault(k, v)
+        return "/vsicurl/" + tif_path
+    return tif_path
+
+
+def convert_to_cog(src_path, dst_path, blocksize: int = 256, compress: str = "DEFLATE") -> str:
+    """
+    Réécrit le raster en Cloud-Optimized GeoTIFF : tuiles internes blocksize x blocksize
+    + overviews (rééchantillonnage NEAREST : les classes 1/2/3 ne doivent pas être moyennées).
+    """
+    dst_path = str(dst_path)
+    with rasterio.Env() as env:
+        has_cog = "COG" in env.drivers()
+
+    if has_cog:
+        rasterio.shutil.copy(
+            str(src_path), dst_path, driver="COG",
+            BLOCKSIZE=blocksize, COMPRESS=compress,
+            OVERVIEWS="AUTO", OVERVIEW_RESAMPLING="NEAREST",
+        )
+        return dst_path
+
+    # GDAL < 3.1 : GTiff tuilé + overviews internes
+    with rasterio.open(str(src_path)) as src:
+        profile = src.profile.copy()
+        profile.update(driver="GTiff", tiled=True, blockxsize=blocksize, blockysize=blocksize, compress=compress)
+        with rasterio.open(dst_path, "w", **profile) as dst:
+            for _, window in dst.block_windows(1):
+                dst.write(src.read(1, window=window), 1, window=window)
+            factors = [f for f in (2, 4, 8, 16, 32) if min(src.width, src.height) // f >= blocksize]
+            if factors:
+                dst.build_overviews(factors, Resampling.nearest)
+    return dst_path
+
+
+class RiskRaster:
+    """Raster de risque ouvert une fois ; à garder en cache (st.cache_resource)."""
+
+    def __init__(
+        self,
+        tif_path,
+        max_in_memory_bytes: int = MAX_IN_MEMORY_BYTES,
+        max_cached_tiles: int = MAX_CACHED_TILES,
+    ):
+        self.path = str(tif_path)
+        self._lock = threading.Lock()
+
+        self._ds = rasterio.open(_open_path(self.path))
+        self.crs = self._ds.crs
+        self.width = self._ds.width
+        self.height = self._ds.height
+        self.bounds = self._ds.bounds
+
+        # Inverse affine (x, y) -> (col, row), comme rasterio.transform.rowcol (floor)
+        inv = ~self._ds.transform
+        self._inv = (inv.a, inv.b, inv.c, inv.d, inv.e, inv.f)
+
+        self._transformer = (
+            Transformer.from_crs("EPSG:4326", self.crs, always_xy=True) if self.crs is not None else None
+        )
+
+        band_bytes = self.width * self.height * np.dtype(self._ds.dtypes[0]).itemsize
+        self.band = self._ds.read(1) if band_bytes <= max_in_memory_bytes else None
+
+        # Mode tuiles (band is None) : blocs internes du GeoTIFF, cache LRU
+        self.block_h, self.block_w = self._ds.block_shapes[0]
+        self.max_cached_tiles = int(max_cached_tiles)
+        self._tiles = OrderedDict()
+        self.tiles_read = 0
+
+    def close(self) -> None:
+        self._ds.close()
+
+    def _pixel(self, lon_wgs84: float, lat_wgs84: float):
+        """Retourne (row, col) ou None si hors emprise."""
+        x, y = self._transformer.transform(lon_wgs84, lat_wgs84)
+        b = self.bounds
+        if (x < b.left) or (x > b.right) or (y < b.bottom) or (y > b.top):
+            return None
+
+        a, bb, c, d, e, f = self._inv
+        col = int(np.floor(a * x + bb * y + c))
+        row = int(np.floor(d * x + e * y + f))
+        if row < 0 or col < 0 or row >= self.height or col >= self.width:
+            return None
+        return row, col
+
+    def _tile(self, ti: int, tj: int) -> np.ndarray:
+        """Bloc (ti, tj) du raster ; lu une seule fois tant qu'il reste dans le cache LRU."""
+        key = (ti, tj)
+        with self._lock:
+            t = self._tiles.get(key)
+            if t is not None:
+                self._tiles.move_to_end(key)
+                return t
+
+            r0, c0 = ti * self.block_h, tj * self.block_w
+            window = Window(c0, r0, min(self.block_w, self.width - c0), min(self.block_h, self.height - r0))
+            t = self._ds.read(1, window=window)
+            self.tiles_read += 1
+
+            self._tiles[key] = t
+            while len(self._tiles) > self.max_cached_tiles:
+                self._tiles.popitem(last=False)
+            return t
+
+    def value_at(self, lat_wgs84: float, lon_wgs84: float):
+        """Valeur brute du pixel, ou None hors emprise."""
+        rc = self._pixel(lon_wgs84, lat_wgs84)
+        if rc is None:
+            return None
+        row, col = rc
+        if self.band is not None:
+            return self.band[row, col]
+        t = self._tile(row // self.block_h, col // self.block_w)
+        return t[row % self.block_h, col % self.block_w]
+
+    def values_at(self, lats, lons) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Version vectorisée de value_at : un seul Transformer.transform, rowcol
+        vectorisé (inverse affine + floor), puis indexation NumPy.
+        Retourne (valeurs int, masque "dans l'emprise"). Coordonnées NaN -> hors emprise.
+        """
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        if lats.shape != lons.shape:
+            raise ValueError("lats et lons doivent avoir la même longueur")
+
+        x, y = self._transformer.transform(lons, lats)
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        b = self.bounds
+        inside = np.isfinite(x) & np.isfinite(y)
+        inside &= (x >= b.left) & (x <= b.right) & (y >= b.bottom) & (y <= b.top)
+
+        a, bb, c, d, e, f = self._inv
+        with np.errstate(invalid="ignore"):
+            cols = np.floor(a * x + bb * y + c)
+            rows = np.floor(d * x + e * y + f)
+        inside &= (rows >= 0) & (cols >= 0) & (rows < self.height) & (cols < self.width)
+
+        r = np.where(inside, rows, 0).astype(np.int64)
+        cc = np.where(inside, cols, 0).astype(np.int64)
+
+        vals = np.zeros(lats.shape, dtype=np.int64)
+        if self.band is not None:
+            vals[inside] = self.band[r[inside], cc[inside]]
+        else:
+            # Regroupement par tuile : chaque tuile utile est lue une seule fois
+            idx = np.flatnonzero(inside)
+            ti, tj = r[idx] // self.block_h, cc[idx] // self.block_w
+            tiles, inverse = np.unique(np.stack([ti, tj], axis=1), axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            for k, (a_i, a_j) in enumerate(tiles):
+                sel = idx[inverse == k]
+                t = self._tile(int(a_i), int(a_j))
+                vals[sel] = t[r[sel] % self.block_h, cc[sel] % self.block_w]
+        return vals, inside
+
+    def risk_classes(self, lats, lons, factor_levels: dict, levels_key: str = "Classe_de_risque") -> np.ndarray:
+        """
+        Classe de risque pour N points (tableau object). Hors emprise -> faible ou méconnu ;
+        coordonnée manquante (NaN) -> None, comme risk_class.
+        """
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        if self._transformer is None:
+            return np.full(lats.shape, None, dtype=object)
+
+        vals, inside = self.values_at(lats, lons)
+        known = np.isfinite(lats) & np.isfinite(lons)
+        return classes_from_values(vals, inside, known, factor_levels, levels_key=levels_key)
+
+    def risk_class(self, lat_wgs84: float, lon_wgs84: float, factor_levels: dict) -> str | None:
+        if self._transformer is None:
+            return None
+        if not (np.isfinite(lat_wgs84) and np.isfinite(lon_wgs84)):
+            return None
+        v = self.value_at(lat_wgs84, lon_wgs84)
+        raw_label = RISK_LABEL_LOW if v is None else raw_label_from_value(v)
+        return risk_label(raw_label, factor_levels)
+
+
+def export_compact_grid(
+    src_path,
+    npy_path,
+    packed: bool = False,
+    keep_crs: bool = True,
+    oversample: int = 2,
+) -> str:
+    """
+    Exporte la bande classée en grille .npy (uint8, ou 2 bits/pixel) + sidecar JSON.
+
+    Par défaut la grille native est gardée pixel pour pixel, avec son affine et son CRS :
+    la recherche donne la même classe que RiskRaster (pyproj requis si le CRS n'est pas
+    EPSG:4326). keep_crs=False reprojette en EPSG:4326 (plus proche voisin) pour une
+    recherche sans pyproj ; oversample affine alors la grille, mais les points proches
+    d'une frontière de classe peuvent changer de classe.
+    """
+    npy_path = Path(npy_path)
+    with rasterio.open(str(src_path)) as src:
+        band = src.read(1)
+        nodata = src.nodata
+
+        if keep_crs or src.crs is None or src.crs.to_string() == "EPSG:4326":
+            grid, transform, crs = band, src.transform, (src.crs.to_string() if src.crs else None)
+            width, height = src.width, src.height
+        else:
+            transform, width, height = calculate_default_transform(
+                src.crs, "EPSG:4326", src.width, src.height, *src.bounds
+            )
+            if oversample > 1:
+                res = abs(transform.a) / oversample
+                transform, width, height = calculate_default_transform(
+                    src.crs, "EPSG:4326", src.width, src.height, *src.bounds, resolution=(res, res)
+                )
+            grid = np.zeros((height, width), dtype=band.dtype)
+            reproject(
+                source=band, destination=grid,
+                src_transform=src.transform, src_crs=src.crs, src_nodata=nodata,
+                dst_transform=transform, dst_crs="EPSG:4326", dst_nodata=0,
+                resampling=Resampling.nearest,
+            )
+            crs = "EPSG:4326"
+
+    # Classes utiles : 2 / 3 ; tout le reste (0, 1, nodata) = faible ou méconnu
+    grid = np.where((grid == 2) | (grid == 3), grid, 1).astype(np.uint8)
+    data = pack_2bit(grid) if packed else grid
+    np.save(npy_path, data)
+
+    left, top = transform.c, transform.f
+    right, bottom = transform * (width, height)
+    info = {
+        "format_version": GRID_FORMAT_VERSION,
+        "source": Path(str(src_path)).name,
+        "crs": crs,
+        "transform": [transform.a, transform.b, transform.c, transform.d, transform.e, transform.f],
+        "bounds": [min(left, right), min(bottom, top), max(left, right), max(bottom, top)],
+        "width": int(width),
+        "height": int(height),
+        "packed": bool(packed),
+        "values": {"1": RISK_LABEL_LOW, "2": RISK_LABEL_MID, "3": RISK_LABEL_HIGH},
+    }
+    with sidecar_path(npy_path).open("w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    return str(npy_path)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m lyrae.risk", description="Outils raster de risque LYRAE.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_cog = sub.add_parser("cog", help="Convertit le raster en Cloud-Optimized GeoTIFF (tuiles + overviews)")
+    p_cog.add_argument("src")
+    p_cog.add_argument("dst")
+    p_cog.add_argument("--blocksize", type=int, default=256)
+
+    p_cpt = sub.add_parser("compact", help="Exporte une grille .npy + sidecar JSON (recherche NumPy seule)")
+    p_cpt.add_argument("src")
+    p_cpt.add_argument("dst", help="Fichier .npy (le sidecar .json est écrit à côté)")
+    p_cpt.add_argument("--packed", action="store_true", help="2 bits par pixel au lieu d'un octet")
+    p_cpt.add_argument("--reproject", action="store_true",
+                       help="Reprojeter en EPSG:4326 (recherche sans pyproj, classes approchées aux frontières)")
+    p_cpt.add_argument("--oversample", type=int, default=2,
+                       help="Avec --reproject : finesse de la grille EPSG:4326 par rapport au raster source (défaut 2)")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "cog":
+        out = convert_to_cog(args.src, args.dst, blocksize=args.blocksize)
+        with rasterio.open(out) as ds:
+            print(f"{out} : {ds.width}x{ds.height}, tuiles {ds.block_shapes[0]}, overviews {ds.overviews(1)}")
+    elif args.cmd == "compact":
+        out = export_compact_grid(
+            args.src, args.dst, packed=args.packed, keep_crs=not args.reproject, oversample=args.oversample
+        )
+        size = Path(out).stat().st_size
+        print(f"{out} ({size / 1e6:.1f} Mo) + {sidecar_path(out).name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
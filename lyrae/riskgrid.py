@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Grille de risque compacte LYRAE (NumPy seul, ni GDAL, ni rasterio).
+
+Construite une fois depuis le GeoTIFF (python -m lyrae.risk compact ...) :
+    risk_grid.npy  : classes en uint8 (ou 2 bits/pixel si --packed)
+    risk_grid.json : transform affine, CRS, dimensions, packing
+La grille est ouverte en memory-map : rien n'est lu tant qu'on ne cherche pas un point.
+La grille garde le CRS du raster ; en EPSG:4326 (--reproject), la recherche n'a même
+pas besoin de pyproj.
+
+Contient aussi les libellés de classe et add_risk_class, partagés avec lyrae/risk.py.
+"""
+
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RISK_LABEL_LOW = "faible ou méconnu"
+RISK_LABEL_MID = "intermédiaire"
+RISK_LABEL_HIGH = "fort"
+
+# Nom de la colonne dans feature_cols / le jeu de référence
+RISK_FEATURE_COL = "Classe de risque"
+
+GRID_FORMAT_VERSION = 1
+
+
+def _best_match_risk_label(target: str, levels: list[str]) -> str:
+    if not levels:
+        return target
+    t = target.strip().lower()
+
+    for lv in levels:
+        if str(lv).strip().lower() == t:
+            return str(lv)
+
+    def pick(keyword):
+        for lv in levels:
+            if keyword in str(lv).strip().lower():
+                return str(lv)
+        return None
+
+    if "faible" in t or "meconnu" in t or "méconnu" in t:
+        return pick("faible") or pick("meconnu") or pick("méconnu") or target
+    if "inter" in t:
+        return pick("inter") or target
+    if "fort" in t:
+        return pick("fort") or target
+    return target
+
+
+def raw_label_from_value(v) -> str:
+    """Valeur raster 1/2/3 -> libellé brut (hors emprise / nodata -> faible ou méconnu)."""
+    try:
+        vv_int = int(v)
+    except Exception:
+        vv_int = 1
+    if vv_int == 2:
+        return RISK_LABEL_MID
+    if vv_int == 3:
+        return RISK_LABEL_HIGH
+    return RISK_LABEL_LOW
+
+
+def risk_label(raw_label: str, factor_levels: dict, levels_key: str = "Classe_de_risque") -> str:
+    lv = factor_levels.get(levels_key, [])
+    return _best_match_risk_label(raw_label, [str(x) for x in lv]) if lv else raw_label
+
+
+def classes_from_values(
+    vals: np.ndarray,
+    inside: np.ndarray,
+    known: np.ndarray,
+    factor_levels: dict,
+    levels_key: str = "Classe_de_risque",
+) -> np.ndarray:
+    """
+    Valeurs raster -> classes (tableau object). Hors emprise -> faible ou méconnu ;
+    coordonnée inconnue (known=False) -> None.
+    """
+    raw = np.select(
+        [inside & (vals == 2), inside & (vals == 3)],
+        [RISK_LABEL_MID, RISK_LABEL_HIGH],
+        default=RISK_LABEL_LOW,
+    ).astype(object)
+
+    # 1/2/3 -> libellé du modèle : on résout les 3 libellés une seule fois
+    lv = [str(x) for x in factor_levels.get(levels_key, [])]
+    if lv:
+        labels = {t: _best_match_risk_label(t, lv) for t in (RISK_LABEL_LOW, RISK_LABEL_MID, RISK_LABEL_HIGH)}
+        raw = np.vectorize(labels.get, otypes=[object])(raw)
+
+    out = np.full(vals.shape, None, dtype=object)
+    out[known] = raw[known]
+    return out
+
+
+def pack_2bit(band: np.ndarray) -> np.ndarray:
+    """
+    4 pixels par octet (2 bits chacun), le long des lignes. Seules les valeurs 2 et 3
+    changent la classe : tout le reste (0, 1, nodata) est ramené à 1.
+    """
+    v = np.where((band == 2) | (band == 3), band, 1).astype(np.uint8)
+    h, w = v.shape
+    pad = (-w) % 4
+    if pad:
+        v = np.pad(v, ((0, 0), (0, pad)), constant_values=1)
+    v = v.reshape(h, -1, 4)
+    return (v[..., 0] | (v[..., 1] << 2) | (v[..., 2] << 4) | (v[..., 3] << 6)).astype(np.uint8)
+
+
+def sidecar_path(npy_path) -> Path:
+    return Path(npy_path).with_suffix(".json")
+
+
+class CompactRiskGrid:
+    """Même interface de recherche que lyrae.risk.RiskRaster, sur une grille .npy memory-mappée."""
+
+    def __init__(self, npy_path):
+        self.path = str(npy_path)
+        with sidecar_path(npy_path).open("r", encoding="utf-8") as f:
+            self.info = json.load(f)
+
+        self.grid = np.load(self.path, mmap_mode="r")
+        self.width = int(self.info["width"])
+        self.height = int(self.info["height"])
+        self.packed = bool(self.info.get("packed", False))
+        self.crs = self.info.get("crs")
+
+        a, b, c, d, e, f = self.info["transform"]
+        # Inverse affine (x, y) -> (col, row), comme rasterio.transform.rowcol (floor)
+        det = a * e - b * d
+        self._inv = (e / det, -b / det, (b * f - e * c) / det, -d / det, a / det, (d * c - a * f) / det)
+        self.bounds = tuple(self.info["bounds"])  # left, bottom, right, top
+
+        self._transformer = None
+        self._lock = threading.Lock()
+
+    def _to_grid_crs(self, lons, lats):
+        if self.crs in ("EPSG:4326", "OGC:CRS84"):
+            return lons, lats
+        # Grille gardée dans le CRS natif : pyproj seulement dans ce cas
+        with self._lock:
+            if self._transformer is None:
+                from pyproj import Transformer
+                self._transformer = Transformer.from_crs("EPSG:4326", self.crs, always_xy=True)
+        return self._transformer.transform(lons, lats)
+
+    def values_at(self, lats, lons) -> tuple[np.ndarray, np.ndarray]:
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        if lats.shape != lons.shape:
+            raise ValueError("lats et lons doivent avoir la même longueur")
+
+        x, y = self._to_grid_crs(lons, lats)
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        left, bottom, right, top = self.bounds
+        inside = np.isfinite(x) & np.isfinite(y)
+        inside &= (x >= left) & (x <= right) & (y >= bottom) & (y <= top)
+
+        a, bb, c, d, e, f = self._inv
+        with np.errstate(invalid="ignore"):
+            cols = np.floor(a * x + bb * y + c)
+            rows = np.floor(d * x + e * y + f)
+        inside &= (rows >= 0) & (cols >= 0) & (rows < self.height) & (cols < self.width)
+
+        r = np.where(inside, rows, 0).astype(np.int64)
+        cc = np.where(inside, cols, 0).astype(np.int64)
+
+        vals = np.zeros(lats.shape, dtype=np.int64)
+        ri, ci = r[inside], cc[inside]
+        if self.packed:
+            byte = self.grid[ri, ci >> 2]
+            vals[inside] = (byte >> ((ci & 3) * 2).astype(np.uint8)) & 3
+        else:
+            vals[inside] = self.grid[ri, ci]
+        return vals, inside
+
+    def value_at(self, lat_wgs84: float, lon_wgs84: float):
+        vals, inside = self.values_at([lat_wgs84], [lon_wgs84])
+        return vals[0] if inside[0] else None
+
+    def risk_classes(self, lats, lons, factor_levels: dict, levels_key: str = "Classe_de_risque") -> np.ndarray:
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        vals, inside = self.values_at(lats, lons)
+        known = np.isfinite(lats) & np.isfinite(lons)
+        return classes_from_values(vals, inside, known, factor_levels, levels_key=levels_key)
+
+    def risk_class(self, lat_wgs84: float, lon_wgs84: float, factor_levels: dict) -> str | None:
+        if not (np.isfinite(lat_wgs84) and np.isfinite(lon_wgs84)):
+            return None
+        v = self.value_at(lat_wgs84, lon_wgs84)
+        raw_label = RISK_LABEL_LOW if v is None else raw_label_from_value(v)
+        return risk_label(raw_label, factor_levels)
+
+
+def add_risk_class(
+    df: pd.DataFrame,
+    raster,
+    factor_levels: dict,
+    lat_col: str = "lat",
+    lon_col: str = "lon",
+    out_col: str = RISK_FEATURE_COL,
+    overwrite: bool = False,
+) -> pd.DataFrame:
+    """
+    Enrichit un export (écuries, registre...) avec la classe de risque du raster,
+    avant scoring en lot. Par défaut, ne remplit que les cases vides de out_col.
+    raster : RiskRaster (lyrae.risk) ou CompactRiskGrid, tout objet exposant risk_classes.
+    """
+    lats = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=float)
+    lons = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=float)
+    # Niveaux de la colonne cible si le meta les connaît, sinon clé historique de l'app
+    levels_key = out_col if out_col in factor_levels else "Classe_de_risque"
+    classes = raster.risk_classes(lats, lons, factor_levels, levels_key=levels_key)
+
+    out = df.copy()
+    new = pd.Series(classes, index=out.index, dtype=object)
+    if overwrite or out_col not in out.columns:
+        out[out_col] = new
+    else:
+        out[out_col] = out[out_col].astype(object).where(out[out_col].notna(), new)
+    return out
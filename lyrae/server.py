@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Service HTTP/JSON local de scoring LYRAE, avec micro-batching.
+
+Les requêtes concurrentes arrivées à quelques millisecondes d'intervalle sont
+regroupées en un seul Pool / predict_proba (max_batch_size cas au plus, attente
+max_wait_ms au plus après le premier cas du paquet).
+
+Usage :
+    python -m lyrae.server --port 8787 --max-batch 64 --max-wait-ms 5
+
+    POST /predict  {"case": {"Type_de_cheval": "Sport", "ELISA_pos": "Oui", ...}}
+                -> {"probability": 0.83, "category": "Lyme sûr"}
+    POST /predict  {"cases": [{...}, {...}]}
+                -> {"results": [{"probability": ..., "category": ...}, ...]}
+    GET  /health   -> état du service (modèle servi, sha256) + compteurs de micro-batching
+
+Le .cbm / meta est surveillé (--watch-interval) : un modèle réentraîné posé à la
+place de l'ancien est chargé en arrière-plan puis servi dès le paquet suivant.
+"""
+
+import argparse
+import functools
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lyrae.core import META_DEFAULT, MODEL_DEFAULT, ROOT_DIR
+from lyrae.predictor import ENGINES, Predictor, get_predictor, start_model_watcher
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+REQUEST_TIMEOUT_S = 30.0
+
+
+class MicroBatcher:
+    """
+    File d'attente de cas -> un thread unique qui score par paquets.
+    submit() retourne un Future ; predict() attend les résultats d'une liste de cas.
+    """
+
+    def __init__(self, predictor: Predictor, max_batch_size: int = 64, max_wait_ms: float = 5.0,
+                 provider=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size doit être >= 1")
+        # provider() -> Predictor courant (rechargement à chaud) ; sinon predictor fixe
+        self._provider = provider or (lambda: predictor)
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="lyrae-microbatch", daemon=True)
+        self._thread.start()
+
+    @property
+    def predictor(self) -> Predictor:
+        return self._provider()
+
+    def submit(self, case: dict) -> Future:
+        fut = Future()
+        self._queue.put((case, fut))
+        return fut
+
+    def predict(self, cases: list[dict], timeout: float = REQUEST_TIMEOUT_S) -> list[dict]:
+        futures = [self.submit(c) for c in cases]
+        return [f.result(timeout=timeout) for f in futures]
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "pending": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+        }
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stop = False
+            deadline = time.perf_counter() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                left = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=left) if left > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch: list) -> None:
+        cases = [c for c, _ in batch]
+        futures = [f for _, f in batch]
+        # 1 Predictor par paquet : un rechargement n'affecte que les paquets suivants
+        predictor = self.predictor
+        self.batches += 1
+        self.rows += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            results = predictor.predict_many(cases).to_dict("records")
+        except Exception:
+            # Un cas invalide ne doit pas faire échouer les autres requêtes du paquet :
+            # chaque cas est rescoré seul, seul le Future du cas fautif reçoit l'exception
+            for case, f in zip(cases, futures):
+                try:
+                    f.set_result(predictor.predict_many([case]).to_dict("records")[0])
+                except Exception as e:
+                    f.set_exception(e)
+            return
+
+        for f, r in zip(futures, results):
+            f.set_result(r)
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """POST /predict (1 cas ou liste de cas), GET /health."""
+
+    server_version = "LYRAE-scoring/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/health":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "route inconnue"})
+            return
+        predictor = self.server.batcher.predictor
+        self._send_json(HTTPStatus.OK, {
+            "status": "ok",
+            "model": predictor.model_path,
+            "model_sha256": predictor.model_checksum,
+            "loaded_at": predictor.loaded_at,
+            "engine": predictor.engine,
+            "n_features": len(predictor.feature_cols),
+            "drift": predictor.schema.drift_report(),
+            "batching": self.server.batcher.stats(),
+        })
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/predict":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "route inconnue"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "Content-Length invalide"})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "requête trop volumineuse"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "JSON invalide"})
+            return
+
+        # {"cases": [...]} -> liste ; {"case": {...}} ou le cas lui-même -> 1 résultat
+        many = isinstance(payload, dict) and "cases" in payload
+        if many:
+            cases = payload["cases"]
+        elif isinstance(payload, dict):
+            cases = [payload.get("case", payload)]
+        else:
+            cases = None
+        if not isinstance(cases, list) or not all(isinstance(c, dict) for c in cases):
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "attendu : {\"case\": {...}} ou {\"cases\": [{...}]}"})
+            return
+        bad = sorted({k for c in cases for k, v in c.items() if isinstance(v, (list, dict))})
+        if bad:
+            # Valeurs non scalaires : refusées avant la file (elles feraient échouer le paquet)
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"valeurs non scalaires : {', '.join(bad)}"})
+            return
+
+        try:
+            results = self.server.batcher.predict(cases)
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"scoring impossible: {e}"})
+            return
+
+        self._send_json(HTTPStatus.OK, {"results": results} if many else results[0])
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer qui porte le MicroBatcher partagé par les handlers."""
+
+    request_queue_size = 128  # backlog listen() : défaut 5, trop court sous charge
+
+    def __init__(self, address, batcher: MicroBatcher):
+        super().__init__(address, ScoringHandler)
+        self.batcher = batcher
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.close()
+
+
+def serve_scoring(
+    predictor: Predictor,
+    host: str = "127.0.0.1",
+    port: int = 8787,
+    max_batch_size: int = 64,
+    max_wait_ms: float = 5.0,
+    background: bool = False,
+    provider=None,
+) -> ScoringServer:
+    """
+    Démarre le service ; background=True -> thread daemon, retourne le serveur (server.shutdown()).
+    provider : callable -> Predictor courant (ex. get_predictor + start_model_watcher).
+    """
+    server = ScoringServer((host, port), MicroBatcher(predictor, max_batch_size, max_wait_ms, provider))
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return server
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m lyrae.server", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8787)
+    ap.add_argument("--model", default=str(ROOT_DIR / MODEL_DEFAULT), help="Chemin modèle .cbm")
+    ap.add_argument("--meta", default=str(ROOT_DIR / META_DEFAULT), help="Chemin meta .json")
+    ap.add_argument("--engine", choices=ENGINES, default="auto",
+                    help="auto : évaluateur NumPy (<modèle>.npz) s'il est à jour, sinon CatBoost")
+    ap.add_argument("--max-batch", type=int, default=64, help="Nombre max de cas par predict_proba")
+    ap.add_argument("--max-wait-ms", type=float, default=5.0, help="Attente max pour compléter un paquet")
+    ap.add_argument("--watch-interval", type=float, default=2.0,
+                    help="Sondage du .cbm / meta pour rechargement à chaud, en s (0 = désactivé)")
+    args = ap.parse_args(argv)
+
+    try:
+        predictor = get_predictor(args.model, args.meta, engine=args.engine)
+    except Exception as e:
+        print(f"Impossible de charger modèle/meta: {e}", file=sys.stderr)
+        return 2
+
+    provider = None
+    if args.watch_interval > 0:
+        start_model_watcher(args.watch_interval)
+        provider = functools.partial(get_predictor, args.model, args.meta, engine=args.engine)
+
+    print(f"Scoring LYRAE : http://{args.host}:{args.port}/predict "
+          f"(paquets <= {args.max_batch}, attente <= {args.max_wait_ms:g} ms)")
+    serve_scoring(predictor, host=args.host, port=args.port,
+                  max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms, provider=provider)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
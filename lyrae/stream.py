@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Scoring en flux des gros fichiers de cas (mémoire bornée).
+
+    from lyrae.stream import score_file
+    stats = score_file("registre.xlsx", predictor, "scores.parquet", chunk_size=20000)
+
+    python -m lyrae.batch registre.csv -o scores.parquet --chunk-size 20000
+
+Le fichier n'est jamais chargé en entier : XLSX lu par openpyxl en mode
+read_only (ligne à ligne), CSV lu par paquets (read_csv chunksize). Chaque paquet
+passe dans le même prétraitement vectorisé et le même predict_proba que
+lyrae.batch, puis est ajouté à la sortie (CSV : en-tête au 1er paquet ; Parquet :
+1 row group par paquet). La mémoire dépend de chunk_size, pas de la taille du
+fichier.
+
+Probabilités et catégories sont identiques au scoring du fichier entier ; seules
+les colonnes reprises de l'entrée sont typées paquet par paquet (4 ou 4.0 en CSV
+selon qu'une valeur manque ou non dans le paquet).
+"""
+
+import csv
+import time
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from lyrae.lazy import lazy_import
+
+CHUNK_SIZE_DEFAULT = 20000
+STREAM_OUTPUT_SUFFIXES = (".csv", ".parquet")
+
+
+# ============================================================
+# LECTURE PAR PAQUETS
+# ============================================================
+def _xlsx_cell(cell):
+    """Même conversion que pd.read_excel (moteur openpyxl) : vide -> "", 3.0 -> 3, erreur -> NaN."""
+    v = cell.value
+    if v is None:
+        return ""
+    if cell.data_type == "e":
+        return float("nan")
+    if cell.data_type == "n" and not isinstance(v, bool):
+        i = int(v)
+        return i if i == v else float(v)
+    return v
+
+
+def _xlsx_frame(header: list, rows: list, start: int) -> pd.DataFrame:
+    # TextParser : mêmes noms de colonnes, valeurs manquantes et types que read_excel
+    df = TextParser([header] + rows, header=0, skip_blank_lines=False).read()
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+
+def iter_xlsx_chunks(path, chunk_size: int = CHUNK_SIZE_DEFAULT, sheet=0):
+    """XLSX -> DataFrames de chunk_size lignes au plus (1re ligne = en-tête)."""
+    openpyxl = lazy_import("openpyxl")
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        ws.reset_dimensions()  # dimensions parfois fausses dans l'en-tête du fichier (ex. "A1")
+        rows = ws.iter_rows()
+        header = None
+        for first in rows:
+            header = [_xlsx_cell(c) for c in first]
+            break
+        if header is None:
+            return
+        while header and header[-1] == "":
+            header.pop()
+        width = len(header)
+
+        buf, blank, start = [], [], 0
+        for r in rows:
+            vals = [_xlsx_cell(c) for c in r][:width]
+            vals += [""] * (width - len(vals))
+            if all(v == "" for v in vals):
+                # Lignes vides gardées seulement si une ligne non vide suit (comme read_excel)
+                blank.append(vals)
+                continue
+            buf.extend(blank)
+            blank = []
+            buf.append(vals)
+            if len(buf) >= chunk_size:
+                yield _xlsx_frame(header, buf[:chunk_size], start)
+                start += chunk_size
+                buf = buf[chunk_size:]
+        if buf:
+            yield _xlsx_frame(header, buf, start)
+    finally:
+        wb.close()
+
+
+def sniff_sep(path) -> str:
+    """Séparateur CSV déduit de la 1re ligne ("," ou ";" pour les exports FR), comme sep=None."""
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+        line = f.readline()
+    try:
+        return csv.Sniffer().sniff(line, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def iter_csv_chunks(path, chunk_size: int = CHUNK_SIZE_DEFAULT, sep=None):
+    """CSV -> DataFrames de chunk_size lignes au plus (moteur C, séparateur détecté une fois)."""
+    with pd.read_csv(path, sep=sep or sniff_sep(path), chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def iter_case_chunks(path, chunk_size: int = CHUNK_SIZE_DEFAULT, sheet=0, sep=None):
+    """Équivalent par paquets de lyrae.core.read_cases."""
+    if chunk_size < 1:
+        raise ValueError("chunk_size doit être >= 1")
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        return iter_xlsx_chunks(path, chunk_size, sheet)
+    return iter_csv_chunks(path, chunk_size, sep)
+
+
+# ============================================================
+# ÉCRITURE INCRÉMENTALE
+# ============================================================
+class ChunkWriter:
+    """
+    Ajoute des DataFrames de mêmes colonnes à un .csv ou un .parquet.
+    Parquet : schéma fixé au 1er paquet (numériques -> float64, le reste -> texte)
+    pour que les paquets suivants, typés indépendamment par le lecteur, s'y conforment ;
+    int_cols : colonnes entières sans NA gardées en int64 (ex. row).
+    """
+
+    def __init__(self, path, int_cols=()):
+        self.path = Path(path)
+        self.kind = self.path.suffix.lower().lstrip(".")
+        if f".{self.kind}" not in STREAM_OUTPUT_SUFFIXES:
+            raise ValueError(f"sortie en flux : {', '.join(STREAM_OUTPUT_SUFFIXES)} uniquement (reçu {self.path.name})")
+        self.int_cols = set(int_cols)
+        self.rows = 0
+        self._columns = None
+        self._numeric = None
+        self._writer = None
+        self._pa = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._columns is None:
+            self._columns = list(df.columns)
+        elif list(df.columns) != self._columns:
+            df = df.reindex(columns=self._columns)
+
+        if self.kind == "csv":
+            df.to_csv(self.path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False)
+        else:
+            self._write_parquet(df)
+        self.rows += len(df)
+
+    def _write_parquet(self, df: pd.DataFrame) -> None:
+        if self._writer is None:
+            self._pa = lazy_import("pyarrow")
+            pq = lazy_import("pyarrow.parquet")
+            self._numeric = {
+                c: pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])
+                for c in self._columns
+            }
+            pa = self._pa
+            schema = pa.schema([
+                (str(c), pa.int64() if c in self.int_cols else pa.float64() if self._numeric[c] else pa.string())
+                for c in self._columns
+            ])
+            self._writer = pq.ParquetWriter(self.path, schema)
+
+        arrays = []
+        for c in self._columns:
+            if c in self.int_cols:
+                arrays.append(self._pa.array(df[c].to_numpy(dtype="int64"), type=self._pa.int64()))
+            elif self._numeric[c]:
+                try:
+                    v = pd.to_numeric(df[c]).to_numpy(dtype=float, na_value=float("nan"))
+                except (TypeError, ValueError):
+                    raise ValueError(f"colonne '{c}' : valeurs non numériques après le 1er paquet "
+                                     "(sortie .csv conseillée)") from None
+                arrays.append(self._pa.array(v, type=self._pa.float64(), from_pandas=True))
+            else:
+                arrays.append(self._pa.array(df[c].astype("string"), type=self._pa.string(), from_pandas=True))
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._writer.schema))
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+# ============================================================
+# SCORING EN FLUX
+# ============================================================
+def score_file(
+    path,
+    predictor,
+    out_path,
+    chunk_size: int = CHUNK_SIZE_DEFAULT,
+    sheet=0,
+    sep=None,
+    transform=None,
+    contributions_path=None,
+    progress=None,
+    scorer=None,
+) -> dict:
+    """
+    Lit, score et écrit path paquet par paquet.
+
+    transform(df) -> df : appliqué à chaque paquet avant le scoring (ex. classe de
+    risque depuis le raster). contributions_path : contributions SHAP écrites au
+    même rythme (colonne row = numéro de ligne dans le fichier).
+    progress(rows, seconds) : appelé après chaque paquet.
+    scorer : lyrae.parallel.ParallelScorer -> chaque paquet est réparti entre ses workers.
+
+    Retourne rows, chunks, seconds, rows_per_s, categories (effectifs) et columns
+    (colonnes du 1er paquet).
+    """
+    from lyrae.batch import score_cases  # import local : lyrae.batch importe ce module
+
+    t0 = time.perf_counter()
+    rows, chunks, columns = 0, 0, None
+    categories: Counter = Counter()
+    contrib_writer = None
+    if contributions_path:
+        from lyrae.explain import contributions_frame
+        contrib_writer = ChunkWriter(contributions_path, int_cols=("row",))
+
+    try:
+        with ChunkWriter(out_path) as writer:
+            for df in iter_case_chunks(path, chunk_size, sheet=sheet, sep=sep):
+                if columns is None:
+                    columns = list(df.columns)
+                if transform is not None:
+                    df = transform(df)
+                if scorer is not None:
+                    out = scorer.score_cases(df)
+                else:
+                    X = predictor.prepare_many(df)
+                    out = score_cases(df, predictor, X)
+                writer.write(out)
+                if contrib_writer is not None:
+                    if scorer is not None:
+                        X = predictor.prepare_many(df)
+                    cf = contributions_frame(predictor, X)
+                    cf["row"] += rows
+                    contrib_writer.write(cf)
+
+                rows += len(out)
+                chunks += 1
+                categories.update(out["category"].tolist())
+                if progress is not None:
+                    progress(rows, time.perf_counter() - t0)
+    finally:
+        if contrib_writer is not None:
+            contrib_writer.close()
+
+    dt = time.perf_counter() - t0
+    return {
+        "rows": rows,
+        "chunks": chunks,
+        "seconds": dt,
+        "rows_per_s": rows / dt if dt > 0 else 0.0,
+        "categories": dict(categories),
+        "columns": columns or [],
+    }
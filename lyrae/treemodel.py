@@ -0,0 +1,596 @@
+# -*- coding: utf-8 -*-
+"""
+Évaluateur NumPy du modèle CatBoost (arbres "oblivious"), sans catboost à l'exécution.
+
+Export (catboost requis une seule fois) :
+    python -m lyrae.treemodel export equine_lyme_catboost.cbm     # -> equine_lyme_catboost.npz
+    python -m lyrae.treemodel check  equine_lyme_catboost.cbm     # écart max vs predict_proba + latence
+
+Le .npz contient les seuils des splits, les valeurs de feuilles et les tables CTR
+des variables catégorielles (cat_cols), lus depuis l'export JSON de CatBoost.
+Les valeurs catégorielles sont hachées comme CatBoost (CityHash64 v1.0, 32 bits bas),
+y compris les valeurs jamais vues à l'entraînement.
+Les comparaisons se font en float32, comme CatBoost : écart < 1e-9 sur predict_proba.
+"""
+
+import argparse
+import hashlib
+import json
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+TREE_FORMAT_VERSION = 1
+
+# Types de CTR dont on sait relire les compteurs depuis l'export JSON
+_CTR_TARGET_TYPES = ("Borders", "Buckets")
+_CTR_COUNTER_TYPES = ("Counter", "FeatureFreq")
+
+_SPLIT_FLOAT, _SPLIT_ONEHOT, _SPLIT_CTR = 0, 1, 2
+_ELEM_CAT, _ELEM_FLOAT, _ELEM_ONEHOT = 0, 1, 2
+
+_MAGIC_MULT = np.uint64(0x4906BA494954CB65)
+_HASH_MEMO_MAX = 100_000
+
+
+# ============================================================
+# CITYHASH64 (v1.0) — hachage des valeurs catégorielles par CatBoost
+# ============================================================
+_M64 = 0xFFFFFFFFFFFFFFFF
+_K0 = 0xC3A5C85C97CB3127
+_K1 = 0xB492B66FBE98F273
+_K2 = 0x9AE16A3B2F90404F
+_K3 = 0xC949D7C7509E6557
+
+
+def _f64(s: bytes, i: int) -> int:
+    return struct.unpack_from("<Q", s, i)[0]
+
+
+def _f32(s: bytes, i: int) -> int:
+    return struct.unpack_from("<I", s, i)[0]
+
+
+def _rot(v: int, sh: int) -> int:
+    return v if sh == 0 else ((v >> sh) | (v << (64 - sh))) & _M64
+
+
+def _shift_mix(v: int) -> int:
+    return v ^ (v >> 47)
+
+
+def _hash_len16(u: int, v: int) -> int:
+    k_mul = 0x9DDFEA08EB382D69
+    a = ((u ^ v) * k_mul) & _M64
+    a ^= a >> 47
+    b = ((v ^ a) * k_mul) & _M64
+    b ^= b >> 47
+    return (b * k_mul) & _M64
+
+
+def _hash_len0to16(s: bytes) -> int:
+    n = len(s)
+    if n > 8:
+        a, b = _f64(s, 0), _f64(s, n - 8)
+        return _hash_len16(a, _rot((b + n) & _M64, n)) ^ b
+    if n >= 4:
+        return _hash_len16((n + (_f32(s, 0) << 3)) & _M64, _f32(s, n - 4))
+    if n > 0:
+        y = (s[0] + (s[n >> 1] << 8)) & 0xFFFFFFFF
+        z = (n + (s[n - 1] << 2)) & 0xFFFFFFFF
+        return (_shift_mix(((y * _K2) & _M64) ^ ((z * _K3) & _M64)) * _K2) & _M64
+    return _K2
+
+
+def _hash_len17to32(s: bytes) -> int:
+    n = len(s)
+    a = (_f64(s, 0) * _K1) & _M64
+    b = _f64(s, 8)
+    c = (_f64(s, n - 8) * _K2) & _M64
+    d = (_f64(s, n - 16) * _K0) & _M64
+    return _hash_len16(
+        (_rot((a - b) & _M64, 43) + _rot(c, 30) + d) & _M64,
+        (a + _rot(b ^ _K3, 20) - c + n) & _M64,
+    )
+
+
+def _weak_hash32(s: bytes, i: int, a: int, b: int) -> tuple[int, int]:
+    w, x, y, z = _f64(s, i), _f64(s, i + 8), _f64(s, i + 16), _f64(s, i + 24)
+    a = (a + w) & _M64
+    b = _rot((b + a + z) & _M64, 21)
+    c = a
+    a = (a + x + y) & _M64
+    b = (b + _rot(a, 44)) & _M64
+    return (a + z) & _M64, (b + c) & _M64
+
+
+def _hash_len33to64(s: bytes) -> int:
+    n = len(s)
+    z = _f64(s, 24)
+    a = (_f64(s, 0) + (n + _f64(s, n - 16)) * _K0) & _M64
+    b = _rot((a + z) & _M64, 52)
+    c = _rot(a, 37)
+    a = (a + _f64(s, 8)) & _M64
+    c = (c + _rot(a, 7)) & _M64
+    a = (a + _f64(s, 16)) & _M64
+    vf, vs = (a + z) & _M64, (b + _rot(a, 31) + c) & _M64
+    a = (_f64(s, 16) + _f64(s, n - 32)) & _M64
+    z = _f64(s, n - 8)
+    b = _rot((a + z) & _M64, 52)
+    c = _rot(a, 37)
+    a = (a + _f64(s, n - 24)) & _M64
+    c = (c + _rot(a, 7)) & _M64
+    a = (a + _f64(s, n - 16)) & _M64
+    wf, ws = (a + z) & _M64, (b + _rot(a, 31) + c) & _M64
+    r = _shift_mix(((vf + ws) * _K2 + (wf + vs) * _K0) & _M64)
+    return (_shift_mix((r * _K0 + vs) & _M64) * _K2) & _M64
+
+
+def city_hash64(s: bytes) -> int:
+    n = len(s)
+    if n <= 16:
+        return _hash_len0to16(s)
+    if n <= 32:
+        return _hash_len17to32(s)
+    if n <= 64:
+        return _hash_len33to64(s)
+
+    x = _f64(s, 0)
+    y = _f64(s, n - 16) ^ _K1
+    z = _f64(s, n - 56) ^ _K0
+    v = _weak_hash32(s, n - 64, n, y)
+    w = _weak_hash32(s, n - 32, (n * _K1) & _M64, _K0)
+    z = (z + _shift_mix(v[1]) * _K1) & _M64
+    x = (_rot((z + x) & _M64, 39) * _K1) & _M64
+    y = (_rot(y, 33) * _K1) & _M64
+
+    left = (n - 1) & ~63
+    i = 0
+    while True:
+        x = (_rot((x + y + v[0] + _f64(s, i + 16)) & _M64, 37) * _K1) & _M64
+        y = (_rot((y + v[1] + _f64(s, i + 48)) & _M64, 42) * _K1) & _M64
+        x ^= w[1]
+        y ^= v[0]
+        z = _rot(z ^ w[0], 33)
+        v = _weak_hash32(s, i, (v[1] * _K1) & _M64, (x + w[0]) & _M64)
+        w = _weak_hash32(s, i + 32, (z + w[1]) & _M64, y)
+        z, x = x, z
+        i += 64
+        left -= 64
+        if left == 0:
+            break
+    return _hash_len16(
+        (_hash_len16(v[0], w[0]) + _shift_mix(y) * _K1 + z) & _M64,
+        (_hash_len16(v[1], w[1]) + x) & _M64,
+    )
+
+
+def cat_feature_hash(value) -> int:
+    """Hash CatBoost d'une valeur catégorielle (int32 signé, comme dans l'export du modèle)."""
+    h = city_hash64(str(value).encode("utf-8")) & 0xFFFFFFFF
+    return h - (1 << 32) if h >= (1 << 31) else h
+
+
+def _combine_hash(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """CalcHash de CatBoost sur uint64 (débordement modulo 2**64 voulu)."""
+    return _MAGIC_MULT * (a + _MAGIC_MULT * b)
+
+
+# ============================================================
+# EXPORT .cbm -> .npz
+# ============================================================
+def default_tree_path(model_path) -> Path:
+    return Path(model_path).with_suffix(".npz")
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _ctr_elements(elements: list) -> list:
+    """Éléments d'une projection CTR dans l'ordre de hachage de CatBoost : cat, puis float, puis one-hot."""
+    cats, floats, onehots = [], [], []
+    for e in elements:
+        kind = e["combination_element"]
+        if kind == "cat_feature_value":
+            cats.append([_ELEM_CAT, int(e["cat_feature_index"]), 0.0])
+        elif kind == "float_feature":
+            floats.append([_ELEM_FLOAT, int(e["float_feature_index"]), float(e["border"])])
+        elif kind == "cat_feature_exact_value":
+            onehots.append([_ELEM_ONEHOT, int(e["cat_feature_index"]), float(e["value"])])
+        else:
+            raise ValueError(f"Élément de CTR non géré : {kind}")
+    return cats + floats + onehots
+
+
+def export_tree_model(model_path, out_path=None) -> Path:
+    """Lit le .cbm (via l'export JSON de CatBoost) et écrit l'évaluateur .npz."""
+    from lyrae.lazy import lazy_import
+
+    model_path = Path(model_path)
+    out_path = Path(out_path) if out_path else default_tree_path(model_path)
+
+    model = lazy_import("catboost").CatBoostClassifier()
+    model.load_model(str(model_path))
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / "model.json"
+        model.save_model(str(json_path), format="json")
+        with json_path.open("r", encoding="utf-8") as f:
+            j = json.load(f)
+
+    fi = j["features_info"]
+    float_feats = sorted(fi.get("float_features", []), key=lambda f: f["feature_index"])
+    cat_feats = sorted(fi.get("categorical_features", []), key=lambda f: f["feature_index"])
+    ctrs = fi.get("ctrs", [])
+
+    # --- Table des splits binaires, dans l'ordre de split_index (float, one-hot, CTR)
+    split_table = []
+    for k, f in enumerate(float_feats):
+        for b in f.get("borders") or []:
+            split_table.append((_SPLIT_FLOAT, k, b, 0))
+    for k, f in enumerate(cat_feats):
+        for v in f.get("values") or []:
+            split_table.append((_SPLIT_ONEHOT, k, 0.0, int(v)))
+    for k, c in enumerate(ctrs):
+        for b in c["borders"]:
+            split_table.append((_SPLIT_CTR, k, b, 0))
+    kinds = [s[0] for s in split_table]
+    feats = [s[1] for s in split_table]
+    borders = [s[2] for s in split_table]
+    values = [s[3] for s in split_table]
+    n_splits = len(kinds)
+
+    # --- Arbres : index des splits (complétés par un split "toujours faux") + feuilles
+    trees = j["oblivious_trees"]
+    # Arbre de profondeur 0 (constant) : "splits": null dans l'export JSON
+    tree_splits_json = [tree["splits"] or [] for tree in trees]
+    depths = np.array([len(splits) for splits in tree_splits_json], dtype=np.int64)
+    max_depth = int(depths.max()) if len(trees) else 0
+    tree_splits = np.full((len(trees), max(max_depth, 1)), n_splits, dtype=np.int64)
+    leaf_values = np.zeros((len(trees), 1 << max_depth), dtype=np.float64)
+    for t, (tree, splits) in enumerate(zip(trees, tree_splits_json)):
+        if len(tree["leaf_values"]) != 1 << len(splits):
+            raise ValueError("Modèle multi-dimension (multiclasse) non géré")
+        for d, s in enumerate(splits):
+            si = int(s["split_index"])
+            if s["split_type"] == "FloatFeature":
+                ok = kinds[si] == _SPLIT_FLOAT and float_feats[feats[si]]["feature_index"] == s["float_feature_index"]
+            elif s["split_type"] == "OneHotFeature":
+                ok = kinds[si] == _SPLIT_ONEHOT and values[si] == int(s["value"])
+            else:
+                ok = kinds[si] == _SPLIT_CTR
+            if not ok or (kinds[si] != _SPLIT_ONEHOT and borders[si] != s["border"]):
+                raise ValueError(f"Export JSON inattendu : split_index {si} incohérent")
+            tree_splits[t, d] = si
+        leaf_values[t, : len(tree["leaf_values"])] = tree["leaf_values"]
+
+    # --- CTR : une table par projection (identifier), partagée entre priors
+    table_ids, tables, ctr_rows = [], {}, []
+    ctr_data = j.get("ctr_data", {})
+    for c in ctrs:
+        ctype = c["ctr_type"]
+        if ctype not in _CTR_TARGET_TYPES + _CTR_COUNTER_TYPES:
+            raise ValueError(f"Type de CTR non géré : {ctype}")
+        ident = c["identifier"]
+        if ident not in tables:
+            data = ctr_data[ident]
+            stride = int(data["hash_stride"])
+            hm = data["hash_map"]
+            keys = np.array([int(h) for h in hm[0::stride]], dtype=np.uint64)
+            counts = np.array(
+                [hm[i + 1: i + stride] for i in range(0, len(hm), stride)], dtype=np.float64
+            ).reshape(len(keys), stride - 1)
+            order = np.argsort(keys)
+            tables[ident] = {
+                "keys": keys[order],
+                "counts": counts[order],
+                "denominator": float(data.get("counter_denominator", 0)),
+                "elements": _ctr_elements(c["elements"]),
+            }
+            table_ids.append(ident)
+        ctr_rows.append({
+            "table": table_ids.index(ident),
+            "type": ctype,
+            "target_border_idx": int(c.get("target_border_idx", 0)),
+            "prior_num": float(c["prior_numerator"]),
+            "prior_denom": float(c["prior_denomerator"]),
+            "shift": float(c["shift"]),
+            "scale": float(c["scale"]),
+        })
+
+    scale, bias = j.get("scale_and_bias", [1.0, [0.0]])
+    header = {
+        "format_version": TREE_FORMAT_VERSION,
+        "source_sha256": file_sha256(model_path),
+        "float_flat_index": [int(f["flat_feature_index"]) for f in float_feats],
+        "float_names": [f.get("feature_id", "") for f in float_feats],
+        "float_nan_true": [f.get("nan_value_treatment") == "AsTrue" for f in float_feats],
+        "cat_flat_index": [int(f["flat_feature_index"]) for f in cat_feats],
+        "cat_names": [f.get("feature_id", "") for f in cat_feats],
+        "ctrs": ctr_rows,
+        "tables": [{"denominator": tables[i]["denominator"], "elements": tables[i]["elements"]} for i in table_ids],
+        "scale": float(scale),
+        "bias": float(bias[0] if isinstance(bias, list) else bias),
+    }
+
+    arrays = {
+        "header": np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8),
+        "split_kind": np.array(kinds, dtype=np.int8),
+        "split_feat": np.array(feats, dtype=np.int64),
+        "split_border": np.array(borders, dtype=np.float64),
+        "split_value": np.array(values, dtype=np.int64),
+        "tree_splits": tree_splits,
+        "tree_depth": depths,
+        "leaf_values": leaf_values,
+    }
+    for p, ident in enumerate(table_ids):
+        arrays[f"ctr_keys_{p}"] = tables[ident]["keys"]
+        arrays[f"ctr_counts_{p}"] = tables[ident]["counts"]
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("wb") as f:
+        np.savez(f, **arrays)
+    return out_path
+
+
+# ============================================================
+# ÉVALUATEUR (NumPy seul)
+# ============================================================
+class TreeModel:
+    """Évaluation vectorisée des arbres oblivious CatBoost exportés par export_tree_model."""
+
+    def __init__(self, npz_path):
+        self.path = str(npz_path)
+        with np.load(self.path, allow_pickle=False) as z:
+            self.header = json.loads(z["header"].tobytes().decode("utf-8"))
+            if self.header.get("format_version") != TREE_FORMAT_VERSION:
+                raise ValueError(f"Format d'évaluateur inconnu : {self.header.get('format_version')}")
+            kind = z["split_kind"]
+            feat = z["split_feat"]
+            border = z["split_border"]
+            value = z["split_value"]
+            self.tree_splits = z["tree_splits"]
+            self.leaf_values = z["leaf_values"]
+            n_tables = len(self.header["tables"])
+            keys = [z[f"ctr_keys_{p}"] for p in range(n_tables)]
+            counts = [z[f"ctr_counts_{p}"] for p in range(n_tables)]
+
+        h = self.header
+        self.source_sha256 = h["source_sha256"]
+        self.float_flat_index = np.array(h["float_flat_index"], dtype=np.int64)
+        self.cat_flat_index = np.array(h["cat_flat_index"], dtype=np.int64)
+        self.n_float = len(self.float_flat_index)
+        self.n_cat = len(self.cat_flat_index)
+        self._nan_true = np.array(h["float_nan_true"], dtype=bool)
+        self.n_splits = len(kind)
+
+        # Splits regroupés par type (positions dans la matrice de bits)
+        self._f_pos = np.flatnonzero(kind == _SPLIT_FLOAT)
+        self._f_feat = feat[self._f_pos]
+        self._f_border = border[self._f_pos].astype(np.float32)
+        self._f_nan = self._nan_true[self._f_feat]
+        self._o_pos = np.flatnonzero(kind == _SPLIT_ONEHOT)
+        self._o_feat = feat[self._o_pos]
+        self._o_value = value[self._o_pos]
+        self._c_pos = np.flatnonzero(kind == _SPLIT_CTR)
+        self._c_feat = feat[self._c_pos]
+        self._c_border = border[self._c_pos].astype(np.float32)
+
+        # CTR : paramètres en float32 (calcul identique à CatBoost)
+        ctrs = h["ctrs"]
+        tables = h["tables"]
+        n_classes = max((c.shape[1] for c in counts), default=1)
+        self._ctr_table = np.array([c["table"] for c in ctrs], dtype=np.int64)
+        self._ctr_counter = np.array([c["type"] in _CTR_COUNTER_TYPES for c in ctrs], dtype=bool)
+        self._ctr_pnum = np.array([c["prior_num"] for c in ctrs], dtype=np.float32)
+        self._ctr_pden = np.array([c["prior_denom"] for c in ctrs], dtype=np.float32)
+        self._ctr_shift = np.array([c["shift"] for c in ctrs], dtype=np.float32)
+        self._ctr_scale = np.array([c["scale"] for c in ctrs], dtype=np.float32)
+        self._ctr_denom = np.array([tables[c["table"]]["denominator"] for c in ctrs], dtype=np.float32)
+
+        # Numérateur de chaque CTR = somme pondérée des compteurs de classes de sa table
+        cls = np.arange(n_classes)
+        self._ctr_good = np.zeros((len(ctrs), n_classes), dtype=np.float32)
+        for k, c in enumerate(ctrs):
+            if c["type"] in _CTR_COUNTER_TYPES:
+                self._ctr_good[k] = cls == 0
+            elif c["type"] == "Buckets":
+                self._ctr_good[k] = cls == c["target_border_idx"]
+            else:  # Borders : classes au-dessus de la frontière cible
+                self._ctr_good[k] = cls > c["target_border_idx"]
+
+        # Projections : éléments complétés jusqu'à la plus longue (P x L)
+        n_elem = max((len(t["elements"]) for t in tables), default=0)
+        self._el_kind = np.full((len(tables), n_elem), -1, dtype=np.int64)
+        self._el_idx = np.zeros((len(tables), n_elem), dtype=np.int64)
+        self._el_border = np.zeros((len(tables), n_elem), dtype=np.float64)
+        for p, t in enumerate(tables):
+            for e, (kind_e, idx_e, b_e) in enumerate(t["elements"]):
+                self._el_kind[p, e], self._el_idx[p, e], self._el_border[p, e] = kind_e, idx_e, b_e
+        valid = self._el_kind >= 0
+        self._el_valid = valid
+        self._el_is_cat = self._el_kind == _ELEM_CAT
+        self._el_is_float = self._el_kind == _ELEM_FLOAT
+        self._el_cat_idx = np.where(self._el_is_cat | (self._el_kind == _ELEM_ONEHOT), self._el_idx, 0)
+        self._el_float_idx = np.where(self._el_is_float, self._el_idx, 0)
+        self._el_border32 = self._el_border.astype(np.float32)
+        self._el_value = np.where(self._el_kind == _ELEM_ONEHOT, self._el_border, 0).astype(np.int64).astype(np.uint64)
+        self._el_nan = self._nan_true[self._el_float_idx] if self.n_float else np.zeros_like(valid)
+
+        # Tables fusionnées : une seule recherche (searchsorted) pour toutes les projections
+        all_keys = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.uint64)
+        n_rows = sum(len(c) for c in counts)
+        self._all_keys = all_keys
+        self._row_of = np.full((len(tables), max(len(all_keys), 1)), n_rows, dtype=np.int64)
+        stacked = [np.zeros((0, n_classes), dtype=np.float32)]
+        offset = 0
+        for p, (k_p, c_p) in enumerate(zip(keys, counts)):
+            self._row_of[p, np.searchsorted(all_keys, k_p)] = offset + np.arange(len(k_p))
+            block = np.zeros((len(k_p), n_classes), dtype=np.float32)
+            block[:, : c_p.shape[1]] = c_p
+            stacked.append(block)
+            offset += len(k_p)
+        stacked.append(np.zeros((1, n_classes), dtype=np.float32))  # ligne "absent de la table"
+        self._all_counts = np.concatenate(stacked)
+        self._n_rows = n_rows
+        self._table_ix = np.arange(len(tables))
+
+        self._pow2 = (1 << np.arange(self.tree_splits.shape[1], dtype=np.int64))
+        self._tree_ix = np.arange(len(self.tree_splits))
+        self.scale = float(h["scale"])
+        self.bias = float(h["bias"])
+        self._hash_memo: dict = {}
+
+    # ---------------- hachage des catégorielles ----------------
+    def _cat_hashes(self, C) -> np.ndarray:
+        memo = self._hash_memo
+        flat = []
+        for v in np.asarray(C, dtype=object).ravel().tolist():
+            h = memo.get(v)
+            if h is None:
+                h = cat_feature_hash(v)
+                if len(memo) < _HASH_MEMO_MAX:
+                    memo[v] = h
+            flat.append(h)
+        # int32 signé -> uint64 par extension de signe, comme CatBoost
+        return np.array(flat, dtype=np.int64).reshape(-1, self.n_cat).astype(np.uint64)
+
+    def _float_bits(self, F32: np.ndarray, feat_idx, borders, nan_true) -> np.ndarray:
+        vals = F32[:, feat_idx]
+        return np.where(np.isnan(vals), nan_true, vals > borders)
+
+    def _ctr_values(self, F32: np.ndarray, H: np.ndarray) -> np.ndarray:
+        """Valeurs des CTR (n x n_ctr), en float32 comme CatBoost."""
+        n = len(F32)
+        n_tables = len(self._table_ix)
+
+        # Valeur de chaque élément de projection (n x P x L), puis hash élément par élément
+        v_cat = H[:, self._el_cat_idx] if self.n_cat else np.zeros((n,) + self._el_kind.shape, dtype=np.uint64)
+        if self.n_float:
+            v_float = self._float_bits(F32, self._el_float_idx, self._el_border32, self._el_nan)
+        else:
+            v_float = np.zeros(v_cat.shape, dtype=bool)
+        v_bin = np.where(self._el_is_float, v_float, v_cat == self._el_value).astype(np.uint64)
+        v = np.where(self._el_is_cat, v_cat, v_bin)
+
+        h = np.zeros((n, n_tables), dtype=np.uint64)
+        for e in range(self._el_kind.shape[1]):
+            h = np.where(self._el_valid[:, e], _combine_hash(h, v[:, :, e]), h)
+
+        # Compteurs de chaque table (ligne "absent" -> zéros)
+        if len(self._all_keys):
+            pos = np.minimum(np.searchsorted(self._all_keys, h), len(self._all_keys) - 1)
+            rows = self._row_of[self._table_ix, pos]
+            rows = np.where(self._all_keys[pos] == h, rows, self._n_rows)
+        else:
+            rows = np.full((n, n_tables), self._n_rows, dtype=np.int64)
+        stats = self._all_counts[rows[:, self._ctr_table]]              # n x n_ctr x classes
+
+        good = np.einsum("nck,ck->nc", stats, self._ctr_good)
+        total = np.where(self._ctr_counter, self._ctr_denom, stats.sum(axis=2))
+        ctr = (good + self._ctr_pnum) / (total + self._ctr_pden)
+        return (ctr + self._ctr_shift) * self._ctr_scale
+
+    # ---------------- prédiction ----------------
+    def raw_from_arrays(self, F, C=None) -> np.ndarray:
+        """
+        F : n x n_float (variables numériques, dans l'ordre des feature_cols),
+        C : n x n_cat (valeurs catégorielles en str). Retourne le score brut (logit).
+        """
+        F32 = np.asarray(F, dtype=np.float32).reshape(-1, self.n_float)
+        n = len(F32)
+        bits = np.zeros((n, self.n_splits + 1), dtype=bool)  # dernière colonne : toujours faux
+
+        bits[:, self._f_pos] = self._float_bits(F32, self._f_feat, self._f_border, self._f_nan)
+
+        if self.n_cat:
+            H = self._cat_hashes(C if C is not None else np.full((n, self.n_cat), "__MISSING__", dtype=object))
+            if len(self._o_pos):
+                bits[:, self._o_pos] = H[:, self._o_feat] == self._o_value.astype(np.uint64)
+            if len(self._c_pos):
+                ctr = self._ctr_values(F32, H)
+                bits[:, self._c_pos] = ctr[:, self._c_feat] > self._c_border
+
+        leaf = (bits[:, self.tree_splits] @ self._pow2)       # n x n_trees
+        raw = self.leaf_values[self._tree_ix, leaf].sum(axis=1)
+        return raw * self.scale + self.bias
+
+    def predict_proba_arrays(self, F, C=None) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-self.raw_from_arrays(F, C)))
+
+    def predict_proba(self, X) -> np.ndarray:
+        """X (DataFrame prétraité, colonnes = feature_cols) -> probabilité de Lyme par ligne."""
+        if len(X) == 0:
+            return np.empty(0, dtype=float)
+        if len(X) <= 256:
+            # Petits lots : une seule conversion object coûte bien moins que deux sélections pandas
+            A = X.to_numpy(dtype=object)
+            F = A[:, self.float_flat_index].astype(float)
+            C = A[:, self.cat_flat_index]
+        else:
+            F = X.iloc[:, self.float_flat_index].to_numpy(dtype=float, na_value=np.nan)
+            C = X.iloc[:, self.cat_flat_index].to_numpy(dtype=object)
+        return self.predict_proba_arrays(F, C if self.n_cat else None)
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main(argv=None) -> int:
+    from lyrae.core import MODEL_DEFAULT, ROOT_DIR
+
+    ap = argparse.ArgumentParser(prog="python -m lyrae.treemodel", description=__doc__.strip().splitlines()[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_exp = sub.add_parser("export", help=".cbm -> .npz (évaluateur NumPy)")
+    p_exp.add_argument("model", nargs="?", default=str(ROOT_DIR / MODEL_DEFAULT))
+    p_exp.add_argument("-o", "--output", default=None, help="Défaut : <modèle>.npz")
+
+    p_chk = sub.add_parser("check", help="écart max vs CatBoost sur le jeu de référence + latence 1 ligne")
+    p_chk.add_argument("model", nargs="?", default=str(ROOT_DIR / MODEL_DEFAULT))
+    p_chk.add_argument("--npz", default=None, help="Défaut : <modèle>.npz")
+    p_chk.add_argument("--meta", default=None)
+    p_chk.add_argument("--xlsx", default=None)
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        out = export_tree_model(args.model, args.output)
+        print(f"Évaluateur NumPy écrit : {out} ({out.stat().st_size / 1024:.0f} Ko)")
+        return 0
+
+    from lyrae.bench import REF_XLSX_DEFAULT
+    from lyrae.core import META_DEFAULT, load_model_and_meta, predict_proba_frame, prepare_features, read_cases
+
+    model, meta, feature_cols, cat_cols, factor_levels, cat_idx = load_model_and_meta(
+        args.model, args.meta or str(ROOT_DIR / META_DEFAULT)
+    )
+    tm = TreeModel(args.npz or default_tree_path(args.model))
+    if tm.source_sha256 != file_sha256(args.model):
+        print("⚠️ Le .npz a été exporté depuis un autre .cbm", file=sys.stderr)
+
+    X = prepare_features(read_cases(Path(args.xlsx or ROOT_DIR / REF_XLSX_DEFAULT)),
+                         feature_cols, cat_cols, factor_levels)
+    diff = np.abs(tm.predict_proba(X) - predict_proba_frame(model, X, cat_idx))
+    print(f"{len(X)} lignes : écart max |p_numpy - p_catboost| = {diff.max():.3e}")
+
+    F = X.iloc[:1, tm.float_flat_index].to_numpy(dtype=float, na_value=np.nan)
+    C = X.iloc[:1, tm.cat_flat_index].to_numpy(dtype=object)
+    n_rep = 2000
+    t0 = time.perf_counter()
+    for _ in range(n_rep):
+        tm.predict_proba_arrays(F, C)
+    print(f"Latence 1 ligne (tableaux) : {(time.perf_counter() - t0) / n_rep * 1e6:.0f} µs")
+    return 0 if diff.max() < 1e-9 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Mode "et si… ?" : sensibilité du cas courant aux analyses non renseignées.
+
+    from lyrae.whatif import sensitivity
+    res = sensitivity(predictor, inputs)
+    res["ranking"]          # 1 ligne par analyse, triée par effet maximal sur la probabilité
+
+Chaque analyse non renseignée (RESULTS_ANALYSIS_COLS + analysis_cols) est basculée
+à "Oui" puis à "Non" ; le cas de base et toutes les variantes forment un seul
+DataFrame (1 + 2 x analyses lignes), les *_missing_code sont recalculés en bloc
+par fill_missing_code_like_R et le tout passe dans un seul predict_proba.
+"""
+
+import numpy as np
+import pandas as pd
+
+from lyrae.core import (
+    RESULTS_ANALYSIS_COLS,
+    analysis_cols,
+    apply_inputs_to_template,
+    build_template,
+    cat_from_p_like_R,
+    fill_missing_code_like_R,
+)
+
+WHATIF_VALUES = ("Oui", "Non")
+
+# Résultats d'analyse d'abord (ordre de l'onglet), puis les autres analyses
+WHATIF_TESTS = list(dict.fromkeys(RESULTS_ANALYSIS_COLS + analysis_cols))
+
+
+def _is_missing(v) -> bool:
+    if v is None:
+        return True
+    try:
+        return bool(pd.isna(v))
+    except (TypeError, ValueError):
+        return False
+
+
+def unanswered_tests(inputs: dict, feature_cols: list, tests=None) -> list[str]:
+    """Analyses du modèle absentes (ou NA) dans inputs, dans l'ordre de WHATIF_TESTS."""
+    feat = set(feature_cols)
+    return [c for c in (tests or WHATIF_TESTS) if c in feat and _is_missing(inputs.get(c))]
+
+
+def variants_frame(inputs: dict, feature_cols: list, variants: list[dict]) -> pd.DataFrame:
+    """
+    Ligne 0 = cas de base ; ligne 1 + r = cas de base modifié par variants[r]
+    (dict variable -> valeur). Non prétraité : voir score_variants.
+    """
+    X = apply_inputs_to_template(build_template(feature_cols), inputs)
+    X = X.iloc[np.zeros(1 + len(variants), dtype=np.int64)].reset_index(drop=True)
+
+    # Écriture par colonne : toutes les lignes modifiées d'une variable d'un coup
+    per_col: dict = {}
+    for r, changes in enumerate(variants, start=1):
+        for c, v in changes.items():
+            rows, vals = per_col.setdefault(c, ([], []))
+            rows.append(r)
+            vals.append(v)
+    for c, (rows, vals) in per_col.items():
+        if c in X.columns:
+            col = X[c].to_numpy(dtype=object, copy=True)
+            col[rows] = vals
+            X[c] = col
+    return X
+
+
+def score_variants(predictor, inputs: dict, variants: list[dict]) -> np.ndarray:
+    """Probabilités [cas de base, variante 1, ...] : 1 prétraitement + 1 predict_proba."""
+    X = variants_frame(inputs, predictor.feature_cols, variants)
+    X = fill_missing_code_like_R(X, set(analysis_cols))
+    # track=False / use_cache=False : les variantes synthétiques ne comptent pas dans la
+    # dérive des entrées et n'évincent pas les vrais cas du cache de prédictions
+    X = predictor.schema.coerce(X, track=False)
+    return predictor.predict_proba(X, use_cache=False)
+
+
+def sensitivity(predictor, inputs: dict, tests=None, values=WHATIF_VALUES) -> dict:
+    """
+    Probabilité de base + classement des analyses non renseignées.
+
+    ranking : test, p_<valeur> / delta_<valeur> / category_<valeur> pour chaque
+    valeur, max_abs_delta, change_category (une des valeurs change la catégorie).
+    """
+    tests = unanswered_tests(inputs, predictor.feature_cols, tests)
+    p = score_variants(predictor, inputs, [{c: v} for c in tests for v in values])
+
+    p_base = float(p[0])
+    cat_base = cat_from_p_like_R(p_base)
+    P = p[1:].reshape(len(tests), len(values))
+    D = P - p_base
+
+    ranking = pd.DataFrame({"test": tests})
+    changes = np.zeros(len(tests), dtype=bool)
+    for k, v in enumerate(values):
+        cats = [cat_from_p_like_R(float(x)) for x in P[:, k]]
+        ranking[f"p_{v}"] = P[:, k]
+        ranking[f"delta_{v}"] = D[:, k]
+        ranking[f"category_{v}"] = cats
+        changes |= np.array([c != cat_base for c in cats], dtype=bool)
+    ranking["max_abs_delta"] = np.abs(D).max(axis=1) if len(tests) else np.empty(0)
+    ranking["change_category"] = changes
+    ranking = ranking.sort_values("max_abs_delta", ascending=False, kind="stable").reset_index(drop=True)
+
+    return {"probability": p_base, "category": cat_base, "ranking": ranking}
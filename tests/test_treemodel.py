@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Évaluateur NumPy (lyrae.treemodel) : export et équivalence avec CatBoost."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+catboost = pytest.importorskip("catboost")
+
+from lyrae.treemodel import TreeModel, export_tree_model  # noqa: E402
+
+
+def test_export_zero_depth_tree(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 300
+    X = pd.DataFrame({
+        "a": rng.normal(size=n),
+        "c": rng.choice(["x", "y", "z", "w"], n),   # CTR
+        "d": rng.choice(["p", "q"], n),             # one-hot
+    })
+    y = (X["a"] + (X["c"] == "x") + rng.normal(size=n) > 0.5).astype(int)
+    model = catboost.CatBoostClassifier(iterations=20, depth=3, cat_features=["c", "d"], one_hot_max_size=2,
+                                        random_seed=0, verbose=0, allow_writing_files=False).fit(X, y)
+
+    # Arbre constant tel que l'écrit CatBoost : "splits": null, 1 feuille
+    json_path = tmp_path / "model.json"
+    model.save_model(str(json_path), format="json")
+    j = json.loads(json_path.read_text(encoding="utf-8"))
+    j["oblivious_trees"].insert(3, {"splits": None, "leaf_values": [0.25], "leaf_weights": [float(n)]})
+    json_path.write_text(json.dumps(j), encoding="utf-8")
+
+    constant = catboost.CatBoostClassifier()
+    constant.load_model(str(json_path), format="json")
+    cbm_path = tmp_path / "model.cbm"
+    constant.save_model(str(cbm_path))
+
+    tm = TreeModel(export_tree_model(cbm_path))
+    assert tm.tree_splits.shape[0] == 21
+    np.testing.assert_allclose(tm.predict_proba(X), constant.predict_proba(X)[:, 1], rtol=0, atol=1e-12)
+
+
+def test_unseen_levels_match_catboost(tmp_path):
+    rng = np.random.default_rng(1)
+    n = 400
+    X = pd.DataFrame({
+        "a": rng.normal(size=n),
+        "c": rng.choice(["x", "y", "z", "w", "v"], n),
+        "e": rng.choice(["k", "l", "m"], n),
+    })
+    y = (X["a"] + (X["c"] == "x") - (X["e"] == "k") + rng.normal(size=n) > 0.3).astype(int)
+    model = catboost.CatBoostClassifier(iterations=30, depth=4, cat_features=["c", "e"], one_hot_max_size=1,
+                                        simple_ctr=["Borders", "Counter"], random_seed=0, verbose=0,
+                                        allow_writing_files=False).fit(X, y)
+
+    # Niveaux jamais vus à l'entraînement, seuls ou combinés à des niveaux connus
+    X_new = pd.DataFrame({
+        "a": rng.normal(size=6),
+        "c": ["inconnu", "x", "inconnu", "autre", "y", "__MISSING__"],
+        "e": ["k", "inconnu", "autre", "m", "nouveau", "l"],
+    })
+
+    cbm_path = tmp_path / "model.cbm"
+    model.save_model(str(cbm_path))
+    tm = TreeModel(export_tree_model(cbm_path))
+    assert tm._ctr_counter.any()
+    np.testing.assert_allclose(tm.predict_proba(X_new), model.predict_proba(X_new)[:, 1], rtol=0, atol=1e-9)